@@ -34,24 +34,146 @@ class Settings:
     # Настройки для Consultant Plus (более длинные документы)
     CONSULTANT_CHUNK_SIZE = 3000
     CONSULTANT_CHUNK_OVERLAP = 600
+    # recursive - границы по длине; content_defined - по содержимому (статьи, хеш слов),
+    # тогда правка в документе меняет только соседние чанки
+    CHUNKING_METHOD = os.getenv("CHUNKING_METHOD", "recursive")
+    
+    # Embedding backend: yandex (удаленный API), hashing или onnx (локальные CPU эмбеддеры)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "yandex")
+    YANDEX_EMBEDDING_DIM = 256
+    LOCAL_EMBEDDING_DIM = 512  # Размерность hashing-эмбеддера
+    ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH")  # Папка с model.onnx и tokenizer.json
+    
+    # Диспетчер эмбеддингов YandexGPT: по запросу на текст, несколько запросов одновременно
+    EMBED_MAX_CONCURRENCY = 8
+    EMBED_INITIAL_CONCURRENCY = 2  # Растет аддитивно, при ошибке квоты уменьшается вдвое
+    EMBED_RATE_LIMIT = float(os.getenv("EMBED_RATE_LIMIT", "10"))  # Запросов (= текстов) в секунду (квота каталога)
+    EMBED_MAX_RETRIES = 5
+    EMBED_BACKOFF = 2.0  # Секунд до повтора после ошибки квоты (удваивается)
+    INDEX_WAVE_CHUNKS = 16  # Чанков, индексируемых между проверками дедлайна
     
     # Model settings
     TEMPERATURE = 0.3
     MAX_TOKENS = 8000
+    LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "10"))  # Вызовов YandexGPT в секунду на процесс (0 - без ограничения)
+    # Генерация: stuff - весь контекст одним вызовом; map_reduce - частичные ответы по группам чанков
+    # параллельно и короткое объединение; auto - map_reduce, когда контекст больше порога
+    GENERATION_MODE = os.getenv("GENERATION_MODE", "auto")
+    MAP_REDUCE_THRESHOLD_TOKENS = int(os.getenv("MAP_REDUCE_THRESHOLD_TOKENS", "6000"))
+    MAP_REDUCE_GROUP_TOKENS = 2500  # Токенов контекста в одном частичном вызове
+    MAP_REDUCE_WORKERS = 4  # Одновременных частичных вызовов на вопрос
+    CHARS_PER_TOKEN = 3.0  # Грубая оценка для русского текста
 
+    # Хранение векторов: float32 (FAISS flat), float16 или int8 (сжатие + точный рескоринг), sharded
+    VECTOR_STORAGE_MODE = os.getenv("VECTOR_STORAGE_MODE", "float32")
+    VECTOR_PCA_DIM = None  # Например 128 - дополнительное сжатие через PCA
+    VECTOR_RESCORE_FACTOR = 4  # Кандидатов для рескоринга: k * factor
+    # Режим "sharded": индекс из N шардов, поиск по ним параллельно в процессах-воркерах
+    VECTOR_SHARDS = int(os.getenv("VECTOR_SHARDS", "4"))
+    VECTOR_SHARD_BY = os.getenv("VECTOR_SHARD_BY", "source")  # source - документ целиком в одном шарде; hash - по id чанка
+    VECTOR_SHARD_WORKERS = int(os.getenv("VECTOR_SHARD_WORKERS", "4"))  # 0 - потоки в текущем процессе
+    # Отдельный индекс на каждый тип источника; True - еще и на каждый документ (кодекс, презентацию)
+    PARTITION_BY_DOCUMENT = False
+    PARTITION_BY_DOCUMENT_TYPES = ['pptx']  # Типы, у которых каждый документ в своем разделе (заменяется целиком)
+    # Иерархический поиск: сначала top-M документов по вектору документа, затем только их чанки
+    HIERARCHICAL_RETRIEVAL = os.getenv("HIERARCHICAL_RETRIEVAL", "false").lower() == "true"
+    HIERARCHICAL_TOP_DOCUMENTS = 20  # M - сколько документов проходит на второй уровень
+    HIERARCHICAL_METADATA_WEIGHT = 0.3  # Вес описания (title, description, text_info) против усредненных чанков
+    
     # Retrieval settings
     SEARCH_KWARGS = {"k": 10}  # Number of documents to retrieve
     SCORE_THRESHOLD = 0.7  # Minimum similarity score
+    QUERY_CACHE_SIZE = 2048  # Эмбеддингов запросов в LRU-кеше (0 - кеш выключен)
+    QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH")  # Файл для сохранения кеша между запусками
+    
+    # Запросы из ключевых слов нормализуются локально, в YandexGPT идут только вопросы на естественном языке
+    REFORMULATION_FAST_PATH = os.getenv("REFORMULATION_FAST_PATH", "true").lower() == "true"
+    REFORMULATION_FAST_PATH_MAX_WORDS = 6  # Длиннее - считается вопросом, даже без вопросительных слов
+    REFORMULATION_FAST_PATH_SHORT_WORDS = 2  # Столько значимых слов - без LLM, даже если это вопрос
     
     # Search mode configuration
     SEARCH_MODE = SearchMode.BOTH  # consultant_only, pptx_only, both
     
     # PPTX folder path
     PPTX_FOLDER_PATH = os.getenv("PPTX_FOLDER_PATH")
+    PPTX_WATCH_DEBOUNCE = 2.0  # Секунд тишины после изменения презентации перед переиндексацией
+    PPTX_WATCH_POLL_INTERVAL = 1.0  # Период опроса mtime, если inotify недоступен
+    PPTX_WATCH_RETRY_DELAY = 10.0  # Через сколько секунд повторить переиндексацию, если она упала
+    PPTX_WATCH_MAX_RETRIES = 5  # После стольких неудач подряд ждем следующего изменения файла
+    
+    # Источники документов загружаются параллельно, у каждого свой таймаут
+    SOURCE_TIMEOUT = 60.0  # Секунд на один источник для одного вопроса
+    SOURCE_WORKERS = 8
+    # Маршрутизация: живой Консультант+ только если теплый индекс не уверен в ответе
+    SOURCE_ROUTING = os.getenv("SOURCE_ROUTING", "true").lower() == "true"
+    ROUTER_K = 5  # Сколько чанков индекса оценивается
+    ROUTER_MIN_TOP_SCORE = float(os.getenv("ROUTER_MIN_TOP_SCORE", "0.8"))  # Релевантность лучшего чанка
+    ROUTER_COVERAGE_SCORE = 0.6  # Чанк считается релевантным, начиная с этой оценки
+    ROUTER_MIN_COVERAGE = float(os.getenv("ROUTER_MIN_COVERAGE", "0.6"))  # Доля релевантных среди ROUTER_K
+    ROUTER_TIMEOUT = 2.0  # Секунд на проверку индекса (не больше остатка дедлайна), дольше - живая загрузка
+    
+    # Бюджет времени на загрузку и индексацию для одного вопроса: что не успело - пропускается
+    RETRIEVAL_DEADLINE = float(os.getenv("RETRIEVAL_DEADLINE", "45"))
+    LOAD_DEADLINE_SHARE = 0.7  # Доля бюджета на загрузку, остальное - на эмбеддинг и индексацию
+    PAGE_TIMEOUT = 30.0  # Таймаут одного запроса страницы Консультант+
+    HEDGE_AFTER = 3.0  # Через сколько секунд дублировать запрос медленной страницы
+    
+    # Локальный корпус Консультант+ (scripts/ingest_consultant.py)
+    CORPUS_PATH = os.getenv("CORPUS_PATH", "data/consultant_corpus")
+    CORPUS_STORE_PATH = os.getenv("CORPUS_STORE_PATH", "data/consultant_corpus.sqlite")  # Сжатые тексты
+    USE_LOCAL_CORPUS = True  # Брать Консультант+ из корпуса, живой поиск - только если там ничего нет
+    CORPUS_SEARCH_K = 10
+    CORPUS_MIN_RELEVANCE = 0.3  # Минимальная релевантность фрагмента корпуса
+    INGEST_CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", "data/ingest_checkpoint.json")
+    INGEST_RATE_LIMIT = 0.5  # Запросов к consultant.ru в секунду
+    INGEST_MAX_PARTS_PER_CODE = 1000  # Максимум страниц (статей) на кодекс
+    INGEST_SAVE_EVERY = 10  # Сохранять корпус и чекпоинт каждые N документов
+    INGEST_CODES = [
+        {"title": "Трудовой кодекс РФ", "url": "https://www.consultant.ru/document/cons_doc_LAW_34683/"},
+        {"title": "Налоговый кодекс РФ (часть первая)", "url": "https://www.consultant.ru/document/cons_doc_LAW_19671/"},
+        {"title": "Налоговый кодекс РФ (часть вторая)", "url": "https://www.consultant.ru/document/cons_doc_LAW_28165/"},
+        {"title": "Гражданский кодекс РФ (часть первая)", "url": "https://www.consultant.ru/document/cons_doc_LAW_5142/"},
+        {"title": "КоАП РФ", "url": "https://www.consultant.ru/document/cons_doc_LAW_34661/"},
+    ]
+    INGEST_QUERIES = [
+        "трудовой кодекс отпуск",
+        "налоговый кодекс вычеты недвижимость",
+        "налоговый кодекс ставка ндфл",
+    ]
+    
+    # HTTP сервер (scripts/serve.py)
+    SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+    SERVER_MAX_CONCURRENCY = 4  # Вопросов в обработке одновременно
+    SERVER_MAX_QUEUE = 16  # Вопросов в очереди, дальше - 503
+    SERVER_REQUEST_DEADLINE = 120.0  # Секунд на вопрос, дальше - 504
+    SERVER_LOAD_WORKERS = 4  # Потоков для загрузки документов
+    SERVER_EMBED_WORKERS = 2  # Потоков для чанкинга и эмбеддингов
     
     # Chunking strategy
     PPTX_CHUNK_BY_SLIDE = True  # Создавать чанки по слайдам
     MIN_SLIDE_CHUNK_SIZE = 200  # Минимальный размер чанка для слайда
     MAX_SLIDE_CHUNK_SIZE = 2000  # Максимальный размер чанка для слайда
+    
+    # Удаление почти одинаковых чанков перед эмбеддингом (MinHash + LSH)
+    DEDUP_ENABLED = True
+    DEDUP_THRESHOLD = 0.85  # Оценка сходства Жаккара по шинглам, выше - дубликат
+    DEDUP_NUM_PERM = 64  # Длина MinHash-подписи
+    DEDUP_BANDS = 16  # Полос LSH (по DEDUP_NUM_PERM / DEDUP_BANDS значений в полосе)
+    DEDUP_SHINGLE_SIZE = 3  # Шингл - три слова подряд
+    
+    # Лексический префильтр: от длинных загруженных актов в разбиение и эмбеддинг идут только совпавшие с вопросом статьи
+    PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "false").lower() == "true"
+    PREFILTER_MIN_CHARS = 20000  # Документы короче индексируются целиком
+    PREFILTER_SECTION_CHARS = 2000  # Длинные статьи режутся на фрагменты по предложениям
+    PREFILTER_TOP_SECTIONS = 8  # Лучших по BM25 фрагментов на документ
+    PREFILTER_NEIGHBORS = 1  # Соседних фрагментов с каждой стороны от лучшего
+    PREFILTER_STEM_CHARS = 6  # Слова сравниваются по первым буквам (грубый стемминг)
+    
+    # Сжатие контекста перед генерацией: из чанков остаются самые релевантные вопросу предложения
+    CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "false").lower() == "true"
+    COMPRESSION_MAX_CHARS = 6000  # Символов контекста на все чанки вместе
+    COMPRESSION_LEXICAL_WEIGHT = 0.4  # Вес совпадения слов, остальное - косинус эмбеддингов
+    COMPRESSION_CACHE_SIZE = 20000  # Эмбеддингов предложений в LRU-кеше
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark chunk memory: LangChain Documents (copied text + metadata per chunk) vs offset-based Chunks
+"""
+
+import sys
+import os
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain.schema import Document
+
+from src.processing.text_splitter import TextSplitter
+
+PARAGRAPH = (
+    "Статья {n}. Работнику предоставляется ежегодный оплачиваемый отпуск продолжительностью "
+    "28 календарных дней. Работодатель обязан уведомить работника о времени начала отпуска "
+    "не позднее чем за две недели до его начала.\n\n"
+)
+
+
+def synthetic_corpus(documents: int, paragraphs: int):
+    return [
+        Document(
+            page_content="".join(PARAGRAPH.format(n=p + 1) for p in range(paragraphs)),
+            metadata={
+                'source': f"https://www.consultant.ru/document/cons_doc_LAW_{d}/",
+                'title': f"Документ {d}",
+                'type': 'consultant',
+            }
+        )
+        for d in range(documents)
+    ]
+
+
+def measure(build):
+    """Memory still held by the objects returned by build()"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--paragraphs', type=int, default=60, help='Paragraphs per document')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable JSON')
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.documents, args.paragraphs)
+    splitter = TextSplitter()
+
+    chunks, chunk_bytes, chunk_time = measure(lambda: splitter.split_to_chunks(corpus))
+    del chunks
+    documents, document_bytes, document_time = measure(lambda: splitter.split_documents(corpus))
+
+    count = len(documents)
+    report = {
+        'documents': args.documents,
+        'chunks': count,
+        'document_bytes': document_bytes,
+        'chunk_bytes': chunk_bytes,
+        'document_bytes_per_million': document_bytes / count * 1_000_000,
+        'chunk_bytes_per_million': chunk_bytes / count * 1_000_000,
+        'memory_saved': 1 - chunk_bytes / document_bytes,
+        'document_split_seconds': document_time,
+        'chunk_split_seconds': chunk_time,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"📄 {args.documents} документов → {count} чанков")
+    print(f"{'representation':<16} {'MB':>9} {'MB / 1M chunks':>15} {'split s':>8}")
+    print(f"{'Document':<16} {document_bytes / 2**20:>9.2f} {report['document_bytes_per_million'] / 2**20:>15.1f} {document_time:>8.2f}")
+    print(f"{'Chunk':<16} {chunk_bytes / 2**20:>9.2f} {report['chunk_bytes_per_million'] / 2**20:>15.1f} {chunk_time:>8.2f}")
+    print(f"💾 Экономия памяти: {report['memory_saved']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark chunk stability under amendments: share of chunks re-embedded after a simulated edit
+of a Consultant+ act, for running-length ("recursive") vs content-defined chunking
+"""
+
+import sys
+import os
+import argparse
+import json
+import random
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain.schema import Document
+
+from config.settings import DocumentType
+from src.processing.embeddings import HashingEmbeddingBackend
+from src.processing.text_splitter import TextSplitter, CHUNKING_METHODS
+from src.retrieval.partitioned_store import PartitionedVectorStoreManager
+
+WORDS = (
+    "работник работодатель отпуск договор заработная плата срок порядок основание увольнение "
+    "организация соглашение выплата компенсация период календарных дней трудовой кодекс "
+    "федеральный закон предоставляется устанавливается случае течение письменной форме "
+    "уведомление прекращение продолжительность ежегодный оплачиваемый дополнительный "
+    "настоящей статьей предусмотренных коллективным локальными нормативными актами"
+).split()
+AMENDMENTS = ("insert_paragraph", "delete_paragraph", "edit_sentence", "insert_article")
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 22))]
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng: random.Random, number: int) -> str:
+    return f"{number}. " + " ".join(sentence(rng) for _ in range(rng.randint(1, 4)))
+
+
+def synthetic_act(rng: random.Random, articles: int) -> list:
+    """Act as a list of articles, each a list of lines (heading first)"""
+    return [
+        [f"Статья {n}. " + sentence(rng)] + [paragraph(rng, p + 1) for p in range(rng.randint(2, 7))]
+        for n in range(1, articles + 1)
+    ]
+
+
+def render(act: list, layout: str) -> str:
+    if layout == "flat":  # Как приходит со страницы Консультант+: get_text(separator=' ')
+        return " ".join(" ".join(article) for article in act)
+    return "\n\n".join("\n".join(article) for article in act)
+
+
+def as_document(act: list, layout: str) -> Document:
+    return Document(
+        page_content=render(act, layout),
+        metadata={'source': 'https://www.consultant.ru/document/cons_doc_LAW_34683/', 'type': 'consultant'}
+    )
+
+
+def amend(act: list, kind: str, rng: random.Random) -> list:
+    act = [list(article) for article in act]
+    n = rng.randrange(len(act))
+    article = act[n]
+    if kind == "insert_paragraph":
+        article.insert(rng.randint(1, len(article)), paragraph(rng, len(article)))
+    elif kind == "delete_paragraph" and len(article) > 2:
+        del article[rng.randint(1, len(article) - 1)]
+    elif kind == "edit_sentence":
+        line = rng.randint(1, len(article) - 1)
+        words = article[line].split(" ")
+        words[rng.randrange(1, len(words))] = rng.choice(WORDS)
+        article[line] = " ".join(words)
+    elif kind == "insert_article":
+        act.insert(n + 1, [f"Статья {n + 1}.1. " + sentence(rng)] + [paragraph(rng, p + 1) for p in range(3)])
+    return act
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--articles', type=int, default=150, help='Articles per synthetic act')
+    parser.add_argument('--trials', type=int, default=20, help='Amendments of each kind')
+    parser.add_argument('--layout', choices=('flat', 'lines'), default='flat',
+                        help='flat: one line per page, as loaded from consultant.ru; lines: articles and paragraphs on lines')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable JSON')
+    args = parser.parse_args()
+
+    backend = HashingEmbeddingBackend(dimension=64)
+    reports = {}
+
+    for method in CHUNKING_METHODS:
+        splitter = TextSplitter(document_type=DocumentType.CONSULTANT)
+        report = {'chunks': 0, 'split_seconds': 0.0}
+        for kind in AMENDMENTS:
+            reembedded, total = 0, 0
+            trial_rng = random.Random(f"{args.seed}-{kind}")
+            for _ in range(args.trials):
+                act = synthetic_act(trial_rng, args.articles)
+                revised = amend(act, kind, trial_rng)
+                started = time.perf_counter()
+                before = splitter.split_documents([as_document(act, args.layout)], method=method)
+                after = splitter.split_documents([as_document(revised, args.layout)], method=method)
+                report['split_seconds'] += time.perf_counter() - started
+                report['chunks'] += len(before)
+
+                # Через replace_partition: векторы неизменившихся чанков берутся из старого раздела
+                store = PartitionedVectorStoreManager(backend, storage_mode="float32")
+                store.replace_partition('consultant', before)
+                embedded_before = store.reembed_stats['embedded']
+                store.replace_partition('consultant', after)
+                reembedded += store.reembed_stats['embedded'] - embedded_before
+                total += len(after)
+            report[kind] = reembedded / total
+        report['chunks'] /= args.trials * len(AMENDMENTS)
+        reports[method] = report
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"📄 Акт из {args.articles} статей ({args.layout}), по {args.trials} правок каждого вида")
+    print(f"{'method':<16} {'chunks':>7} " + " ".join(f"{kind:>17}" for kind in AMENDMENTS) + f" {'split s':>8}")
+    for method, report in reports.items():
+        print(f"{method:<16} {report['chunks']:>7.0f} "
+              + " ".join(f"{report[kind]:>17.1%}" for kind in AMENDMENTS)
+              + f" {report['split_seconds']:>8.2f}")
+    print("(доля чанков измененного документа, которые пришлось эмбеддить заново)")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
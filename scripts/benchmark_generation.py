@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark answer generation: wall-clock latency of "stuff" (one call with the whole
+context) vs parallel map-reduce for growing retrieved contexts
+"""
+
+import sys
+import os
+import argparse
+import json
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from langchain.schema import Document
+
+from config.settings import settings
+from src.generation.qa_chain import QASystem, estimate_tokens
+from src.testing.stubs import STUB_CORPUS, StubLLM
+
+
+class FixedRetriever(BaseRetriever):
+    """Returns the same chunks for every question"""
+
+    documents: List[Any] = []
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return list(self.documents)
+
+
+def context_chunks(count: int, chunk_chars: int) -> List[Document]:
+    """``count`` chunks cut from the stub corpus (cycled), about ``chunk_chars`` characters each"""
+    text = "\n".join(page['text'] for page in STUB_CORPUS)
+    chunks = []
+    for n in range(count):
+        start = (n * chunk_chars) % max(1, len(text) - chunk_chars)
+        page = STUB_CORPUS[n % len(STUB_CORPUS)]
+        chunks.append(Document(page_content=text[start:start + chunk_chars],
+                               metadata={'source': page['url'], 'title': page['title'], 'type': 'consultant'}))
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunks', type=int, nargs='+', default=[5, 10, 20, 40, 80], help='Retrieved chunks per question')
+    parser.add_argument('--chunk-chars', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.5, help='Stub LLM: fixed seconds per call')
+    parser.add_argument('--latency-per-1k', type=float, default=0.15,
+                        help='Stub LLM: seconds per 1000 prompt characters')
+    parser.add_argument('--yandex', action='store_true', help='Use YandexGPT instead of the stub (needs API keys)')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable JSON')
+    args = parser.parse_args()
+
+    llm = None if args.yandex else StubLLM(latency=args.latency, latency_per_1k_chars=args.latency_per_1k)
+    question = "Сколько дней длится ежегодный оплачиваемый отпуск?"
+    results = []
+    for count in args.chunks:
+        retriever = FixedRetriever(documents=context_chunks(count, args.chunk_chars))
+        row = {'chunks': count, 'context_tokens': estimate_tokens("\n\n".join(d.page_content for d in retriever.documents))}
+        for mode in ("stuff", "map_reduce"):
+            qa = QASystem(retriever, llm=llm, generation_mode=mode)
+            started = time.perf_counter()
+            qa.query(question)
+            row[f'{mode}_seconds'] = time.perf_counter() - started
+        row['groups'] = len(QASystem.group_documents(retriever.documents))
+        row['auto'] = "map_reduce" if row['context_tokens'] > settings.MAP_REDUCE_THRESHOLD_TOKENS else "stuff"
+        results.append(row)
+
+    if args.json:
+        print(json.dumps({'threshold_tokens': settings.MAP_REDUCE_THRESHOLD_TOKENS, 'results': results}, indent=2))
+        return
+
+    print(f"🧪 {'YandexGPT' if args.yandex else f'Stub LLM: {args.latency}s + {args.latency_per_1k}s / 1000 символов'}, "
+          f"порог map-reduce {settings.MAP_REDUCE_THRESHOLD_TOKENS} токенов, {settings.MAP_REDUCE_WORKERS} параллельных вызовов")
+    print(f"{'chunks':>6} {'tokens':>7} {'groups':>6} {'stuff s':>8} {'map-reduce s':>13} {'auto':>11}")
+    for row in results:
+        print(f"{row['chunks']:>6} {row['context_tokens']:>7} {row['groups']:>6} {row['stuff_seconds']:>8.2f} "
+              f"{row['map_reduce_seconds']:>13.2f} {row['auto']:>11}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark hierarchical retrieval: search latency and recall@k of the two-level index
+(top-M documents, then their chunks) against flat search over all chunks
+"""
+
+import sys
+import os
+import argparse
+import json
+import random
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from langchain.schema import Document
+
+from src.processing.embeddings import HashingEmbeddingBackend
+from src.retrieval.partitioned_store import PartitionedVectorStoreManager
+from src.retrieval.query_cache import QueryEmbeddingCache
+
+SYLLABLES = [consonant + vowel for consonant in "бвгдзклмнпрстфхц" for vowel in "аеиоуя"]
+COMMON = "порядок случае соответствии настоящим срок основании лицо организация право обязан".split()
+
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 4)))
+
+
+def synthetic_corpus(rng: random.Random, documents: int, chunks: int) -> list:
+    """Acts with their own vocabulary; chunks mix topic words with common legal words"""
+    corpus = []
+    for n in range(documents):
+        topic = [word(rng) for _ in range(40)]
+        metadata = {
+            'source': f"https://www.consultant.ru/document/cons_doc_LAW_{100000 + n}/",
+            'type': 'consultant',
+            'title': " ".join(rng.sample(topic, 5)).capitalize(),
+            'description': " ".join(rng.sample(topic, 8)),
+            'text_info': f"Документ {n}",
+        }
+        for _ in range(chunks):
+            words = rng.sample(topic, 10) + rng.sample(COMMON, 5)
+            rng.shuffle(words)
+            corpus.append(Document(page_content=" ".join(words), metadata=dict(metadata)))
+    return corpus
+
+
+def source_hit_rate(hits, origins) -> float:
+    """Share of queries with at least one chunk of the document the query was taken from"""
+    return float(np.mean([any(doc.metadata['source'] == origin for doc in found) for found, origin in zip(hits, origins)]))
+
+
+def query_latencies(store, queries, k):
+    latencies, hits = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits.append(store.similarity_search(query, k=k))
+        latencies.append(time.perf_counter() - started)
+    return hits, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--chunks', type=int, default=40, help='Chunks per document')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--top-documents', type=int, nargs='+', default=[5, 10, 20, 50], help='Values of M')
+    parser.add_argument('--dimension', type=int, default=None, help='Hashing embedder dimension (LOCAL_EMBEDDING_DIM)')
+    parser.add_argument('--metadata-weight', type=float, default=None,
+                        help='Weight of the title/description vector (HIERARCHICAL_METADATA_WEIGHT)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable JSON')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = synthetic_corpus(rng, args.documents, args.chunks)
+    # Запрос - несколько слов случайного чанка: релевантный документ известен
+    picked = rng.sample(corpus, args.queries)
+    queries = [" ".join(rng.sample(doc.page_content.split(), 4)) for doc in picked]
+    origins = [doc.metadata['source'] for doc in picked]
+
+    backend = HashingEmbeddingBackend(dimension=args.dimension)
+    cache = QueryEmbeddingCache(max_size=len(queries) * 2)
+    started = time.perf_counter()
+    store = PartitionedVectorStoreManager(backend, storage_mode="float32", hierarchical=True, query_cache=cache)
+    if args.metadata_weight is not None:
+        store.document_index.metadata_weight = args.metadata_weight
+    store.add_documents(corpus)
+    build_seconds = time.perf_counter() - started
+    for query in queries:  # Эмбеддинги запросов считаются заранее: сравнивается только поиск
+        cache.get_or_compute(query, store.backend_id, backend.embed_query)
+
+    document_index = store.document_index
+    store.document_index = None
+    flat_hits, flat_latencies = query_latencies(store, queries, args.k)
+    store.document_index = document_index
+
+    results = []
+    for m in args.top_documents:
+        store.top_documents = m
+        hits, latencies = query_latencies(store, queries, args.k)
+        recall = np.mean([
+            len({doc.page_content for doc in found} & {doc.page_content for doc in expected}) / max(1, len(expected))
+            for found, expected in zip(hits, flat_hits)
+        ])
+        results.append({'top_documents': m, 'recall': float(recall), 'source_hit': source_hit_rate(hits, origins),
+                        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+                        'p95_ms': float(np.percentile(latencies, 95) * 1000)})
+
+    report = {
+        'documents': args.documents, 'chunks': len(corpus), 'k': args.k, 'build_seconds': build_seconds,
+        'metadata_weight': store.document_index.metadata_weight,
+        'flat': {'p50_ms': float(np.percentile(flat_latencies, 50) * 1000),
+                 'p95_ms': float(np.percentile(flat_latencies, 95) * 1000),
+                 'source_hit': source_hit_rate(flat_hits, origins)},
+        'hierarchical': results,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"📚 {args.documents} документов, {len(corpus)} чанков, k={args.k} (индекс построен за {build_seconds:.1f} с)")
+    print(f"{'search':<16} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9} {'source hit':>11}")
+    flat = report['flat']
+    print(f"{'flat':<16} {flat['p50_ms']:>8.2f} {flat['p95_ms']:>8.2f} {1.0:>9.3f} {flat['source_hit']:>11.3f}")
+    for row in results:
+        print(f"{'top-' + str(row['top_documents']) + ' docs':<16} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['recall']:>9.3f} {row['source_hit']:>11.3f}")
+    print("(recall@k - доля результатов плоского поиска, найденных иерархическим;")
+    print(" source hit - доля запросов, где найден чанк документа, из которого взят запрос)")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
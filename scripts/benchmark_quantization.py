@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark quantized vector storage: memory saved vs recall lost against exact float32 search
+"""
+
+import sys
+import os
+import argparse
+import json
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from src.retrieval.quantized_store import QuantizedVectorStore
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered vectors roughly resembling sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 50, 1), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=n)
+    vectors = centers[labels] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vectors', type=int, default=20000, help='Number of indexed vectors')
+    parser.add_argument('--dim', type=int, default=256, help='Vector dimension (YandexGPT: 256)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--pca-dims', type=int, nargs='*', default=[0, 128, 64])
+    parser.add_argument('--json', action='store_true', help='Print machine-readable JSON')
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.vectors + args.queries, args.dim)
+    corpus, queries = vectors[:args.vectors], vectors[args.vectors:]
+    text_embeddings = [(str(i), vector) for i, vector in enumerate(corpus)]
+
+    reports = []
+    for storage_mode in ("float16", "int8"):
+        for pca_dim in args.pca_dims:
+            store = QuantizedVectorStore(embedding=None, storage_mode=storage_mode, pca_dim=pca_dim or None)
+            store.add_embeddings(text_embeddings)
+            reports.append(store.memory_report(queries, k=args.k))
+            store.close()
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{'mode':<8} {'pca':>5} {'resident MB':>12} {'saved':>7} {'recall':>7} {'rescored':>9}")
+    for r in reports:
+        print(f"{r['storage_mode']:<8} {r['pca_dim'] or '-':>5} {r['resident_bytes'] / 2**20:>12.2f} "
+              f"{r['memory_saved']:>7.1%} {r['recall_at_k_compressed']:>7.3f} {r['recall_at_k_rescored']:>9.3f}")
+    print(f"float32 baseline: {reports[0]['float32_bytes'] / 2**20:.2f} MB, recall@{args.k} = 1.000")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark sharded scatter-gather search: queries per second for a grid of shard and
+worker-process counts, against a single flat index, with recall of the merged top-k
+"""
+
+import sys
+import os
+import argparse
+import json
+import shutil
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from src.retrieval.shard_worker import search_shard
+from src.retrieval.sharded_store import ShardedVectorStore, shutdown_worker_pools
+
+
+def unit_vectors(rng: np.random.Generator, count: int, dimension: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_store(vectors: np.ndarray, shards: int, workers: int, shard_dir: str) -> ShardedVectorStore:
+    store = ShardedVectorStore(None, num_shards=shards, shard_by="hash", workers=workers, shard_dir=shard_dir)
+    ids = [str(i) for i in range(len(vectors))]
+    # Тексты не нужны для поиска: в docstore кладутся пустые документы
+    store.add_embeddings(zip([""] * len(vectors), vectors), metadatas=[{} for _ in ids], ids=ids)
+    return store
+
+
+def run_queries(store: ShardedVectorStore, queries: np.ndarray, k: int, batch: int):
+    hits = []
+    started = time.perf_counter()
+    for offset in range(0, len(queries), batch):
+        hits.extend(store.search_batch(queries[offset:offset + batch], k))
+    return hits, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vectors', type=int, default=200_000, help='Indexed vectors')
+    parser.add_argument('--dimension', type=int, default=256)
+    parser.add_argument('--queries', type=int, default=256)
+    parser.add_argument('--batch', type=int, default=32, help='Queries sent to the shards together')
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4],
+                        help='Worker processes (0 - threads in this process)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable JSON')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = unit_vectors(rng, args.vectors, args.dimension)
+    queries = unit_vectors(rng, args.queries, args.dimension)
+
+    # Эталон - точный поиск по одному плоскому индексу в этом процессе
+    baseline_dir = tempfile.mkdtemp(prefix="shard_bench_")
+    flat_path = os.path.join(baseline_dir, "flat.f32")
+    vectors.tofile(flat_path)
+    search_shard(flat_path, len(vectors), args.dimension, queries[:1], args.k)  # Прогрев отображения
+    started = time.perf_counter()
+    exact = []
+    for offset in range(0, len(queries), args.batch):
+        rows, _ = search_shard(flat_path, len(vectors), args.dimension, queries[offset:offset + args.batch], args.k)
+        exact.extend(set(map(str, row)) for row in rows)
+    flat_qps = len(queries) / (time.perf_counter() - started)
+
+    results = []
+    for shards in args.shards:
+        for workers in args.workers:
+            shard_dir = tempfile.mkdtemp(prefix="shard_bench_")
+            store = build_store(vectors, shards, workers, shard_dir)
+            try:
+                run_queries(store, queries[:args.batch], args.k, args.batch)  # Старт воркеров и прогрев
+                hits, seconds = run_queries(store, queries, args.k, args.batch)
+            finally:
+                store.close()
+                shutdown_worker_pools()  # Следующая конфигурация стартует свежие воркеры
+                shutil.rmtree(shard_dir, ignore_errors=True)
+            recall = np.mean([len(expected & {doc_id for doc_id, _ in found}) / args.k
+                              for expected, found in zip(exact, hits)])
+            results.append({'shards': shards, 'workers': workers, 'qps': len(queries) / seconds,
+                            'speedup': len(queries) / seconds / flat_qps, 'recall': float(recall)})
+    shutil.rmtree(baseline_dir, ignore_errors=True)
+
+    report = {'vectors': args.vectors, 'dimension': args.dimension, 'batch': args.batch, 'k': args.k,
+              'cpus': os.cpu_count(), 'flat_qps': flat_qps, 'results': results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"📊 {args.vectors} векторов x {args.dimension}, батч {args.batch}, k={args.k}, CPU: {os.cpu_count()}")
+    print(f"📏 Один плоский индекс: {flat_qps:.0f} QPS")
+    print(f"{'shards':>6} {'workers':>8} {'QPS':>9} {'speedup':>8} {'recall':>7}")
+    for row in results:
+        print(f"{row['shards']:>6} {row['workers']:>8} {row['qps']:>9.0f} {row['speedup']:>7.2f}x {row['recall']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
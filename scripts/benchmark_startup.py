@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark CLI cold start: wall time of `run_pipeline.py --help` and of a warm-snapshot answer
+whose query embedding is a cache hit, plus `python -X importtime` totals and the heaviest imports
+"""
+
+import sys
+import os
+import argparse
+import json
+import re
+import subprocess
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RUN_PIPELINE = os.path.join(ROOT, 'scripts', 'run_pipeline.py')
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def run(args, env, importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + [RUN_PIPELINE] + args
+    started = time.perf_counter()
+    completed = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{completed.stderr[-2000:]}")
+    return elapsed, completed.stderr
+
+
+def parse_importtime(stderr: str, top: int):
+    """Total import time and the top-level imports with the largest cumulative time"""
+    total, modules = 0, []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        total += int(self_us)
+        if len(indent) == 1:  # Импорт верхнего уровня, вложенные уже входят в cumulative
+            modules.append((name, int(cumulative_us)))
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return total / 1e6, [{'module': name, 'seconds': us / 1e6} for name, us in modules[:top]]
+
+
+def best_of(repeat, args, env):
+    return min(run(args, env)[0] for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    parser.add_argument('--top', type=int, default=10, help='Heaviest imports to show')
+    parser.add_argument('--question', default="трудовой кодекс отпуск")
+    parser.add_argument('--json', action='store_true', help='Print machine-readable JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, 'warm')
+        env = dict(os.environ, QUERY_CACHE_PATH=os.path.join(tmp, 'query_cache.pkl'), PYTHONWARNINGS='ignore')
+
+        # Снапшот и кеш запроса строятся один раз, дальше меряем только теплый старт
+        run(['--stub', '--save-index', snapshot, args.question], env)
+        warm_args = ['--stub', '--warm', snapshot, args.question]
+        run(warm_args, env)
+
+        help_seconds = best_of(args.repeat, ['--help'], env)
+        warm_seconds = best_of(args.repeat, warm_args, env)
+        _, help_stderr = run(['--help'], env, importtime=True)
+        _, warm_stderr = run(warm_args, env, importtime=True)
+
+    help_imports, _ = parse_importtime(help_stderr, args.top)
+    warm_imports, heaviest = parse_importtime(warm_stderr, args.top)
+    report = {
+        'help_seconds': help_seconds,
+        'help_import_seconds': help_imports,
+        'warm_answer_seconds': warm_seconds,
+        'warm_answer_import_seconds': warm_imports,
+        'heaviest_imports': heaviest,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"⏱️  --help: {help_seconds:.2f}s (импорты {help_imports:.2f}s)")
+    print(f"⏱️  Ответ из теплого снапшота: {warm_seconds:.2f}s (импорты {warm_imports:.2f}s)")
+    print(f"\n📦 Самые тяжелые импорты:")
+    for item in heaviest:
+        print(f"   {item['module']:<40} {item['seconds']:>6.3f}s")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
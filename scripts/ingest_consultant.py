@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Bulk offline ingest of Консультант Плюс into the local corpus
+
+Crawls the codes and search queries from settings (INGEST_CODES, INGEST_QUERIES),
+chunks and embeds every page into CORPUS_PATH. Interrupted runs resume from the checkpoint.
+
+    python scripts/ingest_consultant.py
+    python scripts/ingest_consultant.py --backend hashing --limit 50
+    python scripts/ingest_consultant.py --query "трудовой кодекс отпуск" --no-codes
+"""
+
+import sys
+import os
+import argparse
+import json
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config.settings import settings
+from src.utils.helpers import setup_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest Консультант Плюс into the local corpus")
+    parser.add_argument('--corpus', default=settings.CORPUS_PATH, help='Corpus (vector store) directory')
+    parser.add_argument('--checkpoint', default=settings.INGEST_CHECKPOINT_PATH)
+    parser.add_argument('--backend', default=None, help='Embedding backend (yandex, hashing, onnx)')
+    parser.add_argument('--rate', type=float, default=settings.INGEST_RATE_LIMIT, help='Requests per second')
+    parser.add_argument('--query', action='append', help='Search query to crawl (repeatable, replaces INGEST_QUERIES)')
+    parser.add_argument('--no-codes', action='store_true', help='Skip INGEST_CODES')
+    parser.add_argument('--limit', type=int, help='Ingest at most N pages in this run')
+    parser.add_argument('--reset', action='store_true', help='Delete the checkpoint and start over')
+    args = parser.parse_args()
+
+    setup_logging()
+
+    from src.data.consultant_ingest import ConsultantPlusIngestor
+    from src.processing.embeddings import EmbeddingManager
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    ingestor = ConsultantPlusIngestor(
+        EmbeddingManager(args.backend).get_embeddings(),
+        corpus_path=args.corpus,
+        checkpoint_path=args.checkpoint,
+        rate_limit=args.rate
+    )
+    print(f"📥 Загрузка корпуса Консультант+ в {args.corpus}")
+    stats = ingestor.run(
+        codes=[] if args.no_codes else None,
+        queries=args.query,
+        limit=args.limit
+    )
+    print(f"✅ Готово: {json.dumps(stats, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
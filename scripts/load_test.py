@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Load test: concurrent simulated users asking a question mix through RAGPipeline.answer against
+stub backends (Consultant+, YandexGPT, embeddings) with realistic latency and quota errors.
+Reports QPS, p50/p95/p99 per stage, error and retry rates and CPU / RSS over time
+
+    python scripts/load_test.py --users 1 4 8 16 --duration 30
+    python scripts/load_test.py --questions questions.txt --json > load.json   # сравнение между коммитами
+"""
+
+import sys
+import os
+import argparse
+import contextlib
+import json
+import random
+import resource
+import subprocess
+import threading
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from config.settings import settings, SearchMode
+
+DEFAULT_QUESTIONS = [
+    "Сколько дней длится ежегодный оплачиваемый отпуск?",
+    "трудовой кодекс отпуск",
+    "Можно ли разделить отпуск на части?",
+    "ставка НДФЛ",
+    "Какой налоговый вычет положен при покупке квартиры?",
+    "социальный вычет на лечение",
+    "Когда договор считается заключенным?",
+    "расторжение договора по соглашению сторон",
+    "Может ли работодатель уволить работника на больничном?",
+    "выходное пособие при сокращении штата",
+]
+# Этапы из timings пайплайна; retrieve и llm - части generate
+STAGES = ('load', 'index', 'retrieve', 'llm', 'total')
+
+
+def read_questions(path: str) -> list:
+    """One question per line, empty lines and # comments skipped"""
+    with open(path, encoding='utf-8') as f:
+        questions = [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+    if not questions:
+        raise ValueError(f"No questions in {path}")
+    return questions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def summary(values) -> dict:
+    if not values:
+        return {'count': 0, 'mean': None, 'p50': None, 'p95': None, 'p99': None}
+    values = np.asarray(values)
+    return {'count': len(values), 'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)),
+            'p95': float(np.percentile(values, 95)), 'p99': float(np.percentile(values, 99))}
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux /proc, otherwise the peak from getrusage)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class ResourceSampler(threading.Thread):
+    """Samples process CPU (percent of one core) and RSS every ``interval`` seconds"""
+
+    def __init__(self, interval: float, progress):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.progress = progress
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        started = last_wall = time.perf_counter()
+        last_cpu = cpu_seconds()
+        while not self._stop_event.wait(self.interval):
+            wall, cpu = time.perf_counter(), cpu_seconds()
+            self.samples.append({
+                't': wall - started,
+                'cpu_percent': 100 * (cpu - last_cpu) / (wall - last_wall),
+                'rss_mb': rss_mb(),
+                'completed': self.progress(),
+            })
+            last_wall, last_cpu = wall, cpu
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def build_pipeline(args):
+    """Fresh pipeline (cold index) over stub backends with their own quotas"""
+    from src.data.document_loader import DocumentLoader
+    from src.pipeline import RAGPipeline
+    from src.processing.embeddings import EmbeddingManager
+    from src.testing.stubs import StubConsultantPlusLoader, StubEmbeddingBackend, StubLLM, StubQuota
+
+    llm_quota = StubQuota(rate=args.llm_quota, error_rate=args.quota_error_rate)
+    embed_quota = StubQuota(rate=args.embed_quota, error_rate=args.quota_error_rate)
+    llm = StubLLM(latency=args.llm_latency, latency_per_1k_chars=args.llm_latency_per_1k, quota=llm_quota)
+    loader = DocumentLoader(
+        use_consultant_plus=True,
+        use_pptx=False,
+        consultant_loader=StubConsultantPlusLoader(llm=llm, search_latency=args.search_latency,
+                                                   page_latency=args.page_latency,
+                                                   straggler_rate=args.straggler_rate)
+    )
+    backend = StubEmbeddingBackend(latency=args.embed_latency, quota=embed_quota)
+    pipeline = RAGPipeline(search_mode=SearchMode.CONSULTANT_ONLY, loader=loader,
+                           embedding_manager=EmbeddingManager(backend), llm=llm)
+    return pipeline, {'llm': llm_quota, 'embeddings': embed_quota}, backend
+
+
+def run_level(users: int, questions: list, args, seed: int) -> dict:
+    """``users`` threads asking questions back to back for ``args.duration`` seconds"""
+    from src.processing.embedding_dispatcher import is_quota_error
+
+    pipeline, quotas, backend = build_pipeline(args)
+    records = []
+    records_lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def user(number: int):
+        rng = random.Random(seed * 1000 + number)
+        while time.perf_counter() < stop_at:
+            if args.requests and len(records) >= args.requests:
+                return
+            question = rng.choice(questions)
+            started = time.perf_counter()
+            record = {'started': started}
+            try:
+                result = pipeline.answer(question, deadline=args.deadline)
+            except Exception as e:
+                record['error'] = 'quota' if is_quota_error(e) else type(e).__name__
+            else:
+                timings = result['timings']
+                generation = result.get('generation_seconds', 0.0)
+                record['stages'] = {'load': timings['load'], 'index': timings['index'],
+                                    'retrieve': timings['generate'] - generation, 'llm': generation,
+                                    'total': timings['total']}
+                record['degraded'] = bool(result['skipped_sources'])
+                record['mode'] = result.get('generation_mode')
+            record['finished'] = time.perf_counter()
+            record['latency'] = record['finished'] - started
+            with records_lock:
+                records.append(record)
+            if 'error' in record:
+                # Пользователь с ошибкой переспрашивает не сразу, иначе ошибки квоты крутятся в холостом цикле
+                time.sleep(args.error_pause)
+            elif args.think:
+                time.sleep(rng.expovariate(1 / args.think))
+
+    sampler = ResourceSampler(args.sample_interval, lambda: len(records))
+    sampler.start()
+    threads = [threading.Thread(target=user, args=(n,), name=f"user-{n}") for n in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    sampler.stop()
+
+    ok = [record for record in records if 'error' not in record]
+    errors = {}
+    for record in records:
+        if 'error' in record:
+            errors[record['error']] = errors.get(record['error'], 0) + 1
+
+    embedding = backend.dispatcher.stats()
+    attempts = embedding['requests'] + embedding['quota_errors'] + embedding['errors']
+    samples = sampler.samples
+    return {
+        'users': users,
+        'seconds': elapsed,
+        'requests': len(records),
+        'ok': len(ok),
+        'qps': len(ok) / elapsed if elapsed else 0.0,
+        'error_rate': (len(records) - len(ok)) / len(records) if records else 0.0,
+        'errors': errors,
+        'degraded_rate': sum(record['degraded'] for record in ok) / len(ok) if ok else 0.0,
+        'latency_seconds': summary([record['latency'] for record in ok]),
+        'stage_seconds': {stage: summary([record['stages'][stage] for record in ok]) for stage in STAGES},
+        'embedding': {
+            'requests': attempts,
+            'quota_errors': embedding['quota_errors'],
+            'errors': embedding['errors'],
+            'retry_rate': (embedding['quota_errors'] + embedding['errors']) / attempts if attempts else 0.0,
+            'retried_texts': embedding['retried_texts'],
+            'final_concurrency': embedding['concurrency'],
+        },
+        'quota': {name: quota.stats() for name, quota in quotas.items()},
+        'routing': pipeline.routing_stats(),
+        'index_size': pipeline.index_size,
+        'cpu_percent_mean': float(np.mean([s['cpu_percent'] for s in samples])) if samples else None,
+        'rss_mb_max': max((s['rss_mb'] for s in samples), default=rss_mb()),
+        'timeline': samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 8], help='Concurrent users, one run per value')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds per run')
+    parser.add_argument('--requests', type=int, default=0, help='Stop a run after this many questions (0 - no limit)')
+    parser.add_argument('--questions', help='File with the question mix, one per line (default: built-in mix)')
+    parser.add_argument('--think', type=float, default=0.0, help='Mean pause of a user between questions, seconds')
+    parser.add_argument('--error-pause', type=float, default=1.0, help='Pause of a user after a failed question, seconds')
+    parser.add_argument('--deadline', type=float, default=settings.RETRIEVAL_DEADLINE,
+                        help='Load and index deadline per question, seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample-interval', type=float, default=1.0, help='CPU / RSS sampling period, seconds')
+    # Заглушки внешних сервисов
+    parser.add_argument('--search-latency', type=float, default=0.3, help='Consultant+ search, seconds')
+    parser.add_argument('--page-latency', type=float, default=0.5, help='Consultant+ page, seconds')
+    parser.add_argument('--straggler-rate', type=float, default=0.02, help='Share of pages that hang')
+    parser.add_argument('--llm-latency', type=float, default=0.8, help='YandexGPT call, seconds')
+    parser.add_argument('--llm-latency-per-1k', type=float, default=0.05,
+                        help='YandexGPT, seconds per 1000 prompt characters')
+    parser.add_argument('--llm-quota', type=float, default=20, help='YandexGPT calls per second (0 - no quota)')
+    parser.add_argument('--embed-latency', type=float, default=0.15, help='Embedding request, seconds')
+    parser.add_argument('--embed-quota', type=float, default=10, help='Embedding requests per second (0 - no quota)')
+    parser.add_argument('--quota-error-rate', type=float, default=0.01,
+                        help='Share of API calls failing with a quota error regardless of load')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable JSON')
+    args = parser.parse_args()
+
+    from src.utils.helpers import setup_logging
+    import logging
+
+    setup_logging()
+    # Предупреждения о квоте и таймаутах ожидаемы под нагрузкой: в отчете они посчитаны
+    logging.getLogger().setLevel(logging.ERROR)
+
+    questions = read_questions(args.questions) if args.questions else DEFAULT_QUESTIONS
+    levels = []
+    for users in args.users:
+        if not args.json:
+            print(f"🚀 {users} пользователей, {args.duration:.0f} с...")
+        # Загрузчики печатают ход поиска - в отчет (и в JSON) это не попадает
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            levels.append(run_level(users, questions, args, args.seed))
+
+    report = {
+        'commit': git_commit(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'questions': len(questions),
+        'config': {key: value for key, value in vars(args).items() if key not in ('json', 'users')},
+        'levels': levels,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    print(f"\n{'users':>5} {'qps':>6} {'errors':>7} {'p50 s':>6} {'p95 s':>6} {'p99 s':>6} "
+          f"{'retries':>8} {'cpu %':>6} {'rss MB':>7}")
+    for level in levels:
+        latency = level['latency_seconds']
+        print(f"{level['users']:>5} {level['qps']:>6.2f} {level['error_rate']:>7.1%} "
+              f"{latency['p50'] or 0:>6.2f} {latency['p95'] or 0:>6.2f} {latency['p99'] or 0:>6.2f} "
+              f"{level['embedding']['retry_rate']:>8.1%} {level['cpu_percent_mean'] or 0:>6.0f} "
+              f"{level['rss_mb_max']:>7.0f}")
+
+    print("\n⏱  p95 по этапам, с:")
+    print(f"{'users':>5} " + " ".join(f"{stage:>8}" for stage in STAGES))
+    for level in levels:
+        print(f"{level['users']:>5} " + " ".join(f"{level['stage_seconds'][stage]['p95'] or 0:>8.2f}"
+                                                for stage in STAGES))
+    for level in levels:
+        if level['errors']:
+            print(f"⚠️  {level['users']} пользователей: ошибки {level['errors']}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,174 +1,118 @@
 #!/usr/bin/env python3
 """
 Main script to run the RAG pipeline with multiple sources
+
+    python scripts/run_pipeline.py "трудовой кодекс отпуск"
+    python scripts/run_pipeline.py --save-index data/warm "трудовой кодекс отпуск"
+    python scripts/run_pipeline.py --warm data/warm "трудовой кодекс отпуск"   # без загрузки документов
+
+Тяжелые модули (LangChain chains, YandexGPT, FAISS, BeautifulSoup, python-pptx)
+импортируются только на том этапе, которому они нужны, поэтому --help и ответ
+из теплого снапшота стартуют быстро.
 """
 
 import sys
 import os
-import time
+import argparse
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from src.data.document_loader import DocumentLoader
-from src.processing.text_splitter import TextSplitter, DocumentType
-from src.processing.embeddings import EmbeddingManager
-from src.retrieval.vector_store import VectorStoreManager
-from src.generation.qa_chain import QASystem
-from src.utils.helpers import setup_logging, format_sources, analyze_document_stats
-from config.settings import settings, SearchMode
-
-def analyze_documents(documents):
-    """Анализирует документы и рекомендует настройки чанкинга"""
-    if not documents:
-        return None
-    
-    pptx_docs = [doc for doc in documents if doc.metadata.get('type') == 'pptx']
-    consultant_docs = [doc for doc in documents if doc.metadata.get('type') != 'pptx']
-    
-    stats = {
-        'total': len(documents),
-        'pptx_count': len(pptx_docs),
-        'consultant_count': len(consultant_docs),
-        'avg_pptx_length': 0,
-        'avg_consultant_length': 0
-    }
-    
-    if pptx_docs:
-        total_length = sum(len(doc.page_content) for doc in pptx_docs)
-        stats['avg_pptx_length'] = total_length / len(pptx_docs)
-    
-    if consultant_docs:
-        total_length = sum(len(doc.page_content) for doc in consultant_docs)
-        stats['avg_consultant_length'] = total_length / len(consultant_docs)
-    
-    # print(f"\n📊 Анализ документов:")
-    # print(f"   Всего документов: {stats['total']}")
-    # print(f"   PPTX документов: {stats['pptx_count']}")
-    # print(f"   Консультант+ документов: {stats['consultant_count']}")
-    
-    # if stats['pptx_count'] > 0:
-    #     print(f"   Средняя длина PPTX: {stats['avg_pptx_length']:.0f} символов")
-    
-    # if stats['consultant_count'] > 0:
-    #     print(f"   Средняя длина Консультант+: {stats['avg_consultant_length']:.0f} символов")
-    
-    return stats
-
-def main(questions):
+DEFAULT_QUESTIONS = ["трудовой кодекс отпуск"]
+SEARCH_MODES = ('consultant_only', 'pptx_only', 'both')
+
+MODE_MESSAGES = {
+    'consultant_only': "📄 Используется только Consultant Plus",
+    'pptx_only': "📊 Используются только PPTX файлы",
+    'both': "🔗 Используются оба источника: Consultant Plus и PPTX файлы",
+}
+
+
+def build_pipeline(args):
+    from config.settings import SearchMode
+    from src.pipeline import RAGPipeline
+
+    search_mode = SearchMode(args.mode) if args.mode else None
+    if not args.stub:
+        return RAGPipeline(search_mode=search_mode, index_path=args.warm)
+
+    from src.processing.embeddings import EmbeddingManager
+    from src.testing.stubs import StubLLM
+
+    llm = StubLLM(latency=0.0)
+    loader = None
+    if not args.warm:
+        from src.data.document_loader import DocumentLoader
+        from src.testing.stubs import StubConsultantPlusLoader
+
+        loader = DocumentLoader(
+            use_consultant_plus=True,
+            use_pptx=False,
+            consultant_loader=StubConsultantPlusLoader(llm=llm, page_latency=0.0)
+        )
+    return RAGPipeline(
+        search_mode=search_mode or SearchMode.CONSULTANT_ONLY,
+        loader=loader,
+        embedding_manager=EmbeddingManager('hashing'),
+        llm=llm,
+        index_path=args.warm
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RAG Law Assistant: answer questions from the command line")
+    parser.add_argument('questions', nargs='*', help='Questions to answer')
+    parser.add_argument('--mode', choices=SEARCH_MODES, help='Search mode (default: SEARCH_MODE from settings)')
+    parser.add_argument('--warm', metavar='PATH',
+                        help='Answer from a prebuilt index snapshot only, without loading documents')
+    parser.add_argument('--save-index', metavar='PATH', help='Save the index after answering, for later --warm runs')
+    parser.add_argument('--stub', action='store_true', help='Use offline stub backends (no Yandex, no consultant.ru)')
+    args = parser.parse_args(argv)
+
+    from src.utils.helpers import setup_logging, format_sources
+
     setup_logging()
-    
-    try:        
-        if settings.SEARCH_MODE == SearchMode.CONSULTANT_ONLY:
-            print("📄 Используется только Consultant Plus")
-            loader = DocumentLoader(use_consultant_plus=True, use_pptx=False)
-            document_type = DocumentType.CONSULTANT
-        elif settings.SEARCH_MODE == SearchMode.PPTX_ONLY:
-            print("📊 Используются только PPTX файлы")
-            loader = DocumentLoader(use_consultant_plus=False, use_pptx=True)
-            document_type = DocumentType.PPTX
-        else:  # BOTH
-            print("🔗 Используются оба источника: Consultant Plus и PPTX файлы")
-            loader = DocumentLoader(use_consultant_plus=True, use_pptx=True)
-            document_type = DocumentType.MIXED
-        
+    questions = args.questions or DEFAULT_QUESTIONS
+
+    try:
+        pipeline = build_pipeline(args)
+        print(MODE_MESSAGES[pipeline.search_mode.value])
+        if args.warm:
+            print(f"♻️  Теплый индекс: {args.warm} ({pipeline.index_size} векторов)")
+
         for question in questions:
             print(f"❓ Вопрос: {question}")
-            
-            # 1. Load documents from configured sources
-            print("📥 Загрузка документов...")
-            documents = loader.load_documents_from_query(question)
-            
-            if not documents:
+
+            # Ответ генерируется, только если в индексе что-то нашлось
+            if args.warm:
+                result = pipeline.generate(question, require_context=True)
+            else:
+                print("📥 Загрузка документов и индексация...")
+                result = pipeline.answer(question, require_context=True)
+                route = result['sources_report'].get('router', {}).get('route')
+                if result['documents_loaded']:
+                    print(f"✅ Найдено {result['documents_loaded']} документов")
+                elif route == 'local':
+                    print("♻️  Индекс уверенно отвечает на вопрос, живые источники пропущены")
+                if result['skipped_sources']:
+                    print(f"   ⚠️  Пропущено источников: {len(result['skipped_sources'])}")
+
+            if not result['source_documents']:
                 print("⚠️  Не найдено документов по данному запросу")
                 continue
-                
-            print(f"✅ Найдено {len(documents)} документов")
-            
-            # Анализируем документы и показываем рекомендации
-            stats = analyze_documents(documents)
-            
-            # 2. Split documents с оптимизацией
-            print("✂️  Обработка документов...")
-            
-            # Определяем оптимальные параметры
-            splitter = TextSplitter(document_type=document_type)
-            
-            # Получаем рекомендации
-            recommendations = splitter.get_optimal_settings(
-                document_type.value,
-                stats['avg_pptx_length'] if stats else None
-            )
-            
-            # print(f"   Рекомендуемые настройки:")
-            # print(f"   - Размер чанка: {recommendations['chunk_size']}")
-            # print(f"   - Перекрытие: {recommendations['chunk_overlap']}")
-            # print(f"   - Стратегия: {recommendations['strategy']}")
-            # print(f"   - Обоснование: {recommendations['reasoning']}")
-            
-            chunks = splitter.split_documents(documents)
-            # print(f"✅ Создано {len(chunks)} чанков из {len(documents)} документов")
-            
-            # Показываем статистику чанков
-            if chunks:
-                avg_chunk_size = sum(len(chunk.page_content) for chunk in chunks) / len(chunks)
-                min_chunk = min(len(chunk.page_content) for chunk in chunks)
-                max_chunk = max(len(chunk.page_content) for chunk in chunks)
-                
-                # print(f"   Статистика чанков:")
-                # print(f"   - Средний размер: {avg_chunk_size:.0f} символов")
-                # print(f"   - Минимальный: {min_chunk} символов")
-                # print(f"   - Максимальный: {max_chunk} символов")
-                
-                # Предупреждение если чанки слишком большие или маленькие
-                if avg_chunk_size > 2500:
-                    print("   ⚠️  Чанки слишком большие. Рекомендуется уменьшить CHUNK_SIZE")
-                elif avg_chunk_size < 500:
-                    print("   ⚠️  Чанки слишком маленькие. Рекомендуется увеличить CHUNK_SIZE")
-            
-            # 3. Create embeddings and vector store with retry logic
-            print("🧠 Создание эмбеддингов и векторного хранилища...")
-            embedding_manager = EmbeddingManager()
-            embeddings = embedding_manager.get_embeddings()
-            
-            vector_manager = VectorStoreManager(embeddings)
-            
-            # Add retry logic for vector store creation
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    # Используем меньший batch_size для PPTX
-                    batch_size = 2 if document_type == DocumentType.PPTX else 3
-                    vector_store = vector_manager.create_vector_store(chunks, batch_size=batch_size)
-                    break
-                except Exception as e:
-                    if "rate quota limit exceed" in str(e) and attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 15  # 15, 30, 45 seconds
-                        print(f"⏳ Лимит запросов, ждем {wait_time} секунд перед повторной попыткой {attempt + 1}/{max_retries}")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        raise
-            
-            # 4. Create QA system
-            print("🤖 Инициализация QA системы...")
-            retriever = vector_manager.get_retriever()
-            qa_system = QASystem(retriever)
-            
-            # 5. Make query         
-            result = qa_system.query(question)
-            
+
             print(f"\n📝 Ответ:")
             print(result['answer'])
-            
+
             print(f"\n📚 Источники:")
             print(format_sources(result['source_documents']))
-            
+
+        if args.save_index:
+            pipeline.save_index(args.save_index)
+            print(f"💾 Индекс сохранен: {args.save_index}")
+
     except Exception as e:
         print(f"❌ Ошибка в пайплайне: {e}")
         raise
 
+
 if __name__ == "__main__":
-    main(
-        questions=[
-            "трудовой кодекс отпуск",
-        ],
-    )
\ No newline at end of file
+    main()
\ No newline at end of file
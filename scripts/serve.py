@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+HTTP query server: answers questions concurrently over a warm shared index
+
+    python scripts/serve.py --port 8080
+    python scripts/serve.py --stub          # offline, with stubbed YandexGPT and Consultant+
+
+    curl -X POST localhost:8080/query -d '{"question": "трудовой кодекс отпуск"}'
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config.settings import settings, SearchMode
+from src.utils.helpers import setup_logging
+
+
+def build_pipeline(args):
+    from src.pipeline import RAGPipeline
+
+    if not args.stub:
+        return RAGPipeline(index_path=args.index)
+
+    from src.data.document_loader import DocumentLoader
+    from src.processing.embeddings import EmbeddingManager
+    from src.testing.stubs import StubConsultantPlusLoader, StubLLM
+
+    llm = StubLLM(latency=args.stub_llm_latency)
+    loader = DocumentLoader(
+        use_consultant_plus=True,
+        use_pptx=False,
+        consultant_loader=StubConsultantPlusLoader(llm=llm, page_latency=args.stub_page_latency)
+    )
+    return RAGPipeline(
+        search_mode=SearchMode.CONSULTANT_ONLY,
+        loader=loader,
+        embedding_manager=EmbeddingManager('hashing'),
+        llm=llm,
+        index_path=args.index
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG Law Assistant HTTP server")
+    parser.add_argument('--host', default=settings.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=settings.SERVER_PORT)
+    parser.add_argument('--index', help='Path of a saved vector store to start warm from')
+    parser.add_argument('--max-concurrency', type=int, default=settings.SERVER_MAX_CONCURRENCY)
+    parser.add_argument('--max-queue', type=int, default=settings.SERVER_MAX_QUEUE)
+    parser.add_argument('--deadline', type=float, default=settings.SERVER_REQUEST_DEADLINE,
+                        help='Per-question deadline in seconds')
+    parser.add_argument('--watch-pptx', action='store_true',
+                        help='Re-index presentations in PPTX_FOLDER_PATH as soon as they change')
+    parser.add_argument('--stub', action='store_true', help='Use offline stub backends (no Yandex, no consultant.ru)')
+    parser.add_argument('--stub-llm-latency', type=float, default=0.5)
+    parser.add_argument('--stub-page-latency', type=float, default=0.3)
+    args = parser.parse_args()
+
+    setup_logging()
+
+    from src.server import QueryServer
+
+    pipeline = build_pipeline(args)
+    if args.watch_pptx:
+        watcher = pipeline.watch_pptx()
+        print(f"👀 Слежение за PPTX: {watcher.folder_path} ({watcher.backend})")
+
+    server = QueryServer(
+        pipeline,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        request_deadline=args.deadline
+    )
+    print(f"🚀 Сервер запущен: http://{args.host}:{args.port} (POST /query, GET /health, GET /metrics)")
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        print("👋 Сервер остановлен")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
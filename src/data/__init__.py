@@ -1,5 +1,18 @@
-from .consultant_plus_loader import ConsultantPlusLoader
-from .pptx_loader import PPTXLoader
-from .document_loader import DocumentLoader
+import importlib
 
-__all__ = ["ConsultantPlusLoader", "PPTXLoader", "DocumentLoader"]
\ No newline at end of file
+# Загрузчики тянут requests, BeautifulSoup и python-pptx, поэтому импортируются при первом обращении
+_EXPORTS = {
+    "ConsultantPlusLoader": ".consultant_plus_loader",
+    "PPTXLoader": ".pptx_loader",
+    "DocumentLoader": ".document_loader",
+    "DocumentSource": ".sources",
+    "SourceRouter": ".source_router",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from langchain.schema import Document
+from config.settings import settings, DocumentType
+
+from .consultant_plus_loader import ConsultantPlusLoader
+from .corpus_store import CorpusDocstore, CorpusStore
+from .local_corpus_loader import CORPUS_ORIGIN
+from src.processing.text_splitter import TextSplitter
+from src.retrieval.vector_store import VectorStoreManager
+from src.utils.rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class IngestCheckpoint:
+    """Crawl progress persisted as JSON so an interrupted ingest can resume"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {'expanded': [], 'targets': [], 'done': [], 'failed': {}}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.state.update(json.load(f))
+        self._done = set(self.state['done'])
+
+    def is_expanded(self, key: str) -> bool:
+        return key in self.state['expanded']
+
+    def add_targets(self, key: str, targets: List[dict]):
+        known = {target['url'] for target in self.state['targets']}
+        self.state['targets'].extend(target for target in targets if target['url'] not in known)
+        self.state['expanded'].append(key)
+
+    def pending(self) -> List[dict]:
+        return [target for target in self.state['targets'] if target['url'] not in self._done]
+
+    def mark_done(self, url: str):
+        if url not in self._done:
+            self._done.add(url)
+            self.state['done'].append(url)
+        self.state['failed'].pop(url, None)
+
+    def mark_failed(self, url: str, error: str):
+        self.state['failed'][url] = error
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class ConsultantPlusIngestor:
+    """Crawls configured codes and search queries ahead of time into the persistent local corpus.
+
+    Pages are fetched under a global rate limit, extracted with ConsultantPlusLoader,
+    chunked, embedded and saved to ``corpus_path``. Progress is checkpointed, and the
+    corpus is always saved before the checkpoint, so a resumed run never skips a page
+    that is missing from the index.
+    """
+
+    def __init__(self, embeddings, loader: ConsultantPlusLoader = None, corpus_path: str = None,
+                 checkpoint_path: str = None, rate_limit: float = None, save_every: int = None,
+                 store_path: str = None):
+        self.loader = loader or ConsultantPlusLoader(request_delay=0.0)
+        self.corpus_path = corpus_path or settings.CORPUS_PATH
+        self.checkpoint = IngestCheckpoint(checkpoint_path or settings.INGEST_CHECKPOINT_PATH)
+        self.rate_limiter = RateLimiter(rate_limit or settings.INGEST_RATE_LIMIT)
+        self.save_every = save_every or settings.INGEST_SAVE_EVERY
+        self.splitter = TextSplitter(document_type=DocumentType.CONSULTANT, add_start_index=True)
+
+        # Тексты документов - в сжатом CorpusStore, в индексе только векторы и id чанков
+        self.store = CorpusStore(store_path or settings.CORPUS_STORE_PATH)
+        self.vector_manager = VectorStoreManager(embeddings, docstore=CorpusDocstore(self.store))
+        if os.path.isdir(self.corpus_path):
+            self.vector_manager.load_vector_store(self.corpus_path)
+            # Загруженный docstore только читает базу: ингестор пишет через свой
+            self.vector_manager.vector_store.docstore = self.vector_manager.docstore
+        self._indexed_sources = self.vector_manager.indexed_sources()
+
+    def expand_targets(self, codes: List[dict] = None, queries: List[str] = None, max_parts: int = None):
+        """Turn codes (tables of contents) and search queries into a list of pages to fetch"""
+        codes = settings.INGEST_CODES if codes is None else codes
+        queries = settings.INGEST_QUERIES if queries is None else queries
+        max_parts = max_parts or settings.INGEST_MAX_PARTS_PER_CODE
+
+        for code in codes:
+            key = f"code:{code['url']}"
+            if self.checkpoint.is_expanded(key):
+                continue
+            self.rate_limiter.acquire()
+            parts = self.loader.list_document_parts(code['url'], max_parts=max_parts)
+            # Если оглавление не разобралось, берем корневую страницу документа целиком
+            targets = parts or [{'url': code['url'], 'title': code['title']}]
+            for target in targets:
+                target['code'] = code['title']
+            logger.info(f"{code['title']}: {len(targets)} pages to ingest")
+            self.checkpoint.add_targets(key, targets)
+            self.checkpoint.save()
+
+        for query in queries:
+            key = f"query:{query}"
+            if self.checkpoint.is_expanded(key):
+                continue
+            self.rate_limiter.acquire()
+            results = self.loader.search_documents(query, reformulate=False)
+            targets = [
+                {'url': r['url'], 'title': r['title'], 'description': r['description'],
+                 'text_info': r['text_info'], 'search_query': query}
+                for r in results
+            ]
+            logger.info(f"Query '{query}': {len(targets)} pages to ingest")
+            self.checkpoint.add_targets(key, targets)
+            self.checkpoint.save()
+
+    def _fetch(self, target: dict) -> Optional[Document]:
+        self.rate_limiter.acquire()
+        content = self.loader.load_document_content(target['url'])
+        if not content:
+            return None
+        metadata = {
+            'source': target['url'],
+            'title': target.get('title', ''),
+            'description': target.get('description', ''),
+            'text_info': target.get('text_info', ''),
+            'code': target.get('code', ''),
+            'search_query': target.get('search_query', ''),
+            'type': 'consultant',
+            'origin': CORPUS_ORIGIN,
+            'ingested_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        return Document(page_content=content, metadata=metadata)
+
+    def _save(self):
+        """Save the corpus via a temporary directory swap, then the checkpoint"""
+        if self.vector_manager.vector_store is not None:
+            tmp_path = self.corpus_path.rstrip('/\\') + ".tmp"
+            old_path = self.corpus_path.rstrip('/\\') + ".old"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            self.vector_manager.save_vector_store(tmp_path)
+            if os.path.isdir(self.corpus_path):
+                shutil.rmtree(old_path, ignore_errors=True)
+                os.replace(self.corpus_path, old_path)
+            os.replace(tmp_path, self.corpus_path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        self.checkpoint.save()
+
+    def run(self, codes: List[dict] = None, queries: List[str] = None, limit: int = None) -> dict:
+        """Crawl, extract, chunk and embed all pending pages; return run statistics"""
+        self.expand_targets(codes, queries)
+        pending = self.checkpoint.pending()
+        if limit:
+            pending = pending[:limit]
+
+        stats = {'pending': len(pending), 'ingested': 0, 'skipped': 0, 'failed': 0, 'chunks': 0}
+        unsaved = 0
+        try:
+            for i, target in enumerate(pending, 1):
+                url = target['url']
+                if url in self._indexed_sources:
+                    # Уже в корпусе (прошлый запуск упал между сохранением корпуса и чекпоинта)
+                    self.checkpoint.mark_done(url)
+                    stats['skipped'] += 1
+                    continue
+
+                parent_id = None
+                try:
+                    document = self._fetch(target)
+                    if document is None:
+                        self.checkpoint.mark_failed(url, "empty content")
+                        stats['failed'] += 1
+                        continue
+                    # Родитель нужен до чанков (они хранятся смещениями в нем), при ошибке - откатываем
+                    parent_id = document.metadata['parent_id'] = self.store.add_parent(document)
+                    chunks = self.splitter.split_documents([document])
+                    self.vector_manager.add_documents(chunks)
+                except Exception as e:
+                    if parent_id is not None:
+                        self.store.discard_parent(parent_id)
+                    logger.warning(f"Failed to ingest {url}: {e}")
+                    self.checkpoint.mark_failed(url, str(e))
+                    stats['failed'] += 1
+                    continue
+
+                self._indexed_sources.add(url)
+                self.checkpoint.mark_done(url)
+                stats['ingested'] += 1
+                stats['chunks'] += len(chunks)
+                unsaved += 1
+                logger.info(f"[{i}/{len(pending)}] {target.get('title', url)[:60]}: {len(chunks)} chunks")
+
+                if unsaved >= self.save_every:
+                    self._save()
+                    unsaved = 0
+        finally:
+            self._save()
+
+        stats['corpus_size'] = self.vector_manager.size
+        stats['store'] = self.store.stats()
+        return stats
\ No newline at end of file
@@ -1,9 +1,9 @@
-import requests
-from bs4 import BeautifulSoup
 from langchain.schema import Document
-from typing import List, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional, Tuple
 import urllib.parse
 import logging
+import threading
 import time
 import re
 import sys
@@ -12,31 +12,59 @@ import os
 # Add the parent directory to path to import from processing
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
+from config.settings import settings
 from src.processing.query_reformulator import QueryReformulator
+from src.utils.deadline import Deadline
+from src.utils.rate_limiter import RateLimiter
+from src.utils.singleflight import SingleFlight, normalize_query
+
+logger = logging.getLogger(__name__)
 
 class ConsultantPlusLoader:
     """Loader for Консультант Плюс search results and document content"""
     
-    def __init__(self, max_results: int = 5):
+    def __init__(self, max_results: int = 5, query_reformulator: QueryReformulator = None, request_delay: float = 1.5):
         self.max_results = max_results
+        self.request_delay = request_delay
         self.base_url = "https://www.consultant.ru"
         self.search_url = "https://www.consultant.ru/search/"
+        import requests  # Тяжелые сетевые зависимости грузятся только когда нужен живой поиск
+        
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
-        self.query_reformulator = QueryReformulator()
+        self.query_reformulator = query_reformulator or QueryReformulator()
+        # Одинаковые поиски и загрузки страниц от параллельных запросов выполняются один раз
+        self._search_flight = SingleFlight("consultant_search")
+        self._page_flight = SingleFlight("consultant_page")
+        # Страницы качаются параллельно, но стартуют не чаще раза в request_delay секунд
+        self.page_rate_limiter = RateLimiter(1.0 / request_delay if request_delay else 0)
+        self.page_timeout = settings.PAGE_TIMEOUT
+        self.hedge_after = settings.HEDGE_AFTER
+        # Отдельные пулы: задачи страниц ждут HTTP-запросов (основных и дублирующих) и не должны их вытеснять
+        self._fetch_pool = ThreadPoolExecutor(max_workers=max(4, 2 * max_results), thread_name_prefix="page")
+        self._request_pool = ThreadPoolExecutor(max_workers=max(8, 4 * max_results), thread_name_prefix="page_request")
+        self._hedge_lock = threading.Lock()
+        self._hedge_stats = {'hedged': 0, 'hedge_won': 0}
     
     def _reformulate_query(self, natural_query: str) -> str:
         """Reformulate natural language query into keyword search for Consultant Plus"""
         reformulated_query = self.query_reformulator.reformulate_for_consultant_plus(natural_query)
         return reformulated_query
     
-    def search_documents(self, query: str) -> List[dict]:
+    def search_documents(self, query: str, reformulate: bool = True) -> List[dict]:
+        """Search documents on Консультант Плюс; concurrent identical searches share one request"""
+        key = (normalize_query(query), reformulate)
+        return list(self._search_flight.do(key, self._search_documents, query, reformulate))
+    
+    def _search_documents(self, query: str, reformulate: bool = True) -> List[dict]:
         """Search documents on Консультант Плюс and return results with metadata"""
+        from bs4 import BeautifulSoup
+        
         try:
             # Reformulate the query for better search results
-            search_query = self._reformulate_query(query)
+            search_query = self._reformulate_query(query) if reformulate else query
             encoded_query = urllib.parse.quote(search_query.encode('utf-8'))
             url = f"{self.search_url}?q={encoded_query}"
             
@@ -124,11 +152,59 @@ class ConsultantPlusLoader:
             # print(f"Error searching Consultant Plus: {e}")
             return []
     
-    def load_document_content(self, url: str) -> Optional[str]:
+    def load_document_content(self, url: str, deadline: Deadline = None) -> Optional[str]:
+        """Load document text; concurrent downloads of the same URL share one request.
+        
+        Only a deadline with a budget enables hedging: without one a straggler is just waited for.
+        """
+        if deadline is None or deadline.budget is None:
+            return self._page_flight.do(url, self._load_document_content, url)
+        return self._page_flight.do(url, self._hedged_load, url, deadline)
+    
+    def _hedged_load(self, url: str, deadline: Deadline) -> Optional[str]:
+        """Fetch a page within the deadline; a straggler gets a duplicate request after hedge_after seconds.
+        
+        The first non-empty response wins; None if nothing arrived before the deadline.
+        The duplicate request takes its own page_rate_limiter slot like any other page.
+        """
+        futures = [self._request_pool.submit(self._load_document_content, url, deadline.timeout(self.page_timeout))]
+        done, _ = wait(futures, timeout=deadline.timeout(self.hedge_after))
+        if not done and not deadline.expired:
+            futures.append(self._request_pool.submit(self._hedge_request, url, deadline, futures[0]))
+        
+        pending = list(futures)
+        while pending and not deadline.expired:
+            done, _ = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                content = future.result()
+                if content:
+                    if future is not futures[0]:
+                        with self._hedge_lock:
+                            self._hedge_stats['hedge_won'] += 1
+                    return content
+        return None
+    
+    def _hedge_request(self, url: str, deadline: Deadline, primary) -> Optional[str]:
+        # Дубль соблюдает общий лимит запросов; пока ждали слот, оригинал мог успеть ответить
+        self.page_rate_limiter.acquire()
+        if deadline.expired or (primary.done() and primary.result()):
+            return None
+        with self._hedge_lock:
+            self._hedge_stats['hedged'] += 1
+        return self._load_document_content(url, deadline.timeout(self.page_timeout))
+    
+    def hedge_stats(self) -> dict:
+        with self._hedge_lock:
+            return dict(self._hedge_stats)
+    
+    def _load_document_content(self, url: str, timeout: float = None) -> Optional[str]:
         """Load and extract text content from a document URL"""
+        from bs4 import BeautifulSoup
+        
         try:
             # print(f"Loading document content from: {url}")
-            response = self.session.get(url, timeout=30)
+            response = self.session.get(url, timeout=timeout or self.page_timeout)
             response.raise_for_status()
             
             # Check if it's XML content
@@ -198,22 +274,72 @@ class ConsultantPlusLoader:
             # print(f"Error loading document from {url}: {e}")
             return None
     
-    def load_documents(self, query: str) -> List[Document]:
+    def list_document_parts(self, url: str, max_parts: int = None) -> List[dict]:
+        """List article/chapter pages linked from a document's table of contents (e.g. a code)"""
+        from bs4 import BeautifulSoup
+        
+        try:
+            response = self.session.get(url, timeout=30)
+            response.raise_for_status()
+            try:
+                soup = BeautifulSoup(response.content, 'lxml')
+            except:
+                soup = BeautifulSoup(response.content, 'html.parser')
+        except Exception as e:
+            # print(f"Error loading table of contents from {url}: {e}")
+            return []
+        
+        root_path = urllib.parse.urlparse(url).path.rstrip('/') + '/'
+        parts = []
+        seen = set()
+        for link in soup.find_all('a', href=True):
+            part_url = urllib.parse.urljoin(url, link['href']).split('#')[0]
+            part_path = urllib.parse.urlparse(part_url).path
+            # Статьи кодекса лежат на страницах вида /document/cons_doc_LAW_XXX/<hash>/
+            if not part_path.startswith(root_path) or part_path.rstrip('/') + '/' == root_path:
+                continue
+            if part_url in seen:
+                continue
+            seen.add(part_url)
+            parts.append({'url': part_url, 'title': link.get_text(strip=True) or "No title"})
+            if max_parts and len(parts) >= max_parts:
+                break
+        return parts
+    
+    def load_documents(self, query: str, deadline: Deadline = None) -> List[Document]:
         """Main method to load documents based on search query"""
+        documents, _ = self.load_documents_with_skipped(query, deadline)
+        return documents
+    
+    def load_documents_with_skipped(self, query: str, deadline: Deadline = None) -> Tuple[List[Document], List[str]]:
+        """Load documents for the query, return them with the URLs skipped (failed or late for the deadline)"""
+        deadline = deadline or Deadline()
         # print(f"Searching Consultant Plus for: '{query}'")
         
         search_results = self.search_documents(query)
         if not search_results:
             # print("No search results found")
-            return []
+            return [], []
+        
+        def fetch(result):
+            # Be respectful with requests
+            self.page_rate_limiter.acquire()
+            if deadline.expired:
+                return None
+            return self.load_document_content(result['url'], deadline)
+        
+        futures = [self._fetch_pool.submit(fetch, result) for result in search_results]
+        wait(futures, timeout=deadline.remaining())
         
         documents = []
-        for i, result in enumerate(search_results):
-            content = self.load_document_content(result['url'])
+        skipped = []
+        for result, future in zip(search_results, futures):
+            content = future.result() if future.done() else None
             if content:
                 # Create LangChain Document with metadata
                 metadata = {
                     'source': result['url'],
+                    'type': 'consultant',  # Ключ раздела индекса
                     'title': result['title'],
                     'description': result['description'],
                     'text_info': result['text_info'],
@@ -229,9 +355,9 @@ class ConsultantPlusLoader:
                 )
                 documents.append(document)
             else:
-                # print(f"Failed to load content for document {i+1}")
-                pass
-            
-            # Be respectful with requests
-            time.sleep(1.5)
-        return documents
\ No newline at end of file
+                # Не загрузилась или не успела к дедлайну
+                skipped.append(result['url'])
+        
+        if skipped:
+            logger.info(f"Skipped {len(skipped)} of {len(search_results)} Консультант+ pages")
+        return documents, skipped
\ No newline at end of file
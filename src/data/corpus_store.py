@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Union
+
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parents (
+    id TEXT PRIMARY KEY,
+    source TEXT,
+    metadata TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    content BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    parent_id TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    "end" INTEGER NOT NULL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS chunks_parent ON chunks(parent_id);
+CREATE INDEX IF NOT EXISTS parents_source ON parents(source);
+"""
+
+# Служебные ключи, которые не надо хранить в метаданных чанка
+_OFFSET_KEYS = ('parent_id', 'start_index')
+
+
+class CorpusStore:
+    """On-disk corpus: every parent document is stored once, compressed (zstd, or zlib as fallback);
+    chunks are (parent id, start, end) offsets plus the few metadata keys that differ from the parent.
+
+    Chunk text is only materialized when a chunk is read. Decompressed parents are kept
+    in a small LRU cache, since retrieved chunks tend to come from the same documents.
+    """
+
+    def __init__(self, path: str, compression_level: int = 10, cache_size: int = 32):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.codec = 'zstd' if zstandard is not None else 'zlib'
+        self.compression_level = compression_level
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    # ---- compression ----
+
+    def _compress(self, text: str) -> bytes:
+        data = text.encode('utf-8')
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=self.compression_level).compress(data)
+        return zlib.compress(data, min(self.compression_level, 9))
+
+    @staticmethod
+    def _decompress(codec: str, blob: bytes) -> str:
+        if codec == 'zstd':
+            if zstandard is None:
+                raise ImportError("Corpus was written with zstd: pip install zstandard")
+            return zstandard.ZstdDecompressor().decompress(blob).decode('utf-8')
+        return zlib.decompress(blob).decode('utf-8')
+
+    # ---- parents ----
+
+    @staticmethod
+    def make_parent_id(document: Document) -> str:
+        """Deterministic id: the same source and content always map to the same parent"""
+        digest = hashlib.sha1()
+        digest.update(str(document.metadata.get('source', '')).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(document.page_content.encode('utf-8'))
+        return digest.hexdigest()
+
+    def add_parent(self, document: Document) -> str:
+        """Store a full document once and return its parent id"""
+        parent_id = self.make_parent_id(document)
+        metadata = {k: v for k, v in document.metadata.items() if k not in _OFFSET_KEYS}
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM parents WHERE id = ?", (parent_id,)).fetchone()
+            if not exists:
+                self._conn.execute(
+                    "INSERT INTO parents (id, source, metadata, codec, length, content) VALUES (?, ?, ?, ?, ?, ?)",
+                    (parent_id, metadata.get('source'), json.dumps(metadata, ensure_ascii=False),
+                     self.codec, len(document.page_content), self._compress(document.page_content))
+                )
+                self._conn.commit()
+        return parent_id
+
+    def discard_parent(self, parent_id: str):
+        """Remove a parent that no chunk refers to (rollback of a document that failed to index)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM parents WHERE id = ? AND id NOT IN (SELECT parent_id FROM chunks)",
+                               (parent_id,))
+            self._conn.commit()
+            self._cache.pop(parent_id, None)
+
+    def get_parent(self, parent_id: str):
+        """Return (text, metadata) of a parent document, using the LRU cache"""
+        with self._lock:
+            if parent_id in self._cache:
+                self._cache.move_to_end(parent_id)
+                return self._cache[parent_id]
+            row = self._conn.execute(
+                "SELECT codec, content, metadata FROM parents WHERE id = ?", (parent_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            parent = (self._decompress(row[0], row[1]), json.loads(row[2]))
+            self._cache[parent_id] = parent
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return parent
+
+    # ---- chunks ----
+
+    def add_chunks(self, chunks: Dict[str, Document]):
+        """Store chunks as offsets into their parent.
+
+        A chunk is stored by offset when its metadata carries ``parent_id`` and
+        ``start_index`` and the parent text at that position matches; otherwise the
+        chunk text becomes its own (compressed) parent.
+        """
+        rows = []
+        for chunk_id, chunk in chunks.items():
+            metadata = chunk.metadata
+            parent_id = metadata.get('parent_id')
+            start = metadata.get('start_index')
+            parent = self.get_parent(parent_id) if parent_id and start is not None else None
+
+            if parent is None or parent[0][start:start + len(chunk.page_content)] != chunk.page_content:
+                parent_id = self.add_parent(Document(page_content=chunk.page_content, metadata=metadata))
+                parent = self.get_parent(parent_id)
+                start = 0
+
+            parent_text, parent_metadata = parent
+            overrides = {
+                k: v for k, v in metadata.items()
+                if k not in _OFFSET_KEYS and parent_metadata.get(k, object()) != v
+            }
+            rows.append((chunk_id, parent_id, start, start + len(chunk.page_content),
+                         json.dumps(overrides, ensure_ascii=False) if overrides else None))
+
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO chunks (id, parent_id, start, "end", metadata) VALUES (?, ?, ?, ?, ?)', rows
+            )
+            self._conn.commit()
+
+    def get_chunk(self, chunk_id: str) -> Optional[Document]:
+        """Materialize a chunk as a LangChain Document"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT parent_id, start, "end", metadata FROM chunks WHERE id = ?', (chunk_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        parent_id, start, end, overrides = row
+        parent_text, parent_metadata = self.get_parent(parent_id)
+        metadata = dict(parent_metadata)
+        if overrides:
+            metadata.update(json.loads(overrides))
+        metadata['parent_id'] = parent_id
+        metadata['start_index'] = start
+        return Document(page_content=parent_text[start:end], metadata=metadata, id=chunk_id)
+
+    def delete_chunks(self, chunk_ids: Iterable[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in chunk_ids])
+            # Родители без чанков больше не нужны
+            self._conn.execute("DELETE FROM parents WHERE id NOT IN (SELECT DISTINCT parent_id FROM chunks)")
+            self._conn.commit()
+            self._cache.clear()
+
+    def sources(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT DISTINCT source FROM parents")}
+
+    def stats(self) -> dict:
+        """Raw text size vs stored size"""
+        with self._lock:
+            parents, raw_chars, stored_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0), COALESCE(SUM(LENGTH(content)), 0) FROM parents"
+            ).fetchone()
+            chunks, chunk_chars = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM("end" - start), 0) FROM chunks'
+            ).fetchone()
+        return {
+            'codec': self.codec,
+            'parents': parents,
+            'chunks': chunks,
+            'parent_chars': raw_chars,
+            'chunk_chars': chunk_chars,  # Столько символов хранилось бы при копии текста в каждом чанке
+            'stored_bytes': stored_bytes,
+            'file_bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CorpusDocstore(Docstore, AddableMixin):
+    """LangChain docstore backed by CorpusStore: FAISS keeps only ids in memory and
+    chunks are materialized from disk when retrieved.
+
+    A docstore unpickled from a saved index (the corpus loaded for serving) is
+    read-only: chunks added afterwards, e.g. pages fetched live for a question, are
+    kept in ``live`` and pickled with the index, so they never end up in the ingest
+    database. The ingestor writes through a docstore built from its CorpusStore.
+    """
+
+    def __init__(self, store: Union[CorpusStore, str], read_only: bool = False):
+        self.store = store if isinstance(store, CorpusStore) else CorpusStore(store)
+        self.read_only = read_only
+        self.live: Dict[str, Document] = {}
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        if self.read_only:
+            self.live.update(texts)
+        else:
+            self.store.add_chunks(texts)
+
+    def search(self, search: str) -> Union[str, Document]:
+        document = self.live.get(search) or self.store.get_chunk(search)
+        if document is None:
+            return f"ID {search} not found."
+        return document
+
+    def mget(self, ids: List[str]) -> List[Optional[Document]]:
+        return [self.live.get(chunk_id) or self.store.get_chunk(chunk_id) for chunk_id in ids]
+
+    def delete(self, ids: List) -> None:
+        if self.read_only:
+            for chunk_id in ids:
+                self.live.pop(chunk_id, None)
+        else:
+            self.store.delete_chunks(ids)
+
+    def sources(self) -> set:
+        return self.store.sources() | {doc.metadata.get('source') for doc in list(self.live.values())}
+
+    # FAISS.save_local pickles the docstore: сохраняем путь к базе и живые чанки, не сам корпус
+    def __getstate__(self):
+        return {'path': os.path.abspath(self.store.path), 'live': dict(self.live)}
+
+    def __setstate__(self, state):
+        self.store = CorpusStore(state['path'])
+        self.read_only = True
+        self.live = state.get('live', {})
\ No newline at end of file
@@ -1,15 +1,33 @@
-import os
-from typing import List
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Tuple
 from langchain.schema import Document
 from config.settings import settings, SearchMode
 
 from .consultant_plus_loader import ConsultantPlusLoader
 from .pptx_loader import PPTXLoader
+from .local_corpus_loader import LocalCorpusLoader
+from .sources import DocumentSource, ConsultantPlusSource, PPTXSource
+from src.utils.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+# Источник, уважающий дедлайн, успевает вернуть частичный результат чуть позже него
+DEADLINE_GRACE = 0.2
 
 class DocumentLoader:
-    """Main document loader that supports multiple sources"""
+    """Main document loader that supports multiple sources.
+    
+    Sources (see DocumentSource) load concurrently, each with its own timeout; a
+    source that fails or times out is skipped without affecting the others, so the
+    load time of a question is the time of its slowest source, not the sum. With a
+    deadline, sources still running when it expires are skipped as well.
+    """
     
-    def __init__(self, use_consultant_plus: bool = None, use_pptx: bool = None):
+    def __init__(self, use_consultant_plus: bool = None, use_pptx: bool = None,
+                 consultant_loader: ConsultantPlusLoader = None, pptx_loader: PPTXLoader = None,
+                 corpus_loader: LocalCorpusLoader = None, sources: List[DocumentSource] = None):
         # Determine which sources to use based on settings
         if use_consultant_plus is None:
             use_consultant_plus = settings.SEARCH_MODE in [SearchMode.CONSULTANT_ONLY, SearchMode.BOTH]
@@ -19,34 +37,76 @@ class DocumentLoader:
         
         self.use_consultant_plus = use_consultant_plus
         self.use_pptx = use_pptx
+        self.sources: List[DocumentSource] = []
         
         # Initialize loaders
         if self.use_consultant_plus:
-            self.consultant_loader = ConsultantPlusLoader()
+            self.consultant_loader = consultant_loader or ConsultantPlusLoader()
+            # Локальный корпус (scripts/ingest_consultant.py) - основной источник, живой поиск - запасной.
+            # Его передает владелец индекса (RAGPipeline): сам загрузчик корпус не открывает
+            self.corpus_loader = corpus_loader
+            self.register_source(ConsultantPlusSource(self.consultant_loader, self.corpus_loader))
         
         if self.use_pptx:
-            self.pptx_loader = PPTXLoader()
+            self.pptx_loader = pptx_loader or PPTXLoader()
+            self.register_source(PPTXSource(self.pptx_loader))
+        
+        for source in sources or []:
+            self.register_source(source)
+        
+        self._executor = ThreadPoolExecutor(max_workers=settings.SOURCE_WORKERS, thread_name_prefix="source")
     
-    def load_documents_from_query(self, query: str) -> List[Document]:
-        """Load documents from all configured sources based on query"""
-        all_documents = []
+    def register_source(self, source: DocumentSource):
+        """Add a source; documents are returned in registration order"""
+        self.sources.append(source)
+    
+    def _run_source(self, source: DocumentSource, query: str, deadline: Deadline) -> dict:
+        started = time.perf_counter()
+        try:
+            documents, skipped = source.load_with_skipped(query, deadline)
+        except Exception as e:
+            # Ошибка одного источника не должна ронять остальные
+            logger.warning(f"Source '{source.name}' failed: {e}")
+            return {'status': 'error', 'documents': [], 'error': str(e), 'seconds': time.perf_counter() - started}
+        return {'status': 'ok', 'documents': documents, 'skipped': skipped, 'seconds': time.perf_counter() - started}
+    
+    def load_with_report(self, query: str, search_mode: SearchMode = None, deadline: Deadline = None,
+                         live: bool = True) -> Tuple[List[Document], Dict[str, dict]]:
+        """Load from all enabled sources concurrently (``live=False`` leaves out network sources, see SourceRouter).
         
-        # Load from Consultant Plus if enabled
-        if self.use_consultant_plus:
-            print("  Поиск на Консультант+")
-            consultant_docs = self.consultant_loader.load_documents(query)
-            print(f"  Нашлось {len(consultant_docs)} страниц на Консультант+")
-            all_documents.extend(consultant_docs)
+        The report has status (ok / error / timeout), document count, skipped items and time per source.
+        """
+        deadline = deadline or Deadline()
+        sources = [source for source in self.sources if source.enabled_for(search_mode) and (live or not source.live)]
+        started = time.perf_counter()
+        futures = {source.name: self._executor.submit(self._run_source, source, query, deadline) for source in sources}
         
-        # Load from PPTX files if enabled
-        if self.use_pptx:
-            print("  Поиск PPTX файлов...")
-            pptx_docs = self.pptx_loader.load_documents_from_query(query)
-            print(f"  Нашлось {len(pptx_docs)} PPTX файлов")
-            all_documents.extend(pptx_docs)
+        all_documents = []
+        report = {}
+        for source in sources:
+            future = futures[source.name]
+            timeout = source.timeout if source.timeout is not None else settings.SOURCE_TIMEOUT
+            # Все источники стартовали одновременно: таймаут отсчитывается от общего старта
+            remaining = max(0.0, started + timeout - time.perf_counter())
+            if deadline.remaining() is not None:
+                remaining = min(remaining, deadline.remaining() + DEADLINE_GRACE)
+            done, _ = wait([future], timeout=remaining)
+            if not done:
+                future.cancel()
+                logger.warning(f"Source '{source.name}' timed out after {time.perf_counter() - started:.1f}s")
+                report[source.name] = {'status': 'timeout', 'documents': 0, 'seconds': time.perf_counter() - started}
+                continue
+            outcome = future.result()
+            all_documents.extend(outcome['documents'])
+            report[source.name] = {**outcome, 'documents': len(outcome['documents'])}
         
-        # print(f"Total documents loaded: {len(all_documents)}")
-        return all_documents
+        return all_documents, report
+    
+    def load_documents_from_query(self, query: str, search_mode: SearchMode = None,
+                                  deadline: Deadline = None) -> List[Document]:
+        """Load documents from all configured sources based on query (search_mode can narrow them per query)"""
+        documents, _ = self.load_with_report(query, search_mode=search_mode, deadline=deadline)
+        return documents
     
     def load_documents(self, query: str = None) -> List[Document]:
         """Alias for load_documents_from_query for backward compatibility"""
@@ -0,0 +1,49 @@
+import os
+from typing import List
+from langchain.schema import Document
+from config.settings import settings
+
+CORPUS_ORIGIN = "corpus"
+
+
+class LocalCorpusLoader:
+    """Loads Консультант Плюс content from the pre-ingested local corpus (see scripts/ingest_consultant.py).
+
+    Searches ``vector_manager`` when given (e.g. a pipeline whose warm index is the
+    corpus), otherwise loads the corpus index with ``embeddings`` (the backend it was
+    built with must match, see VectorStoreManager.check_backend).
+    """
+    
+    def __init__(self, vector_manager=None, corpus_path: str = None, k: int = None, min_relevance: float = None,
+                 embeddings=None):
+        self.corpus_path = corpus_path or settings.CORPUS_PATH
+        self.k = k or settings.CORPUS_SEARCH_K
+        self.min_relevance = min_relevance if min_relevance is not None else settings.CORPUS_MIN_RELEVANCE
+        
+        if vector_manager is None:
+            from src.processing.embeddings import EmbeddingManager
+            from src.retrieval.vector_store import VectorStoreManager
+            
+            vector_manager = VectorStoreManager(embeddings or EmbeddingManager().get_embeddings())
+            vector_manager.load_vector_store(self.corpus_path)
+        self.vector_manager = vector_manager
+    
+    @staticmethod
+    def is_available(corpus_path: str = None) -> bool:
+        corpus_path = corpus_path or settings.CORPUS_PATH
+        return bool(corpus_path) and os.path.isdir(corpus_path)
+    
+    def load_documents(self, query: str) -> List[Document]:
+        """Return corpus chunks relevant to the query (empty list means: fall back to live fetch)"""
+        results = self.vector_manager.similarity_search_with_relevance_scores(
+            query, k=self.k, filter={'origin': CORPUS_ORIGIN}
+        )
+        documents = []
+        for doc, relevance in results:
+            if relevance < self.min_relevance:
+                continue
+            metadata = dict(doc.metadata)
+            metadata['relevance'] = relevance
+            metadata['original_query'] = query
+            documents.append(Document(page_content=doc.page_content, metadata=metadata))
+        return documents
\ No newline at end of file
@@ -1,7 +1,9 @@
 import os
-from typing import List
+from typing import TYPE_CHECKING, Callable, List, Optional
 from langchain.schema import Document
-from pptx import Presentation
+
+if TYPE_CHECKING:
+    from .pptx_watcher import PPTXWatcher
 
 class PPTXLoader:
     """Loader for PPTX files from local directory"""
@@ -13,12 +15,14 @@ class PPTXLoader:
         else:
             self.folder_path = folder_path
         
-        if not os.path.exists(self.folder_path):
+        if not self.folder_path or not os.path.exists(self.folder_path):
             # # print(f"PPTX folder does not exist: {self.folder_path}")
             self.folder_path = None
     
-    def load_pptx_content(self, file_path: str) -> str:
-        """Extract text content from PPTX file"""
+    def load_pptx_content(self, file_path: str, raise_errors: bool = False) -> str:
+        """Extract text content from PPTX file (errors give "" unless ``raise_errors``)"""
+        from pptx import Presentation  # python-pptx нужен только при разборе файлов
+        
         try:
             # # print(f"Loading PPTX content from: {file_path}")
             presentation = Presentation(file_path)
@@ -46,8 +50,37 @@ class PPTXLoader:
             
         except Exception as e:
             # print(f"Error loading PPTX file {file_path}: {e}")
+            if raise_errors:
+                raise
             return ""
     
+    def list_files(self) -> List[str]:
+        """Paths of all PPTX files in the folder (Office lock files ~$deck.pptx skipped, as by the watcher)"""
+        from .pptx_watcher import is_deck
+        
+        pptx_files = []
+        for root, dirs, files in os.walk(self.folder_path):
+            for file in files:
+                if is_deck(file):
+                    pptx_files.append(os.path.join(root, file))
+        return pptx_files
+    
+    def load_file(self, file_path: str, query: str = None, raise_errors: bool = False) -> Optional[Document]:
+        """Load one PPTX file as a Document (None if it has no text or, unless ``raise_errors``, cannot be read)"""
+        content = self.load_pptx_content(file_path, raise_errors)
+        if not content:
+            return None
+        
+        # Create LangChain Document with metadata
+        metadata = {
+            'source': file_path,
+            'title': os.path.basename(file_path),
+            'type': 'pptx',
+            'original_query': query if query else "general",
+            'search_mode': 'local'
+        }
+        return Document(page_content=content, metadata=metadata)
+    
     def load_documents(self, query: str = None) -> List[Document]:
         """Load all PPTX documents from folder"""
         if not self.folder_path or not os.path.exists(self.folder_path):
@@ -55,40 +88,22 @@ class PPTXLoader:
             return []
         
         documents = []
-        pptx_files = []
-        
-        # Find all PPTX files
-        for root, dirs, files in os.walk(self.folder_path):
-            for file in files:
-                if file.lower().endswith('.pptx'):
-                    pptx_files.append(os.path.join(root, file))
-        
-        for i, file_path in enumerate(pptx_files):
-            
-            content = self.load_pptx_content(file_path)
-            if content:
-                # Create LangChain Document with metadata
-                metadata = {
-                    'source': file_path,
-                    'title': os.path.basename(file_path),
-                    'type': 'pptx',
-                    'original_query': query if query else "general",
-                    'search_mode': 'local'
-                }
-                
-                document = Document(
-                    page_content=content,
-                    metadata=metadata
-                )
+        for file_path in self.list_files():
+            document = self.load_file(file_path, query)
+            if document is not None:
                 documents.append(document)
-                # # print(f"Successfully loaded PPTX document {i+1}")
-            else:
-                # # print(f"Failed to load content for PPTX file {i+1}")
-                pass
         
         # # print(f"Loaded {len(documents)} PPTX documents")
         return documents
     
+    def watch(self, on_change: Callable[[str, bool], None], debounce: float = None) -> "PPTXWatcher":
+        """Start watching the folder: on_change(path, exists) is called for every changed deck"""
+        from .pptx_watcher import PPTXWatcher
+        
+        if not self.folder_path:
+            raise ValueError("PPTX folder is not available, nothing to watch")
+        return PPTXWatcher(self.folder_path, on_change, debounce=debounce).start()
+    
     def load_documents_from_query(self, query: str) -> List[Document]:
         """Load PPTX documents for query (currently loads all, could implement filtering)"""
         # For now, load all documents. Could implement content filtering later
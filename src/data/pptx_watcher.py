@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from config.settings import settings
+
+try:
+    import inotify_simple
+except ImportError:  # inotify необязателен: без него папка опрашивается по mtime
+    inotify_simple = None
+
+logger = logging.getLogger(__name__)
+
+
+def is_deck(path: str) -> bool:
+    """A presentation file, not an Office lock file (~$deck.pptx) or a temporary copy"""
+    name = os.path.basename(path)
+    return name.lower().endswith('.pptx') and not name.startswith(('~$', '.'))
+
+
+class PPTXWatcher:
+    """Watches a PPTX folder and reports changed decks once they stop changing.
+
+    Uses inotify (the optional ``inotify_simple`` package, Linux only) when available
+    and polls file mtimes and sizes otherwise. PowerPoint saves a deck in several
+    writes, so every change is debounced: ``on_change(path, exists)`` is called only
+    after the file has been quiet for ``debounce`` seconds. Callbacks run on the
+    watcher thread one at a time; an exception in a callback is logged and the deck
+    is retried after ``retry_delay`` seconds, up to ``max_retries`` times in a row,
+    then on its next change.
+    """
+
+    def __init__(self, folder_path: str, on_change: Callable[[str, bool], None], debounce: float = None,
+                 poll_interval: float = None, use_inotify: bool = None, retry_delay: float = None,
+                 max_retries: int = None):
+        self.folder_path = folder_path
+        self.on_change = on_change
+        self.debounce = settings.PPTX_WATCH_DEBOUNCE if debounce is None else debounce
+        self.poll_interval = settings.PPTX_WATCH_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.use_inotify = inotify_simple is not None if use_inotify is None else use_inotify
+        self.retry_delay = settings.PPTX_WATCH_RETRY_DELAY if retry_delay is None else retry_delay
+        self.max_retries = settings.PPTX_WATCH_MAX_RETRIES if max_retries is None else max_retries
+        if self.use_inotify and inotify_simple is None:
+            raise ImportError("inotify watch mode requires 'inotify_simple': pip install inotify_simple")
+
+        self._pending: Dict[str, float] = {}  # Путь -> время последнего события
+        self._files: Dict[str, Tuple[float, int]] = {}  # Путь -> (mtime, размер) для опроса
+        self._failures: Dict[str, int] = {}  # Путь -> неудачных переиндексаций подряд
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {'events': 0, 'changes': 0, 'errors': 0, 'retries': 0}
+
+    @property
+    def backend(self) -> str:
+        return 'inotify' if self.use_inotify else 'polling'
+
+    # ---- lifecycle ----
+
+    def start(self) -> "PPTXWatcher":
+        self._files = self._scan()
+        target = self._run_inotify if self.use_inotify else self._run_polling
+        self._thread = threading.Thread(target=target, name="pptx-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.folder_path} for PPTX changes ({self.backend}, debounce {self.debounce}s)")
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ---- events ----
+
+    def _touch(self, path: str):
+        self._pending[path] = time.monotonic()
+        self._failures.pop(path, None)
+        self._stats['events'] += 1
+
+    def _flush(self):
+        """Report decks that have been quiet for at least ``debounce`` seconds"""
+        now = time.monotonic()
+        ready = [path for path, last_event in self._pending.items() if now - last_event >= self.debounce]
+        for path in ready:
+            del self._pending[path]
+            try:
+                self.on_change(path, os.path.exists(path))
+                self._stats['changes'] += 1
+                self._failures.pop(path, None)
+            except Exception as e:
+                self._stats['errors'] += 1
+                failures = self._failures[path] = self._failures.get(path, 0) + 1
+                if failures <= self.max_retries:
+                    # Повтор через retry_delay: отметка события сдвигается в будущее
+                    self._pending[path] = now + self.retry_delay
+                    self._stats['retries'] += 1
+                    logger.error(f"Re-indexing {path} failed ({failures}), retrying in {self.retry_delay:.1f}s: {e}")
+                else:
+                    self._failures.pop(path, None)
+                    logger.error(f"Re-indexing {path} failed, waiting for the next change: {e}")
+
+    # ---- polling ----
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        files = {}
+        for root, dirs, names in os.walk(self.folder_path):
+            for name in names:
+                path = os.path.join(root, name)
+                if not is_deck(path):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:  # Файл удалили между walk и stat
+                    continue
+                files[path] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def _run_polling(self):
+        while not self._stop.wait(self.poll_interval):
+            files = self._scan()
+            for path in files.keys() | self._files.keys():
+                if files.get(path) != self._files.get(path):
+                    self._touch(path)
+            self._files = files
+            self._flush()
+
+    # ---- inotify ----
+
+    def _run_inotify(self):
+        flags = inotify_simple.flags
+        mask = (flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.DELETE
+                | flags.CREATE | flags.DELETE_SELF)
+        watches = {}
+
+        def add_watch(directory: str):
+            for root, dirs, names in os.walk(directory):
+                watches[inotify.add_watch(root, mask)] = root
+
+        with inotify_simple.INotify() as inotify:
+            add_watch(self.folder_path)
+            while not self._stop.is_set():
+                # Пока есть отложенные события, просыпаемся не реже debounce, чтобы не пропустить их срок
+                timeout = min(self.debounce, self.poll_interval) if self._pending else self.poll_interval
+                for event in inotify.read(timeout=int(timeout * 1000)):
+                    directory = watches.get(event.wd)
+                    if directory is None or not event.name:
+                        continue
+                    path = os.path.join(directory, event.name)
+                    if event.mask & flags.ISDIR:
+                        if event.mask & (flags.CREATE | flags.MOVED_TO):
+                            add_watch(path)
+                            for deck in self._scan_directory(path):
+                                self._touch(deck)
+                        continue
+                    if is_deck(path):
+                        self._touch(path)
+                self._flush()
+
+    @staticmethod
+    def _scan_directory(directory: str):
+        for root, dirs, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if is_deck(path):
+                    yield path
+
+    def stats(self) -> dict:
+        return {'backend': self.backend, 'pending': len(self._pending), **self._stats}
\ No newline at end of file
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+from config.settings import settings, SearchMode
+
+from src.utils.deadline import Deadline
+
+if TYPE_CHECKING:
+    from .document_loader import DocumentLoader
+
+logger = logging.getLogger(__name__)
+
+ROUTE_LOCAL = "local"
+ROUTE_LIVE = "live"
+
+
+class SourceRouter:
+    """Sends a question to live sources only when the resident index cannot answer it.
+
+    Before loading, the question is searched in the shared index (the query embedding
+    lands in the cache, so generation reuses it). The index is trusted when the best
+    hit reaches ``min_top_score`` and at least ``min_coverage`` of the top ``k`` hits
+    reach ``coverage_score`` (relevance in [0, 1]). Confident questions are answered
+    from local data: live sources (Консультант+ scraping) are skipped and only local
+    ones (PPTX) are loaded. Other questions go through DocumentLoader as before.
+
+    The check embeds the question, so it may fail or stall on the embeddings API: an
+    error or a check slower than ``timeout`` (and the remaining deadline) routes the
+    question live, as if the index were not confident.
+
+    Every decision is logged with its scores and load latency, and per-route counts
+    and latencies are kept for /metrics, so the thresholds can be tuned.
+    """
+
+    def __init__(self, vector_manager, k: int = None, min_top_score: float = None, coverage_score: float = None,
+                 min_coverage: float = None, timeout: float = None):
+        self.vector_manager = vector_manager
+        self.k = k or settings.ROUTER_K
+        self.min_top_score = settings.ROUTER_MIN_TOP_SCORE if min_top_score is None else min_top_score
+        self.coverage_score = settings.ROUTER_COVERAGE_SCORE if coverage_score is None else coverage_score
+        self.min_coverage = settings.ROUTER_MIN_COVERAGE if min_coverage is None else min_coverage
+        self.timeout = timeout or settings.ROUTER_TIMEOUT
+        self._executor = ThreadPoolExecutor(max_workers=settings.SOURCE_WORKERS, thread_name_prefix="router")
+        self._lock = threading.Lock()
+        self._stats = {route: {'questions': 0, 'seconds': 0.0} for route in (ROUTE_LOCAL, ROUTE_LIVE)}
+
+    def assess(self, question: str, search_mode: Optional[SearchMode] = None) -> dict:
+        """Top relevance and coverage of the resident index for a question"""
+        from src.retrieval.partitioned_store import partitions_for_mode
+
+        hits = self.vector_manager.similarity_search_with_relevance_scores(
+            question, k=self.k, partitions=partitions_for_mode(search_mode)
+        )
+        scores = [score for _, score in hits]
+        top_score = max(scores, default=0.0)
+        coverage = sum(score >= self.coverage_score for score in scores) / self.k
+        return {
+            'top_score': top_score,
+            'coverage': coverage,
+            'confident': top_score >= self.min_top_score and coverage >= self.min_coverage,
+        }
+
+    def load_with_report(self, loader: "DocumentLoader", question: str, search_mode: SearchMode = None,
+                         deadline: Deadline = None) -> Tuple[List[Document], Dict[str, dict]]:
+        """DocumentLoader.load_with_report behind the routing decision (reported as the ``router`` entry)"""
+        started = time.perf_counter()
+        deadline = deadline or Deadline()
+        check = 'ok'
+        timeout = deadline.timeout(self.timeout)
+        future = self._executor.submit(self.assess, question, search_mode)
+        try:
+            assessment = future.result(timeout=timeout)
+        except FutureTimeout:
+            # Проверка не успела: не ждем ее, идем за живыми источниками
+            check = 'timeout'
+            logger.warning(f"Router check exceeded {timeout:.1f}s, routing live")
+        except Exception as e:
+            check = 'error'
+            logger.warning(f"Router check failed, routing live: {e}")
+        if check != 'ok':
+            assessment = {'top_score': 0.0, 'coverage': 0.0, 'confident': False}
+        route = ROUTE_LOCAL if assessment['confident'] else ROUTE_LIVE
+        check_seconds = time.perf_counter() - started
+
+        documents, report = loader.load_with_report(question, search_mode=search_mode, deadline=deadline,
+                                                    live=route == ROUTE_LIVE)
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._stats[route]['questions'] += 1
+            self._stats[route]['seconds'] += seconds
+
+        logger.info(f"Route {route}: top {assessment['top_score']:.2f}, coverage {assessment['coverage']:.2f}, "
+                    f"check {check_seconds:.3f}s, load {seconds:.2f}s")
+        # status остается ok: сбой проверки не пропускает источники, а отправляет вопрос за живыми
+        report['router'] = {'status': 'ok', 'check': check, 'documents': 0, 'route': route, 'seconds': check_seconds,
+                            'top_score': assessment['top_score'], 'coverage': assessment['coverage']}
+        return documents, report
+
+    def stats(self) -> dict:
+        """Questions, share and mean load latency per route"""
+        with self._lock:
+            total = sum(route['questions'] for route in self._stats.values())
+            return {
+                name: {
+                    'questions': route['questions'],
+                    'share': route['questions'] / total if total else 0.0,
+                    'mean_seconds': route['seconds'] / route['questions'] if route['questions'] else 0.0,
+                }
+                for name, route in self._stats.items()
+            }
\ No newline at end of file
@@ -0,0 +1,79 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+from langchain.schema import Document
+from config.settings import SearchMode
+from src.utils.deadline import Deadline
+
+from .consultant_plus_loader import ConsultantPlusLoader
+from .pptx_loader import PPTXLoader
+from .local_corpus_loader import LocalCorpusLoader
+
+
+class DocumentSource(ABC):
+    """Plug-in interface for DocumentLoader: one independent place to load documents from.
+
+    Sources are loaded concurrently, so ``load`` must not depend on other sources.
+    ``search_modes`` lists the modes in which the source is used, ``timeout``
+    overrides settings.SOURCE_TIMEOUT. ``deadline`` is the question's latency budget:
+    a source may return partial results when it runs out. ``live`` sources fetch over
+    the network and are skipped when the resident index already answers the question.
+    """
+
+    name = "source"
+    search_modes = (SearchMode.BOTH,)
+    timeout: Optional[float] = None
+    live = False
+
+    @abstractmethod
+    def load(self, query: str, deadline: Deadline = None) -> List[Document]:
+        """Documents relevant to the query"""
+
+    def load_with_skipped(self, query: str, deadline: Deadline = None) -> Tuple[List[Document], List[str]]:
+        """Documents plus the sources (URLs, files) skipped because they failed or were late"""
+        return self.load(query, deadline), []
+
+    def enabled_for(self, search_mode: Optional[SearchMode]) -> bool:
+        return search_mode is None or search_mode in self.search_modes
+
+
+class ConsultantPlusSource(DocumentSource):
+    """Консультант Плюс: the local corpus first, live search as a fallback"""
+
+    name = "consultant"
+    search_modes = (SearchMode.CONSULTANT_ONLY, SearchMode.BOTH)
+    live = True
+
+    def __init__(self, consultant_loader: ConsultantPlusLoader = None, corpus_loader: LocalCorpusLoader = None):
+        self.consultant_loader = consultant_loader or ConsultantPlusLoader()
+        self.corpus_loader = corpus_loader
+
+    def load(self, query: str, deadline: Deadline = None) -> List[Document]:
+        return self.load_with_skipped(query, deadline)[0]
+
+    def load_with_skipped(self, query: str, deadline: Deadline = None) -> Tuple[List[Document], List[str]]:
+        documents, skipped = [], []
+        if self.corpus_loader is not None:
+            documents = self.corpus_loader.load_documents(query)
+            print(f"  Нашлось {len(documents)} фрагментов Консультант+ в локальном корпусе")
+
+        if not documents:
+            print("  Поиск на Консультант+")
+            documents, skipped = self.consultant_loader.load_documents_with_skipped(query, deadline)
+            print(f"  Нашлось {len(documents)} страниц на Консультант+")
+        return documents, skipped
+
+
+class PPTXSource(DocumentSource):
+    """Presentations from the local PPTX folder"""
+
+    name = "pptx"
+    search_modes = (SearchMode.PPTX_ONLY, SearchMode.BOTH)
+
+    def __init__(self, pptx_loader: PPTXLoader = None):
+        self.pptx_loader = pptx_loader or PPTXLoader()
+
+    def load(self, query: str, deadline: Deadline = None) -> List[Document]:
+        print("  Поиск PPTX файлов...")
+        documents = self.pptx_loader.load_documents_from_query(query)
+        print(f"  Нашлось {len(documents)} PPTX файлов")
+        return documents
\ No newline at end of file
@@ -0,0 +1,266 @@
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from langchain.schema import Document
+from config.settings import settings
+from src.retrieval.query_cache import QueryEmbeddingCache, get_default_cache
+from typing import Any, List, Optional, Tuple
+import numpy as np
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Граница предложения внутри строки: конец предложения перед заглавной буквой.
+# Сокращения вида "ст. 5", "п. 2" не режутся, потому что за ними идет не заглавная буква
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;])\s+(?=[А-ЯЁA-Z«"(])')
+_LINE = re.compile(r'[^\n]+')
+# Заголовок статьи. Страницы Консультант+ приходят одной строкой, поэтому заголовок ищется
+# и внутри строки, как в content_chunker._HEADING; ссылки "статьей 115" и "Статья 81 ТК" не подходят
+_ARTICLE_HEADING = re.compile(r'(?<!\S)Статья\s+\d+(?:\.\d+)*\.(?=\s|$)')
+_HEADING_TITLE_CHARS = 150  # Название статьи до конца строки берется в заголовок, если оно не длиннее
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# Предлоги, союзы и прочие слова, которые не говорят о теме вопроса
+_STOP_WORDS = frozenset(
+    "для что как при или его она они это если без над под про где когда какой какие "
+    "который которые может можно нужно ли не ни же быть был была были есть".split()
+)
+_STEM_LENGTH = 6  # Грубая основа слова: отпуск / отпуска / отпуском совпадают
+
+
+def _terms(text: str) -> List[str]:
+    return [token[:_STEM_LENGTH] for token in _TOKEN.findall(text.lower())
+            if len(token) > 2 and token not in _STOP_WORDS]
+
+
+def _is_title(rest: str) -> bool:
+    """Whether the rest of a heading line is just the article title (short, no sentences in it)"""
+    rest = rest.strip()
+    return (len(rest) <= _HEADING_TITLE_CHARS and not rest.endswith(('.', '!', '?', ';'))
+            and not _SENTENCE_BOUNDARY.search(rest) and not _ARTICLE_HEADING.search(rest))
+
+
+class _Sentence:
+    __slots__ = ('document', 'start', 'end', 'text', 'heading')
+
+    def __init__(self, document: int, start: int, end: int, text: str, heading: Optional[str]):
+        self.document = document
+        self.start = start
+        self.end = end
+        self.text = text
+        self.heading = heading
+
+
+class ContextCompressor:
+    """Extractive compression of retrieved chunks before they go into the prompt.
+
+    Chunks are split into sentences and every sentence is scored against the question
+    in one vectorized pass: IDF-weighted overlap of word stems plus cosine similarity of
+    sentence embeddings (cached, since the same articles are retrieved again and again).
+    The best sentence of every chunk is always kept, the rest of ``max_chars`` goes to
+    the best sentences overall. Kept sentences stay in their original order, prefixed
+    with the heading of their article ("Статья 115. ..."). Metadata is copied unchanged,
+    so citations still point to the original ``source``.
+    """
+
+    def __init__(self, embeddings=None, max_chars: int = None, lexical_weight: float = None,
+                 cache: QueryEmbeddingCache = None, query_cache: QueryEmbeddingCache = None):
+        self.embeddings = embeddings
+        self.max_chars = max_chars or settings.COMPRESSION_MAX_CHARS
+        self.lexical_weight = settings.COMPRESSION_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+        self.cache = cache or QueryEmbeddingCache(max_size=settings.COMPRESSION_CACHE_SIZE)
+        self.query_cache = query_cache or get_default_cache()
+        self.backend_id = getattr(embeddings, 'backend_id', type(embeddings).__name__)
+
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'documents': 0, 'sentences': 0, 'kept_sentences': 0,
+                       'chars_in': 0, 'chars_out': 0}
+
+    # ---- splitting ----
+
+    @staticmethod
+    def split_sentences(text: str) -> List[Tuple[int, Optional[int], str]]:
+        """(start, end, heading) of the sentences of a text.
+
+        Article headings ("Статья 115. ...") are not sentences: they are returned with
+        end=None and become the heading of the sentences that follow. A heading on its
+        own line keeps its title; when sentences follow on the same line (one-line
+        Consultant+ pages) only "Статья 115." is taken, since nothing marks where the title ends.
+        """
+        spans, heading = [], None
+
+        def sentences(start: int, end: int):
+            for boundary in _SENTENCE_BOUNDARY.finditer(text, start, end):
+                spans.append((start, boundary.start(), heading))
+                start = boundary.end()
+            spans.append((start, end, heading))
+
+        for line in _LINE.finditer(text):
+            start = line.start()
+            for match in _ARTICLE_HEADING.finditer(text, line.start(), line.end()):
+                if match.start() < start:
+                    continue
+                sentences(start, match.start())
+                start = line.end() if _is_title(text[match.end():line.end()]) else match.end()
+                heading = text[match.start():start].strip()
+                spans.append((match.start(), None, heading))
+            sentences(start, line.end())
+        return [(s, e, h) for s, e, h in spans if e is None or text[s:e].strip()]
+
+    def _sentences(self, documents: List[Document]) -> List[_Sentence]:
+        sentences = []
+        for index, doc in enumerate(documents):
+            text = doc.page_content
+            for start, end, heading in self.split_sentences(text):
+                if end is not None:
+                    sentences.append(_Sentence(index, start, end, text[start:end], heading))
+        return sentences
+
+    # ---- scoring ----
+
+    @staticmethod
+    def lexical_scores(question: str, sentences: List[str]) -> np.ndarray:
+        """IDF-weighted share of the question stems found in each sentence"""
+        query_terms = list(dict.fromkeys(_terms(question)))
+        if not query_terms or not sentences:
+            return np.zeros(len(sentences), dtype=np.float32)
+        column = {term: i for i, term in enumerate(query_terms)}
+        matches = np.zeros((len(sentences), len(query_terms)), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for term in _terms(sentence):
+                i = column.get(term)
+                if i is not None:
+                    matches[row, i] = 1.0
+        df = matches.sum(axis=0)
+        idf = np.log1p(len(sentences) / (df + 1.0)).astype(np.float32)
+        return matches @ idf / max(float(idf.sum()), 1e-9)
+
+    def _sentence_vectors(self, sentences: List[str]) -> np.ndarray:
+        """Sentence embeddings; only sentences missing from the cache are embedded (in one batch)"""
+        vectors = [self.cache.get(text, self.backend_id) for text in sentences]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            texts = [sentences[i] for i in missing]
+            if hasattr(self.embeddings, 'embed_batch'):
+                embedded = self.embeddings.embed_batch(texts)
+            else:
+                embedded = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            for i, vector in zip(missing, embedded):
+                vectors[i] = np.asarray(vector, dtype=np.float32)
+                self.cache.put(sentences[i], self.backend_id, vectors[i])
+        return np.vstack(vectors)
+
+    def semantic_scores(self, question: str, sentences: List[str]) -> np.ndarray:
+        """Cosine similarity between the question and each sentence"""
+        if self.embeddings is None or not sentences:
+            return np.zeros(len(sentences), dtype=np.float32)
+        query = self.query_cache.get_or_compute(question, self.backend_id, self.embeddings.embed_query)
+        matrix = self._sentence_vectors(sentences)
+        norms = np.linalg.norm(matrix, axis=1) * max(float(np.linalg.norm(query)), 1e-9)
+        norms[norms == 0] = 1.0
+        return (matrix @ query / norms).astype(np.float32)
+
+    def score(self, question: str, sentences: List[str]) -> np.ndarray:
+        lexical = self.lexical_scores(question, sentences)
+        if self.embeddings is None:
+            return lexical
+        semantic = self.semantic_scores(question, sentences)
+        return self.lexical_weight * lexical + (1.0 - self.lexical_weight) * semantic
+
+    # ---- selection ----
+
+    def _select(self, sentences: List[_Sentence], scores: np.ndarray) -> set:
+        selected, used = set(), 0
+        order = np.argsort(-scores, kind='stable')
+
+        # Лучшее предложение каждого чанка, чтобы не потерять ни один источник
+        best_per_document = {}
+        for i in order:
+            best_per_document.setdefault(sentences[i].document, int(i))
+        for i in sorted(best_per_document.values(), key=lambda i: -scores[i]):
+            selected.add(i)
+            used += len(sentences[i].text)
+
+        for i in order:
+            i = int(i)
+            if i in selected:
+                continue
+            length = len(sentences[i].text)
+            if used + length > self.max_chars:
+                continue
+            selected.add(i)
+            used += length
+        return selected
+
+    def _assemble(self, document: Document, sentences: List[_Sentence], total: int) -> Document:
+        metadata = dict(document.metadata)
+        metadata['compressed_from'] = len(document.page_content)
+        if len(sentences) == total:  # Все предложения релевантны: чанк остается как есть
+            return Document(page_content=document.page_content, metadata=metadata)
+
+        parts, heading, previous_end = [], None, None
+        for sentence in sentences:
+            if sentence.heading and sentence.heading != heading:
+                parts.append(sentence.heading)
+            heading = sentence.heading
+            if previous_end is not None and sentence.start > previous_end and document.page_content[previous_end:sentence.start].strip():
+                parts.append("…")
+            parts.append(sentence.text.strip())
+            previous_end = sentence.end
+        return Document(page_content="\n".join(parts), metadata=metadata)
+
+    def compress(self, question: str, documents: List[Document]) -> List[Document]:
+        """Keep the sentences most relevant to the question; chunks keep their order and metadata"""
+        if not documents:
+            return documents
+        sentences = self._sentences(documents)
+        if not sentences:
+            return documents
+
+        scores = self.score(question, [s.text for s in sentences])
+        selected = self._select(sentences, scores)
+
+        kept_by_document, total_by_document = {}, {}
+        for i, sentence in enumerate(sentences):
+            total_by_document[sentence.document] = total_by_document.get(sentence.document, 0) + 1
+            if i in selected:
+                kept_by_document.setdefault(sentence.document, []).append(sentence)
+        compressed = [self._assemble(doc, kept_by_document[index], total_by_document[index])
+                      for index, doc in enumerate(documents) if index in kept_by_document]
+
+        chars_in = sum(len(doc.page_content) for doc in documents)
+        chars_out = sum(len(doc.page_content) for doc in compressed)
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['documents'] += len(documents)
+            self._stats['sentences'] += len(sentences)
+            self._stats['kept_sentences'] += len(selected)
+            self._stats['chars_in'] += chars_in
+            self._stats['chars_out'] += chars_out
+        logger.info(f"Context compressed {chars_in} -> {chars_out} chars "
+                    f"({len(selected)} of {len(sentences)} sentences)")
+        return compressed
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['ratio'] = stats['chars_in'] / stats['chars_out'] if stats['chars_out'] else 0.0
+        stats['sentence_cache'] = self.cache.stats()
+        return stats
+
+
+class CompressingRetriever(BaseRetriever):
+    """Retriever that passes the documents of another retriever through a ContextCompressor.
+
+    ``question`` is what sentences are scored against when the chain query carries
+    more than the question itself (e.g. a system prompt).
+    """
+
+    base_retriever: Any
+    compressor: Any
+    question: Optional[str] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        documents = self.base_retriever.invoke(query, config={'callbacks': run_manager.get_child()})
+        return self.compressor.compress(self.question or query, documents)
\ No newline at end of file
@@ -1,21 +1,84 @@
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain_community.llms import YandexGPT
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from config.settings import settings
+from src.utils.rate_limiter import get_llm_rate_limiter
+from typing import List
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+GENERATION_MODES = ("auto", "stuff", "map_reduce")
+NO_ANSWER = "Нет информации"
+
+MAP_PROMPT = """Ты специалист по российскому праву. Ниже часть контекста, найденного по вопросу.
+Выпиши из нее все, что помогает ответить на вопрос: нормы, сроки, суммы, условия, номера статей.
+После каждого факта укажи номер источника в квадратных скобках, например [3].
+Используй только этот контекст. Если в нем нет ничего по вопросу, ответь "{no_answer}".
+
+Контекст:
+{context}
+
+Вопрос: {question}
+
+Факты по вопросу:"""
+
+REDUCE_PROMPT = """Ты специалист по российскому праву. Ниже выписки из разных частей контекста, найденного по вопросу.
+Объедини их в единый ответ на вопрос: убери повторы, сохрани конкретные статьи и нормативные акты.
+Сохрани ссылки на источники в квадратных скобках [n] и в конце перечисли использованные источники.
+Если выписки противоречат друг другу, укажи это.
+
+Выписки:
+{partials}
+
+Источники:
+{sources}
+
+{question}
+
+Ответ:"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt (settings.CHARS_PER_TOKEN characters per token)"""
+    return int(len(text) / settings.CHARS_PER_TOKEN) + 1
+
+
+def _source_label(doc) -> str:
+    metadata = getattr(doc, 'metadata', {})
+    return metadata.get('title') or metadata.get('source') or 'без источника'
+
+
 class QASystem:
-    """Question-Answering system with RAG"""
+    """Question-Answering system with RAG.
+
+    Small contexts are answered in one call with all chunks "stuffed" into the prompt.
+    When the retrieved context exceeds settings.MAP_REDUCE_THRESHOLD_TOKENS (or with
+    ``generation_mode="map_reduce"``), the chunks are split into groups that are
+    answered concurrently, and one short reduce call merges the partial answers with
+    [n] citations of the numbered sources. All YandexGPT calls go through the
+    process-wide rate limiter, so concurrent questions share the quota. The map pool
+    has room for MAP_REDUCE_WORKERS calls of each of SERVER_MAX_CONCURRENCY questions,
+    and a question never has more than MAP_REDUCE_WORKERS of its calls in flight, so
+    one long question cannot hold back the others.
+    """
     
-    def __init__(self, retriever, llm=None):
+    def __init__(self, retriever, llm=None, compressor=None, generation_mode: str = None):
         self.retriever = retriever
         self.llm = llm or self._create_llm()
+        # Необязательное сжатие контекста: в промпт идут только релевантные предложения чанков
+        self.compressor = compressor
+        self.generation_mode = generation_mode or settings.GENERATION_MODE
+        if self.generation_mode not in GENERATION_MODES:
+            raise ValueError(f"Unknown generation mode: {self.generation_mode}. Available: {', '.join(GENERATION_MODES)}")
+        self.rate_limiter = get_llm_rate_limiter()
+        self._map_pool = ThreadPoolExecutor(max_workers=settings.MAP_REDUCE_WORKERS * settings.SERVER_MAX_CONCURRENCY,
+                                            thread_name_prefix="map")
         self.qa_chain = self._create_qa_chain()
     
     def _create_llm(self):
         """Create YandexGPT LLM instance"""
+        from langchain_community.llms import YandexGPT
+        
         return YandexGPT(
             folder_id=settings.FOLDER_ID,
             api_key=settings.API_KEY,
@@ -23,8 +86,11 @@ class QASystem:
             max_tokens=settings.MAX_TOKENS
         )
     
-    def _create_qa_chain(self):
+    def _create_qa_chain(self, retriever=None):
         """Create QA chain with custom prompt that handles multiple sources"""
+        from langchain.chains import RetrievalQA
+        from langchain.prompts import PromptTemplate
+        
         prompt_template = """Ты специалист по российскому праву. 
 Используй предоставленный контекст из разных источников (Консультант Плюс и локальные материалы), чтобы подробно ответить на вопрос. 
 
@@ -52,13 +118,17 @@ class QASystem:
         return RetrievalQA.from_chain_type(
             llm=self.llm,
             chain_type="stuff",
-            retriever=self.retriever,
+            retriever=retriever or self.retriever,
             chain_type_kwargs={"prompt": PROMPT},
             return_source_documents=True
         )
     
-    def query(self, question: str, system_prompt: str = None) -> dict:
-        """Query the QA system"""
+    def query(self, question: str, system_prompt: str = None, retriever=None, require_context: bool = False) -> dict:
+        """Query the QA system (optionally through another retriever, e.g. narrowed to some partitions).
+
+        With ``require_context`` nothing is generated when retrieval finds no chunks:
+        the answer is None and ``source_documents`` is empty.
+        """
         try:
             if system_prompt:
                 # Modify system prompt to include source awareness
@@ -83,24 +153,117 @@ f"""
             else:
                 full_question = question
             
-            result = self.qa_chain.invoke({"query": full_question})
+            if self.compressor is not None:
+                from .context_compressor import CompressingRetriever
+
+                # Предложения оцениваются по самому вопросу, без системного промпта
+                retriever = CompressingRetriever(
+                    base_retriever=retriever or self.retriever, compressor=self.compressor, question=question
+                )
+            qa_chain = self.qa_chain if retriever is None else self._create_qa_chain(retriever)
+            # Поиск один раз: способ генерации выбирается по объему найденного контекста
+            source_documents = qa_chain.retriever.invoke(full_question)
+            if require_context and not source_documents:
+                logger.info("Nothing retrieved, answer not generated")
+                return {
+                    "answer": None,
+                    "source_documents": [],
+                    "source_types": {},
+                    "question": question,
+                    "generation_mode": None,
+                    "context_tokens": 0,
+                    "generation_seconds": 0.0
+                }
+            context_tokens = estimate_tokens("\n\n".join(doc.page_content for doc in source_documents))
+            mode = self.choose_mode(context_tokens)
+            
+            started = time.perf_counter()
+            if mode == "map_reduce":
+                reduce_question = full_question if system_prompt else f"Вопрос: {question}"
+                answer = self._map_reduce(question, reduce_question, source_documents)
+            else:
+                self.rate_limiter.acquire()
+                answer = qa_chain.combine_documents_chain.invoke(
+                    {"input_documents": source_documents, "question": full_question}
+                )["output_text"]
+            generation_seconds = time.perf_counter() - started
+            logger.info(f"Generated with {mode}: {len(source_documents)} chunks, ~{context_tokens} tokens, "
+                        f"{generation_seconds:.2f}s")
             
             # Analyze source types for better reporting
             source_types = {}
-            if "source_documents" in result:
-                for doc in result["source_documents"]:
-                    if hasattr(doc, 'metadata'):
-                        source_type = doc.metadata.get('type', 'unknown')
-                        if source_type not in source_types:
-                            source_types[source_type] = 0
-                        source_types[source_type] += 1
+            for doc in source_documents:
+                if hasattr(doc, 'metadata'):
+                    source_type = doc.metadata.get('type', 'unknown')
+                    if source_type not in source_types:
+                        source_types[source_type] = 0
+                    source_types[source_type] += 1
             
             return {
-                "answer": result["result"],
-                "source_documents": result.get("source_documents", []),
+                "answer": answer,
+                "source_documents": source_documents,
                 "source_types": source_types,
-                "question": question
+                "question": question,
+                "generation_mode": mode,
+                "context_tokens": context_tokens,
+                "generation_seconds": generation_seconds
             }
         except Exception as e:
             logger.error(f"Error querying QA system: {e}")
-            raise
\ No newline at end of file
+            raise
+    
+    def choose_mode(self, context_tokens: int) -> str:
+        """stuff or map_reduce for a context of the given size"""
+        if self.generation_mode != "auto":
+            return self.generation_mode
+        return "map_reduce" if context_tokens > settings.MAP_REDUCE_THRESHOLD_TOKENS else "stuff"
+    
+    @staticmethod
+    def group_documents(documents: List, group_tokens: int = None) -> List[List[tuple]]:
+        """Consecutive groups of (source number, document) within ``group_tokens`` each"""
+        group_tokens = group_tokens or settings.MAP_REDUCE_GROUP_TOKENS
+        groups, current, current_tokens = [], [], 0
+        for number, doc in enumerate(documents, start=1):
+            tokens = estimate_tokens(doc.page_content)
+            if current and current_tokens + tokens > group_tokens:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append((number, doc))
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+    
+    def _invoke(self, prompt: str) -> str:
+        self.rate_limiter.acquire()
+        return self.llm.invoke(prompt).strip()
+    
+    def _map(self, question: str, group: List[tuple]) -> str:
+        context = "\n\n".join(f"[{number}] {_source_label(doc)}\n{doc.page_content}" for number, doc in group)
+        return self._invoke(MAP_PROMPT.format(context=context, question=question, no_answer=NO_ANSWER))
+    
+    def _map_all(self, question: str, groups: List[List[tuple]]) -> List[str]:
+        """Partial answers of all groups, in order, with at most MAP_REDUCE_WORKERS calls in flight"""
+        partials = [None] * len(groups)
+        pending, running = list(enumerate(groups)), {}
+        while pending or running:
+            while pending and len(running) < settings.MAP_REDUCE_WORKERS:
+                index, group = pending.pop(0)
+                running[self._map_pool.submit(self._map, question, group)] = index
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                partials[running.pop(future)] = future.result()
+        return partials
+
+    def _map_reduce(self, question: str, reduce_question: str, documents: List) -> str:
+        """Partial answers per group of chunks in parallel, then one call merging them"""
+        groups = self.group_documents(documents)
+        # Частичные ответы - по самому вопросу: системный промпт со стилем нужен только итоговому ответу
+        partials = self._map_all(question, groups)
+        useful = [partial for partial in partials if partial and not partial.startswith(NO_ANSWER)]
+        logger.info(f"Map-reduce: {len(groups)} groups, {len(useful)} with relevant facts")
+        
+        sources = "\n".join(f"[{number}] {_source_label(doc)}" for number, doc in enumerate(documents, start=1))
+        return self._invoke(REDUCE_PROMPT.format(
+            partials="\n\n".join(useful) or NO_ANSWER, sources=sources, question=reduce_question
+        ))
\ No newline at end of file
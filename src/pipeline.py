@@ -0,0 +1,407 @@
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from langchain.schema import Document
+from config.settings import settings, SearchMode, DocumentType
+
+from src.data.local_corpus_loader import LocalCorpusLoader
+from src.data.source_router import SourceRouter
+from src.processing.text_splitter import TextSplitter
+from src.processing.deduplicator import ChunkDeduplicator
+from src.processing.paragraph_filter import ParagraphPrefilter
+from src.processing.embeddings import EmbeddingManager
+from src.retrieval.partitioned_store import PartitionedVectorStoreManager, partitions_for_mode
+from src.generation.qa_chain import QASystem
+from src.utils.deadline import Deadline
+
+if TYPE_CHECKING:
+    from src.data.document_loader import DocumentLoader
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_TYPES = {
+    SearchMode.CONSULTANT_ONLY: DocumentType.CONSULTANT,
+    SearchMode.PPTX_ONLY: DocumentType.PPTX,
+    SearchMode.BOTH: DocumentType.MIXED,
+}
+
+
+class RAGPipeline:
+    """Question answering over a warm index shared by all questions.
+
+    Documents loaded for one question stay indexed for the following ones, and
+    sources that are already indexed are not split and embedded again. The index is
+    partitioned by source type, so a question can narrow the configured search mode
+    without reloading anything. All stages are thread-safe, so one pipeline can serve
+    concurrent requests.
+    """
+
+    def __init__(self, search_mode: SearchMode = None, loader: "DocumentLoader" = None,
+                 embedding_manager: EmbeddingManager = None, llm=None, index_path: str = None):
+        self.search_mode = search_mode or settings.SEARCH_MODE
+        self.document_type = DOCUMENT_TYPES[self.search_mode]
+        use_consultant_plus = self.search_mode in [SearchMode.CONSULTANT_ONLY, SearchMode.BOTH]
+
+        # Если есть локальный корпус Консультант+, он и становится теплым индексом
+        use_corpus = (index_path is None and loader is None and use_consultant_plus
+                      and settings.USE_LOCAL_CORPUS and LocalCorpusLoader.is_available())
+        if use_corpus:
+            index_path = settings.CORPUS_PATH
+
+        self.embedding_manager = embedding_manager or EmbeddingManager()
+        self.vector_manager = PartitionedVectorStoreManager(self.embedding_manager.get_embeddings())
+        if index_path:
+            self.vector_manager.load_vector_store(index_path, partition=DocumentType.CONSULTANT.value if use_corpus else None)
+
+        self._loader = loader
+        self._loader_lock = threading.Lock()
+        self._use_corpus = use_corpus
+        self.router = SourceRouter(self.vector_manager) if settings.SOURCE_ROUTING else None
+
+        self.splitter = TextSplitter(document_type=self.document_type)
+        self.deduplicator = ChunkDeduplicator() if settings.DEDUP_ENABLED else None
+        self.prefilter = None
+        if settings.PREFILTER_ENABLED:
+            self.prefilter = ParagraphPrefilter(chunk_size=self.splitter.chunk_size,
+                                                chunk_overlap=self.splitter.chunk_overlap)
+        self.retriever = self.vector_manager.get_retriever()
+        self.compressor = None
+        if settings.CONTEXT_COMPRESSION:
+            from src.generation.context_compressor import ContextCompressor
+
+            self.compressor = ContextCompressor(self.embedding_manager.get_embeddings(),
+                                                query_cache=self.vector_manager.query_cache)
+        self.qa_system = QASystem(self.retriever, llm=llm, compressor=self.compressor)
+
+        self._sources_lock = threading.Lock()
+        self._indexed_sources = self.vector_manager.indexed_sources()
+        # Источники, проиндексированные префильтром частично: номера уже проиндексированных фрагментов
+        self._indexed_sections: Dict[str, Set[int]] = {}
+        self.pptx_watcher = None
+
+    @property
+    def loader(self) -> "DocumentLoader":
+        """Document loader, created on first use: answering from a warm index never imports it"""
+        with self._loader_lock:
+            if self._loader is None:
+                from src.data.document_loader import DocumentLoader
+
+                use_consultant_plus = self.search_mode in [SearchMode.CONSULTANT_ONLY, SearchMode.BOTH]
+                self._loader = DocumentLoader(
+                    use_consultant_plus=use_consultant_plus,
+                    use_pptx=self.search_mode in [SearchMode.PPTX_ONLY, SearchMode.BOTH],
+                    corpus_loader=self._corpus_loader() if use_consultant_plus else None
+                )
+            return self._loader
+
+    def _corpus_loader(self) -> Optional[LocalCorpusLoader]:
+        """Local corpus source: searched in the shared index when the corpus is the warm index,
+        otherwise loaded once with the pipeline's embeddings"""
+        if self._use_corpus:
+            return LocalCorpusLoader(self.vector_manager)
+        if settings.USE_LOCAL_CORPUS and LocalCorpusLoader.is_available():
+            return LocalCorpusLoader(embeddings=self.embedding_manager.get_embeddings())
+        return None
+
+    @property
+    def index_size(self) -> int:
+        return self.vector_manager.size
+
+    def save_index(self, path: str):
+        """Save the shared index as a snapshot that can be passed back as index_path"""
+        self.vector_manager.save_vector_store(path)
+
+    def coalescing_stats(self) -> dict:
+        """Executed vs coalesced calls of the single-flight groups (searches, pages, reformulations, embeddings)"""
+        flights = [self.embedding_manager.backend._flight]
+        consultant_loader = getattr(self._loader, 'consultant_loader', None)
+        if consultant_loader is not None:
+            flights += [
+                consultant_loader._search_flight,
+                consultant_loader._page_flight,
+                consultant_loader.query_reformulator._flight,
+            ]
+        return {flight.name: flight.stats() for flight in flights}
+
+    def dedup_stats(self) -> dict:
+        """Near-duplicate chunks dropped before embedding (= embedding calls saved)"""
+        return self.deduplicator.stats() if self.deduplicator is not None else {}
+
+    def prefilter_stats(self) -> dict:
+        """Characters of long documents dropped by the lexical prefilter and embedding calls saved"""
+        return self.prefilter.stats() if self.prefilter is not None else {}
+
+    def compression_stats(self) -> dict:
+        """Context characters before and after compression"""
+        return self.compressor.stats() if self.compressor is not None else {}
+
+    def reformulation_stats(self) -> dict:
+        """Consultant+ queries normalized locally vs reformulated by YandexGPT"""
+        consultant_loader = getattr(self._loader, 'consultant_loader', None)
+        return consultant_loader.query_reformulator.stats() if consultant_loader is not None else {}
+
+    def routing_stats(self) -> dict:
+        """Questions answered from the index vs escalated to live sources"""
+        return self.router.stats() if self.router is not None else {}
+
+    def document_index_stats(self) -> dict:
+        """Documents and chunks in the first level of hierarchical retrieval"""
+        document_index = self.vector_manager.document_index
+        return document_index.stats() if document_index is not None else {}
+
+    def load_documents(self, question: str, search_mode: SearchMode = None, deadline: Deadline = None) -> List[Document]:
+        """Load documents for the question from the configured sources (narrowed by search_mode)"""
+        return self.loader.load_documents_from_query(question, search_mode=search_mode, deadline=deadline)
+
+    def load_documents_with_report(self, question: str, search_mode: SearchMode = None,
+                                   deadline: Deadline = None) -> Tuple[List[Document], dict]:
+        """Load documents and report status, count and skipped items per source.
+
+        With source routing, live sources are skipped when the index already answers the question.
+        """
+        if self.router is not None:
+            return self.router.load_with_report(self.loader, question, search_mode=search_mode, deadline=deadline)
+        return self.loader.load_with_report(question, search_mode=search_mode, deadline=deadline)
+
+    @staticmethod
+    def skipped_sources(sources_report: dict) -> List[str]:
+        """Whole sources that failed or timed out, plus individual pages they skipped"""
+        skipped = []
+        for name, report in sources_report.items():
+            if report['status'] != 'ok':
+                skipped.append(name)
+            skipped.extend(report.get('skipped', []))
+        return skipped
+
+    def _claim_sources(self, documents: List[Document],
+                       question: str = None) -> Tuple[List[Document], Dict[str, List[int]]]:
+        """Keep only documents whose source is not indexed (or being indexed) yet.
+
+        With the prefilter and a question, a long document is narrowed to its sections
+        matching the question that are not indexed yet; the source counts as indexed
+        once all its sections are. Returns the documents and the sections claimed per source.
+        """
+        selections = {}
+        if self.prefilter is not None and question:
+            with self._sources_lock:
+                pending = [doc for doc in documents if doc.metadata.get('source') not in self._indexed_sources]
+            # BM25 по длинному акту - вне блокировки
+            selections = {id(doc): self.prefilter.select(doc, question) for doc in pending}
+
+        claimed, sections = [], {}
+        with self._sources_lock:
+            for doc in documents:
+                source = doc.metadata.get('source')
+                if source in self._indexed_sources:
+                    continue
+                selection = selections.get(id(doc))
+                if selection is None and source in self._indexed_sections:
+                    # Часть документа уже в индексе: добираем остальные фрагменты, не повторяя проиндексированные
+                    spans = self.prefilter.sections(doc.page_content)
+                    selection = spans, list(range(len(spans)))
+                if selection is None:
+                    self._indexed_sources.add(source)
+                    claimed.append(doc)
+                    if id(doc) in selections and self.prefilter.applies(doc):
+                        # Длинный документ, в котором ничего не совпало с вопросом, индексируется целиком
+                        self.prefilter.record(source, len(doc.page_content))
+                    continue
+
+                spans, keep = selection
+                done = self._indexed_sections.setdefault(source, set())
+                new = [i for i in keep if i not in done]
+                if not new:
+                    continue
+                done.update(new)
+                sections[source] = new
+                self.prefilter.record(source, len(doc.page_content), spans, new)
+                if len(done) >= len(spans):
+                    self._indexed_sources.add(source)
+                claimed.extend(self.prefilter.documents(doc, spans, new))
+        return claimed, sections
+
+    def _release_sources(self, documents: List[Document], sections: Dict[str, List[int]] = None):
+        sections = sections or {}
+        with self._sources_lock:
+            for doc in documents:
+                source = doc.metadata.get('source')
+                self._indexed_sources.discard(source)
+                if self.prefilter is not None and source not in sections:
+                    self.prefilter.forget(source)
+            for source, indices in sections.items():
+                self._indexed_sections.get(source, set()).difference_update(indices)
+                self.prefilter.forget(source, indices)
+
+    def index_documents(self, documents: List[Document], deadline: Deadline = None, question: str = None,
+                        skipped: List[str] = None) -> int:
+        """Split and embed new documents into the shared index, return the number of chunks added.
+
+        Chunks are embedded in waves of whole sources (about settings.INDEX_WAVE_CHUNKS
+        chunks each), and every wave is searchable as soon as it is added. Once the
+        deadline expires no further wave starts: the remaining sources are released for
+        a later question and appended to ``skipped``. With the prefilter enabled, only
+        the sections of long documents that match ``question`` are indexed (see ParagraphPrefilter).
+        """
+        if deadline is not None and deadline.expired:
+            logger.warning(f"Deadline exceeded before indexing, {len(documents)} documents not indexed")
+            if skipped is not None:
+                skipped.extend(doc.metadata.get('source') for doc in documents)
+            return 0
+        new_documents, sections = self._claim_sources(documents, question)
+        if not new_documents:
+            return 0
+
+        # Документы и чанки по источникам, в порядке загрузки (важные источники - первыми)
+        documents_by_source, chunks_by_source = {}, {}
+        for doc in new_documents:
+            documents_by_source.setdefault(doc.metadata.get('source'), []).append(doc)
+        pending = list(documents_by_source)
+        indexed = 0
+        try:
+            # Чанки остаются смещениями в тексте документа, пока их не эмбеддят и не кладут в индекс
+            chunks = self.splitter.split_to_chunks(new_documents)
+            if self.deduplicator is not None:
+                chunks = self.deduplicator.deduplicate(chunks)
+            for chunk in chunks:
+                chunks_by_source.setdefault(chunk.metadata.get('source'), []).append(chunk)
+
+            while pending:
+                if deadline is not None and deadline.expired:
+                    break
+                wave, size = [], 0
+                while size < len(pending) and len(wave) < settings.INDEX_WAVE_CHUNKS:
+                    wave.extend(chunks_by_source.get(pending[size], []))
+                    size += 1
+                # Ошибки квоты повторяет диспетчер эмбеддингов - только для упавших текстов
+                self.vector_manager.add_documents(wave)
+                del pending[:size]
+                indexed += len(wave)
+        except Exception:
+            self._release_pending(pending, documents_by_source, sections)
+            raise
+
+        if pending:
+            self._release_pending(pending, documents_by_source, sections)
+            logger.warning(f"Deadline exceeded while indexing, {len(pending)} sources not indexed")
+            if skipped is not None:
+                skipped.extend(pending)
+        logger.info(f"Indexed {indexed} chunks from {len(documents_by_source) - len(pending)} sources")
+        return indexed
+
+    def _release_pending(self, sources: List[str], documents_by_source: Dict[str, List[Document]],
+                         sections: Dict[str, List[int]]):
+        """Release the claims of sources that were not indexed, so a later question indexes them"""
+        self._release_sources([doc for source in sources for doc in documents_by_source[source]],
+                              {source: sections[source] for source in sources if source in sections})
+
+    def reindex_pptx(self, path: str, exists: bool = True) -> int:
+        """Re-extract, re-chunk and re-embed one presentation and swap its partition in atomically.
+
+        Queries keep searching the previous version of the deck until the swap; a
+        deleted deck just loses its partition. A deck that exists but cannot be parsed
+        (e.g. still being written) raises and keeps its old partition, so the watcher
+        retries it. Returns the number of chunks indexed.
+        """
+        from src.data.pptx_loader import PPTXLoader
+
+        key = self.vector_manager.partition_key({'type': DocumentType.PPTX.value, 'source': path})
+        document = PPTXLoader(os.path.dirname(path)).load_file(path, raise_errors=True) if exists else None
+        chunks = self.splitter.split_to_chunks([document]) if document is not None else []
+
+        with self._sources_lock:
+            # Обычная индексация по вопросу не должна добавить этот файл повторно
+            if chunks:
+                self._indexed_sources.add(path)
+            else:
+                self._indexed_sources.discard(path)
+        count = self.vector_manager.replace_partition(key, chunks)
+        logger.info(f"Re-indexed {path}: {count} chunks" if chunks else f"Removed {path} from the index")
+        return count
+
+    def watch_pptx(self, folder_path: str = None, debounce: float = None):
+        """Keep the index in sync with the PPTX folder: every changed deck is re-indexed on its own"""
+        from src.data.pptx_loader import PPTXLoader
+
+        loader = PPTXLoader(folder_path) if folder_path else getattr(self._loader, 'pptx_loader', None) or PPTXLoader()
+        self.pptx_watcher = loader.watch(self.reindex_pptx, debounce=debounce)
+        return self.pptx_watcher
+
+    def watch_stats(self) -> dict:
+        return self.pptx_watcher.stats() if self.pptx_watcher is not None else {}
+
+    def generate(self, question: str, system_prompt: str = None, search_mode: SearchMode = None,
+                 require_context: bool = False) -> dict:
+        """Retrieve from the shared index (only the partitions of search_mode) and generate the answer
+        (with ``require_context``, only if something was retrieved)"""
+        partitions = partitions_for_mode(search_mode)
+        retriever = None if partitions is None else self.vector_manager.get_retriever(partitions=partitions)
+        return self.qa_system.query(question, system_prompt=system_prompt, retriever=retriever,
+                                    require_context=require_context)
+
+    def load_stage(self, question: str, search_mode: SearchMode = None, deadline: Deadline = None) -> dict:
+        """Load stage of ``answer``: documents for the question and the report per source.
+
+        Returns the state of the question that ``index_stage`` and ``generate_stage``
+        take over, so the stages can run in different threads (see QueryServer).
+        ``deadline`` bounds loading and indexing together.
+        """
+        deadline = deadline or Deadline()
+        started = time.perf_counter()
+        documents, sources_report = self.load_documents_with_report(
+            question, search_mode, deadline.share(settings.LOAD_DEADLINE_SHARE)
+        )
+        return {
+            'question': question,
+            'search_mode': search_mode,
+            'deadline': deadline,
+            'documents': documents,
+            'sources_report': sources_report,
+            'skipped_sources': self.skipped_sources(sources_report),
+            'chunks_indexed': 0,
+            'started': started,
+            'timings': {'load': time.perf_counter() - started},
+        }
+
+    def index_stage(self, state: dict) -> dict:
+        """Index stage of ``answer``: index the loaded documents within the deadline"""
+        started = time.perf_counter()
+        if state['deadline'].expired:
+            # Не успели: отвечаем по тому, что уже есть в индексе
+            state['skipped_sources'].extend(doc.metadata.get('source') for doc in state['documents'])
+        else:
+            state['chunks_indexed'] = self.index_documents(state['documents'], state['deadline'], state['question'],
+                                                           state['skipped_sources'])
+        state['timings']['index'] = time.perf_counter() - started
+        return state
+
+    def generate_stage(self, state: dict, system_prompt: str = None, require_context: bool = False) -> dict:
+        """Generate stage of ``answer``: the answer with the load and index report of the question"""
+        started = time.perf_counter()
+        result = self.generate(state['question'], system_prompt=system_prompt, search_mode=state['search_mode'],
+                               require_context=require_context)
+        timings = state['timings']
+        timings['generate'] = time.perf_counter() - started
+        timings['total'] = time.perf_counter() - state['started']
+
+        result['documents_loaded'] = len(state['documents'])
+        result['chunks_indexed'] = state['chunks_indexed']
+        result['sources_report'] = state['sources_report']
+        result['skipped_sources'] = state['skipped_sources']
+        result['timings'] = timings
+        return result
+
+    def answer(self, question: str, system_prompt: str = None, search_mode: SearchMode = None,
+               deadline: float = None, require_context: bool = False) -> dict:
+        """Run load, index and generate stages for one question.
+
+        ``deadline`` (seconds, settings.RETRIEVAL_DEADLINE by default) bounds loading and
+        indexing; whatever is late is skipped and listed in ``skipped_sources``. With
+        ``require_context`` no answer is generated when nothing is retrieved (see QASystem.query).
+        """
+        retrieval_deadline = Deadline(settings.RETRIEVAL_DEADLINE if deadline is None else deadline)
+        state = self.load_stage(question, search_mode, retrieval_deadline)
+        self.index_stage(state)
+        return self.generate_stage(state, system_prompt, require_context=require_context)
\ No newline at end of file
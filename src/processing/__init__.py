@@ -1,5 +1,19 @@
-from .text_splitter import TextSplitter
-from .embeddings import EmbeddingManager
-from .query_reformulator import QueryReformulator
+import importlib
 
-__all__ = ["TextSplitter", "EmbeddingManager", "QueryReformulator"]
\ No newline at end of file
+# Модули обработки тянут LangChain и NumPy, поэтому импортируются при первом обращении
+_EXPORTS = {
+    "TextSplitter": ".text_splitter",
+    "EmbeddingManager": ".embeddings",
+    "EmbeddingBackend": ".embeddings",
+    "QueryReformulator": ".query_reformulator",
+    "ChunkDeduplicator": ".deduplicator",
+    "ParagraphPrefilter": ".paragraph_filter",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,91 @@
+from langchain.schema import Document
+from typing import Dict, Optional, Tuple
+
+
+class MetadataInterner:
+    """Returns one shared object per distinct metadata value, so equal metadata is stored once"""
+
+    def __init__(self):
+        self._pool: Dict[tuple, object] = {}
+
+    @staticmethod
+    def _key(items) -> Optional[tuple]:
+        try:
+            key = tuple(sorted(items))
+            hash(key)
+            return key
+        except TypeError:  # Нехешируемые значения (списки, словари) не интернируем
+            return None
+
+    def intern_dict(self, metadata: dict) -> dict:
+        """Shared dict for the given metadata. Callers must treat it as read-only"""
+        key = self._key(metadata.items())
+        if key is None:
+            return metadata
+        return self._pool.setdefault(('dict', key), metadata)
+
+    def intern_items(self, **items) -> Optional[Tuple[tuple, ...]]:
+        """Shared tuple of per-chunk metadata overrides"""
+        if not items:
+            return None
+        key = self._key(items.items())
+        if key is None:
+            return tuple(items.items())
+        return self._pool.setdefault(('items', key), key)
+
+
+class Chunk:
+    """Compact chunk: a reference to the parent text plus (start, end) offsets.
+
+    The parent string and the base metadata dict are shared by all chunks of a
+    document, so a chunk costs a few machine words instead of a copied substring
+    and a copied metadata dict. A chunk reads like a Document (``page_content``,
+    ``metadata``), so it can go through deduplication and indexing as is: text and
+    metadata are copied only when read, i.e. when the chunk is embedded and stored.
+    """
+
+    __slots__ = ('parent', 'start', 'end', 'base_metadata', 'extra')
+
+    def __init__(self, parent: str, start: int, end: int, metadata: dict, extra: Optional[tuple] = None):
+        self.parent = parent
+        self.start = start
+        self.end = end
+        self.base_metadata = metadata
+        self.extra = extra
+
+    @property
+    def text(self) -> str:
+        return self.parent[self.start:self.end]
+
+    page_content = text
+
+    @property
+    def metadata(self) -> dict:
+        """Own copy of the document metadata with the per-chunk overrides"""
+        metadata = dict(self.base_metadata)
+        if self.extra:
+            metadata.update(self.extra)
+        return metadata
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __repr__(self) -> str:
+        return f"Chunk({self.start}:{self.end}, {self.text[:40]!r})"
+
+    def to_document(self) -> Document:
+        """Materialize as a LangChain Document (the boundary where text and metadata get copied)"""
+        return Document(page_content=self.text, metadata=self.metadata)
+
+
+class OffsetChunk(Chunk):
+    """Chunk whose metadata also reports its offset in the parent text as ``start_index``
+    (see TextSplitter ``add_start_index``)"""
+
+    __slots__ = ()
+
+    @property
+    def metadata(self) -> dict:
+        metadata = Chunk.metadata.fget(self)
+        metadata['start_index'] = self.start
+        return metadata
\ No newline at end of file
@@ -0,0 +1,122 @@
+from bisect import bisect_left
+from typing import List, Tuple
+import re
+import zlib
+
+# Сильные якоря: заголовки структурных единиц акта ("Статья 115. ..."). Страницы Консультант+
+# приходят одной строкой, поэтому заголовок ищется не только в начале строки; ссылки
+# вида "статьей 115" и "Статья 81 ТК" не подходят: нет заглавной буквы или точки после номера
+_HEADING = re.compile(r'(?<!\S)(?:Статья|Глава|Раздел|Подраздел|Параграф)\s+\d+(?:\.\d+)*\.(?=\s)')
+_WORD = re.compile(r'\S+')
+
+# Уровни точек разреза: заголовок > начало строки > обычное слово
+HEADING, LINE_START, WORD = 2, 1, 0
+
+
+class ContentDefinedSplitter:
+    """Splits text at boundaries chosen by the content around them, not by running length.
+
+    Every word start is a candidate cut point. A chunk ends at the first candidate past
+    the minimum body length that qualifies: an article / chapter heading always does, a line start or
+    a plain word does when the hash of the words just before it hits a divisor. If nothing
+    qualifies before the size limit, the strongest candidate in the window wins (heading,
+    then line start, then highest hash). Because the decision depends only on nearby text,
+    an edit moves the boundaries around it and the following chunks realign at the next
+    qualifying cut, so unchanged text keeps producing identical chunks.
+
+    Chunk bodies are at most ``chunk_size - chunk_overlap`` characters; each chunk then
+    starts up to ``chunk_overlap`` characters earlier (at a word start), so chunks never
+    exceed ``chunk_size`` and consecutive chunks overlap by at most ``chunk_overlap``.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, min_ratio: float = 0.5, window_words: int = 3):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_body = chunk_size - chunk_overlap
+        self.min_body = max(1, int(self.max_body * min_ratio))
+        self.window_words = window_words
+        # Ожидаемое расстояние между разрезами по словам - около половины свободной части чанка
+        average_word = 7
+        self.word_divisor = max(2, (self.max_body - self.min_body) // (2 * average_word))
+        self.line_divisor = 4
+
+    def _candidates(self, text: str) -> List[Tuple[int, int, int]]:
+        """(position, level, hash) of every word start; the hash covers the preceding words"""
+        headings = {m.start() for m in _HEADING.finditer(text)}
+        words = [m.start() for m in _WORD.finditer(text)]
+        candidates = []
+        for i, position in enumerate(words):
+            window_start = words[max(0, i - self.window_words)]
+            h = zlib.crc32(text[window_start:position].encode('utf-8'))
+            if position in headings:
+                level = HEADING
+            elif i == 0 or text.find('\n', words[i - 1], position) >= 0:
+                level = LINE_START
+            else:
+                level = WORD
+            candidates.append((position, level, h))
+        return candidates
+
+    def _qualifies(self, level: int, h: int) -> bool:
+        if level == HEADING:
+            return True
+        if level == LINE_START:
+            return h % self.line_divisor == 0
+        return h % self.word_divisor == 0
+
+    def _boundaries(self, text: str, candidates: List[Tuple[int, int, int]]) -> List[int]:
+        boundaries = [0]
+        i, n = 0, len(candidates)
+        while True:
+            start = boundaries[-1]
+            if len(text) - start <= self.max_body:
+                break
+            best, best_key, cut = None, None, None
+            while i < n and candidates[i][0] <= start:
+                i += 1
+            j = i
+            while j < n and candidates[j][0] - start <= self.max_body:
+                position, level, h = candidates[j]
+                if position - start >= self.min_body:
+                    if self._qualifies(level, h):
+                        cut = position
+                        break
+                    if best_key is None or (level, h) > best_key:
+                        best, best_key = position, (level, h)
+                j += 1
+            if cut is None:
+                # Нет подходящего слова (например, очень длинное слово) - режем по пределу
+                cut = best if best is not None else start + self.max_body
+            boundaries.append(cut)
+        boundaries.append(len(text))
+        return boundaries
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """(start, end) offsets of the chunks, whitespace trimmed"""
+        if not text.strip():
+            return []
+        candidates = self._candidates(text)
+        word_starts = [position for position, _, _ in candidates]
+        boundaries = self._boundaries(text, candidates)
+
+        spans = []
+        for k, (body_start, end) in enumerate(zip(boundaries, boundaries[1:])):
+            start = body_start
+            if k and self.chunk_overlap:
+                # Перекрытие начинается с первого слова не раньше чем за chunk_overlap символов
+                earliest = body_start - self.chunk_overlap
+                first_word = bisect_left(word_starts, earliest)
+                if first_word < len(word_starts):
+                    start = min(word_starts[first_word], body_start)
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if end > start:
+                spans.append((start, end))
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
\ No newline at end of file
@@ -0,0 +1,126 @@
+from langchain.schema import Document
+from config.settings import settings
+from typing import Dict, List, Tuple
+import numpy as np
+import logging
+import re
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Простое число больше 2^32: a * x + b не переполняет uint64 при a, x, b < 2^32
+_PRIME = np.uint64(4294967311)
+
+
+class ChunkDeduplicator:
+    """Drops near-duplicate chunks before they are embedded.
+
+    Each chunk gets a MinHash signature over word shingles; an LSH index over
+    signature bands finds candidate pairs, and a candidate is a duplicate when the
+    estimated Jaccard similarity reaches ``threshold``. The first chunk of a group
+    is kept and remembers the sources of the dropped ones in
+    ``metadata['duplicate_sources']``, so citations still point to every edition.
+    """
+
+    _token_pattern = re.compile(r'\w+', re.UNICODE)
+
+    def __init__(self, threshold: float = None, num_perm: int = None, bands: int = None,
+                 shingle_size: int = None, seed: int = 1):
+        self.threshold = threshold if threshold is not None else settings.DEDUP_THRESHOLD
+        self.num_perm = num_perm or settings.DEDUP_NUM_PERM
+        self.bands = bands or settings.DEDUP_BANDS
+        if self.num_perm % self.bands:
+            raise ValueError(f"num_perm ({self.num_perm}) must be divisible by bands ({self.bands})")
+        self.rows = self.num_perm // self.bands
+        self.shingle_size = shingle_size or settings.DEDUP_SHINGLE_SIZE
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=(self.num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=(self.num_perm, 1), dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._stats = {'chunks': 0, 'kept': 0, 'dropped': 0}
+
+    def _shingles(self, text: str) -> np.ndarray:
+        tokens = self._token_pattern.findall(text.lower())
+        n = self.shingle_size
+        if len(tokens) <= n:
+            shingles = {' '.join(tokens)}
+        else:
+            shingles = {' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)}
+        return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature: for every hash permutation, the minimum over all shingles"""
+        shingles = self._shingles(text)
+        return ((self._a * shingles[None, :] + self._b) % _PRIME).min(axis=1)
+
+    def similarity(self, first: np.ndarray, second: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return float(np.count_nonzero(first == second)) / self.num_perm
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def deduplicate(self, chunks: List[Document]) -> List[Document]:
+        """Return the chunks without near-duplicates (order preserved)"""
+        if len(chunks) < 2:
+            self._count(len(chunks), len(chunks))
+            return list(chunks)
+
+        buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        signatures = []
+        kept: List[int] = []
+        duplicates: Dict[int, List[str]] = {}
+
+        for i, chunk in enumerate(chunks):
+            signature = self.signature(chunk.page_content)
+            signatures.append(signature)
+            keys = self._band_keys(signature)
+
+            original = None
+            candidates = {j for key in keys for j in buckets.get(key, ())}
+            for j in sorted(candidates):
+                if self.similarity(signature, signatures[j]) >= self.threshold:
+                    original = j
+                    break
+
+            if original is None:
+                kept.append(i)
+                for key in keys:
+                    buckets.setdefault(key, []).append(i)
+                continue
+
+            source = chunk.metadata.get('source')
+            if source is not None and source != chunks[original].metadata.get('source'):
+                sources = duplicates.setdefault(original, [])
+                if source not in sources:
+                    sources.append(source)
+
+        result = []
+        for i in kept:
+            chunk = chunks[i]
+            if i in duplicates:
+                metadata = dict(chunk.metadata)
+                metadata['duplicate_sources'] = duplicates[i]
+                chunk = Document(page_content=chunk.page_content, metadata=metadata)
+            result.append(chunk)
+
+        self._count(len(chunks), len(result))
+        if len(result) < len(chunks):
+            logger.info(f"Dedup: dropped {len(chunks) - len(result)} of {len(chunks)} near-duplicate chunks")
+        return result
+
+    def _count(self, total: int, kept: int):
+        with self._lock:
+            self._stats['chunks'] += total
+            self._stats['kept'] += kept
+            self._stats['dropped'] += total - kept
+
+    def stats(self) -> dict:
+        """Chunks seen / kept / dropped; every dropped chunk is one embedding call saved"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['embedding_calls_saved'] = stats['dropped']
+        return stats
\ No newline at end of file
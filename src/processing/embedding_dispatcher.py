@@ -0,0 +1,150 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from config.settings import settings
+from src.utils.rate_limiter import RateLimiter
+from typing import Callable, List, Sequence
+import heapq
+import numpy as np
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+QUOTA_ERROR_MARKERS = ("rate quota limit exceed", "resource_exhausted", "too many requests", "429")
+
+
+def is_quota_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in QUOTA_ERROR_MARKERS)
+
+
+class EmbeddingDispatcher:
+    """Sends embedding requests concurrently with an adaptive concurrency window.
+
+    The YandexGPT embeddings API takes one text per request, so every text is one
+    request: ``rate_limit`` caps requests (= texts) per second, and only the texts
+    whose request failed are retried. The number of requests in flight grows
+    additively after successes and halves on a quota error (AIMD), so it settles at
+    what the quota actually allows; the window is shared by all concurrent callers.
+
+    Pool threads only run requests: the calling thread paces, acquires window slots
+    and schedules retries (quota errors after an exponential backoff), so a waiting
+    retry never holds a worker.
+    """
+
+    def __init__(self, request_fn: Callable[[str], Sequence[float]], max_concurrency: int = None,
+                 initial_concurrency: int = None, rate_limit: float = None, max_retries: int = None,
+                 backoff: float = None):
+        self.request_fn = request_fn
+        self.max_concurrency = max_concurrency or settings.EMBED_MAX_CONCURRENCY
+        self.concurrency = float(min(initial_concurrency or settings.EMBED_INITIAL_CONCURRENCY, self.max_concurrency))
+        self.rate_limiter = RateLimiter(rate_limit if rate_limit is not None else settings.EMBED_RATE_LIMIT)
+        self.max_retries = max_retries if max_retries is not None else settings.EMBED_MAX_RETRIES
+        self.backoff = backoff if backoff is not None else settings.EMBED_BACKOFF
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed")
+        self._window = threading.Condition()
+        self._in_flight = 0
+        self._stats = {'requests': 0, 'quota_errors': 0, 'errors': 0, 'retried_texts': 0}
+
+    # ---- concurrency window ----
+
+    def _acquire_slot(self, timeout: float = None) -> bool:
+        with self._window:
+            if not self._window.wait_for(lambda: self._in_flight < int(self.concurrency), timeout):
+                return False
+            self._in_flight += 1
+            return True
+
+    def _release_slot(self, success: bool, quota_error: bool = False):
+        with self._window:
+            self._in_flight -= 1
+            if quota_error:
+                self.concurrency = max(1.0, self.concurrency / 2)
+            elif success:
+                # +1 запрос в окне примерно за каждое полное окно успешных ответов
+                self.concurrency = min(float(self.max_concurrency), self.concurrency + 1.0 / self.concurrency)
+            self._window.notify_all()
+
+    def _send(self, request_fn: Callable[[str], Sequence[float]], text: str):
+        # Слот уже занят вызывающим потоком, здесь - только сам запрос
+        try:
+            vector = request_fn(text)
+        except Exception as e:
+            quota_error = is_quota_error(e)
+            self._release_slot(False, quota_error)
+            with self._window:
+                self._stats['quota_errors' if quota_error else 'errors'] += 1
+            raise
+        self._release_slot(True)
+        with self._window:
+            self._stats['requests'] += 1
+        return vector
+
+    # ---- public API ----
+
+    def embed(self, texts: List[str], request_fn: Callable[[str], Sequence[float]] = None) -> np.ndarray:
+        """Embed texts (one request each, ``request_fn`` overrides the default, e.g. for the
+        query model), returning a float32 array in input order"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        request_fn = request_fn or self.request_fn
+        results = [None] * len(texts)
+        attempts = [0] * len(texts)
+        ready = deque(range(len(texts)))
+        delayed = []  # (время повтора, индекс текста)
+        futures = {}
+
+        try:
+            while ready or delayed or futures:
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    ready.append(heapq.heappop(delayed)[1])
+                next_retry = delayed[0][0] - now if delayed else None
+
+                if ready:
+                    # Ждем свободный слот, но не дольше, чем до ближайшего повтора
+                    if self._acquire_slot(timeout=next_retry):
+                        self.rate_limiter.acquire()
+                        i = ready.popleft()
+                        futures[self._executor.submit(self._send, request_fn, texts[i])] = i
+                    done = [future for future in futures if future.done()]
+                elif futures:
+                    done, _ = wait(list(futures), timeout=next_retry, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(max(0.0, next_retry))
+                    continue
+
+                for future in done:
+                    i = futures.pop(future)
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        attempts[i] += 1
+                        if attempts[i] > self.max_retries:
+                            raise
+                        with self._window:
+                            self._stats['retried_texts'] += 1
+                        quota_error = is_quota_error(e)
+                        delay = self.backoff * 2 ** (attempts[i] - 1) if quota_error else self.backoff
+                        if quota_error:
+                            logger.warning(f"Embedding quota exceeded, retrying a text in {delay:.1f}s "
+                                           f"(concurrency {self.concurrency:.1f})")
+                        else:
+                            logger.warning(f"Embedding request failed, retrying: {e}")
+                        heapq.heappush(delayed, (time.monotonic() + delay, i))
+        finally:
+            for future in futures:
+                # Не начавшийся запрос уже занял слот окна - возвращаем его
+                if future.cancel():
+                    self._release_slot(False)
+
+        return np.asarray(results, dtype=np.float32).reshape(len(texts), -1)
+
+    def stats(self) -> dict:
+        with self._window:
+            stats = dict(self._stats)
+            stats['concurrency'] = self.concurrency
+            stats['in_flight'] = self._in_flight
+        return stats
\ No newline at end of file
@@ -1,64 +1,298 @@
-from langchain_community.embeddings.yandex import YandexGPTEmbeddings
+from abc import abstractmethod
+from langchain_core.embeddings import Embeddings
 from config.settings import settings
+from src.utils.singleflight import SingleFlight, text_hash
+from .embedding_dispatcher import EmbeddingDispatcher
+from typing import List, Optional, Union
+import numpy as np
 import logging
+import os
+import re
 import time
-import threading
+import zlib
 
 logger = logging.getLogger(__name__)
 
-class EmbeddingManager:
-    """Manages embedding generation with aggressive rate limiting"""
-    
+
+class EmbeddingBackend(Embeddings):
+    """Abstract base class for embedding backends.
+
+    A backend is a LangChain ``Embeddings`` object (so it can be handed to FAISS
+    directly) that also reports its dimensionality and returns batched NumPy output.
+    Subclasses implement ``dimension`` and ``_embed_batch``.
+    """
+
+    name = "base"
+    # Совпадающие тексты из параллельных батчей эмбеддятся один раз
+    coalesce_inflight = True
+
     def __init__(self):
+        self._flight = SingleFlight(f"embed_{self.name}")
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        """Length of the vectors"""
+
+    @property
+    def model_name(self) -> str:
+        return self.name
+
+    @property
+    def backend_id(self) -> str:
+        """Identifier stored alongside an index so vectors from different backends never mix"""
+        return f"{self.name}:{self.model_name}:{self.dimension}"
+
+    @abstractmethod
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed texts without coalescing: float32 array of shape (len(texts), dimension)"""
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a float32 array of shape (len(texts), dimension)"""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        if not self.coalesce_inflight:
+            return self._embed_batch(texts)
+        rows = self._flight.do_many(
+            [text_hash(text) for text in texts],
+            lambda positions: self._embed_batch([texts[p] for p in positions])
+        )
+        return np.stack(rows).astype(np.float32, copy=False)
+
+    def embed_query_array(self, text: str) -> np.ndarray:
+        return self.embed_batch([text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.embed_batch(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_query_array(text).tolist()
+
+
+class YandexEmbeddingBackend(EmbeddingBackend):
+    """YandexGPT embeddings sent through an adaptive, quota-aware dispatcher"""
+
+    name = "yandex"
+
+    def __init__(self, dispatcher: EmbeddingDispatcher = None):
+        super().__init__()
+        from langchain_community.embeddings.yandex import YandexGPTEmbeddings
+
         self.embeddings = YandexGPTEmbeddings(
             folder_id=settings.FOLDER_ID,
-            api_key=settings.API_KEY
+            api_key=settings.API_KEY,
+            max_retries=1  # Повторяет диспетчер - только упавший текст, а не весь список
         )
-        self.last_request_time = 0
-        self.min_interval = 0.5  # Increased to 500ms between requests (2 requests per second)
-        self.lock = threading.Lock()
-    
+        self.dispatcher = dispatcher or EmbeddingDispatcher(self._embed_text)
+
+    @property
+    def dimension(self) -> int:
+        return settings.YANDEX_EMBEDDING_DIM
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.embeddings, 'doc_model_name', None) or "text-search-doc"
+
+    def _embed_text(self, text: str) -> List[float]:
+        # API принимает один текст на запрос: так лимит и повторы считаются по реальным вызовам
+        return self.embeddings.embed_documents([text])[0]
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        started = time.perf_counter()
+        result = self.dispatcher.embed(texts)
+        logger.info(f"Embedded {len(texts)} texts in {time.perf_counter() - started:.1f}s "
+                    f"(concurrency {self.dispatcher.concurrency:.1f})")
+        return result
+
+    def embed_query_array(self, text: str) -> np.ndarray:
+        # Yandex uses a separate query model for search queries; same quota, so same dispatcher
+        return self.dispatcher.embed([text], request_fn=self.embeddings.embed_query)[0]
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """Local CPU embedder: hashed word and character n-gram features, L2-normalized.
+
+    Needs no model files and no network, so it suits bulk indexing and offline runs.
+    Character n-grams make it tolerant to Russian inflection (отпуск / отпуска / отпуском).
+    """
+
+    name = "hashing"
+    coalesce_inflight = False  # Локальное хеширование дешевле координации
+    _token_pattern = re.compile(r'\w+', re.UNICODE)
+
+    def __init__(self, dimension: int = None, char_ngram: int = 4):
+        super().__init__()
+        self._dimension = dimension or settings.LOCAL_EMBEDDING_DIM
+        self.char_ngram = char_ngram
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    @property
+    def model_name(self) -> str:
+        return f"words+char{self.char_ngram}"
+
+    def _features(self, text: str):
+        tokens = self._token_pattern.findall(text.lower())
+        for token in tokens:
+            yield token
+            padded = f"<{token}>"
+            if len(padded) > self.char_ngram:
+                for i in range(len(padded) - self.char_ngram + 1):
+                    yield padded[i:i + self.char_ngram]
+        for first, second in zip(tokens, tokens[1:]):
+            yield f"{first} {second}"
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self._dimension), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in self._features(text):
+                # crc32 is stable between runs, unlike the builtin hash()
+                h = zlib.crc32(feature.encode('utf-8'))
+                counts[h] = counts.get(h, 0) + 1
+            if not counts:
+                continue
+            hashes = np.fromiter(counts.keys(), dtype=np.uint32, count=len(counts))
+            values = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[row], hashes % self._dimension, values * signs)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class ONNXEmbeddingBackend(EmbeddingBackend):
+    """Local CPU embedder running a sentence-embedding ONNX model from a local folder.
+
+    The folder must contain ``model.onnx`` and a HuggingFace ``tokenizer.json``.
+    Requires the optional ``onnxruntime`` and ``tokenizers`` packages.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str = None, batch_size: int = 32, max_length: int = 512):
+        super().__init__()
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(
+                "ONNX backend requires 'onnxruntime' and 'tokenizers': pip install onnxruntime tokenizers"
+            ) from e
+
+        self.model_path = model_path or settings.ONNX_MODEL_PATH
+        if not self.model_path or not os.path.isdir(self.model_path):
+            raise ValueError(f"ONNX model folder not found: {self.model_path}")
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_path, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(self.model_path, 'model.onnx'),
+            providers=['CPUExecutionProvider']
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self._dimension = None
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            output_shape = self.session.get_outputs()[0].shape
+            if isinstance(output_shape[-1], int):
+                self._dimension = output_shape[-1]
+            else:
+                self._dimension = self._embed_batch(["probe"]).shape[1]
+        return self._dimension
+
+    @property
+    def model_name(self) -> str:
+        return os.path.basename(os.path.normpath(self.model_path))
+
+    def _embed_chunk(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self._input_names:
+            feeds['token_type_ids'] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+
+        if hidden.ndim == 3:
+            # Mean pooling over real (non-padding) tokens
+            mask = attention_mask[..., None].astype(np.float32)
+            hidden = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        hidden = hidden.astype(np.float32)
+        norms = np.linalg.norm(hidden, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return hidden / norms
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        parts = [self._embed_chunk(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        result = np.vstack(parts) if parts else np.zeros((0, self.dimension), dtype=np.float32)
+        if self._dimension is None and len(result):
+            self._dimension = result.shape[1]
+        return result
+
+
+EMBEDDING_BACKENDS = {
+    'yandex': YandexEmbeddingBackend,
+    'hashing': HashingEmbeddingBackend,
+    'onnx': ONNXEmbeddingBackend,
+}
+
+
+def create_embedding_backend(name: str = None, **kwargs) -> EmbeddingBackend:
+    """Create an embedding backend by name ('yandex', 'hashing', 'onnx')"""
+    name = (name or settings.EMBEDDING_BACKEND).lower()
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}. Available: {', '.join(EMBEDDING_BACKENDS)}")
+    return EMBEDDING_BACKENDS[name](**kwargs)
+
+
+class EmbeddingManager:
+    """Manages embedding generation through a pluggable backend"""
+
+    def __init__(self, backend: Optional[Union[str, EmbeddingBackend]] = None):
+        if isinstance(backend, EmbeddingBackend):
+            self.backend = backend
+        else:
+            self.backend = create_embedding_backend(backend)
+        logger.info(f"Embedding backend: {self.backend.backend_id}")
+
+    @property
+    def embeddings(self) -> EmbeddingBackend:
+        return self.backend
+
+    @property
+    def dimension(self) -> int:
+        return self.backend.dimension
+
+    @property
+    def backend_id(self) -> str:
+        return self.backend.backend_id
+
     def get_embeddings(self):
         """Get embeddings instance"""
-        return self.embeddings
-    
-    def _rate_limited_embed(self, texts):
-        """Apply rate limiting to embedding requests"""
-        with self.lock:
-            current_time = time.time()
-            time_since_last = current_time - self.last_request_time
-            if time_since_last < self.min_interval:
-                sleep_time = self.min_interval - time_since_last
-                logger.info(f"Rate limiting: sleeping for {sleep_time:.2f}s")
-                time.sleep(sleep_time)
-            
-            self.last_request_time = time.time()
-            return self.embeddings.embed_documents(texts)
-    
-    def embed_documents(self, documents: list):
-        """Embed a list of documents with rate limiting"""
+        return self.backend
+
+    def embed_documents_array(self, documents: list) -> np.ndarray:
+        """Embed a list of documents into a float32 NumPy array"""
         try:
             texts = [doc.page_content for doc in documents]
-            
-            # Process in even smaller batches
-            batch_size = 3  # Further reduced batch size
-            all_embeddings = []
-            
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i + batch_size]
-                batch_num = (i // batch_size) + 1
-                total_batches = (len(texts) - 1) // batch_size + 1
-                logger.info(f"Embedding batch {batch_num}/{total_batches} ({len(batch_texts)} texts)")
-                
-                batch_embeddings = self._rate_limited_embed(batch_texts)
-                all_embeddings.extend(batch_embeddings)
-                
-                # Longer delay between batches
-                if i + batch_size < len(texts):
-                    logger.info("Sleeping between batches...")
-                    time.sleep(1.5)  # Increased delay
-            
-            return all_embeddings
+            return self.backend.embed_batch(texts)
         except Exception as e:
             logger.error(f"Error embedding documents: {e}")
-            raise e
\ No newline at end of file
+            raise
+
+    def embed_documents(self, documents: list):
+        """Embed a list of documents"""
+        return self.embed_documents_array(documents).tolist()
\ No newline at end of file
@@ -0,0 +1,196 @@
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from langchain.schema import Document
+from config.settings import settings
+
+from .query_reformulator import keyword_terms
+
+logger = logging.getLogger(__name__)
+
+Span = Tuple[int, int]
+
+# Начало статьи кодекса: "Статья 115." / "Статья 217.1."
+_HEADING = re.compile(r'Статья\s+\d+(?:\.\d+)*\.')
+# Допустимые места разреза: перевод строки или конец предложения
+_BREAK = re.compile(r'\n\s*|(?<=[.!?;:])\s+')
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+class ParagraphPrefilter:
+    """Keeps only the parts of a long fetched document that match the question.
+
+    Consultant+ returns whole acts (hundreds of thousands of characters for a code),
+    while a question needs a few articles. A document longer than ``min_chars`` is cut
+    into sections (at article headings, then at sentence ends, at most
+    ``section_chars`` each), the sections are scored with BM25 against the question
+    and the query it was fetched with (``metadata['search_query']``), and only the
+    ``top_sections`` best ones plus ``neighbors`` on each side go to splitting and
+    embedding. Words are compared by their first ``stem_chars`` letters, a crude
+    stemmer that is enough for Russian endings.
+
+    ``stats`` reports the characters dropped and the embedding calls saved (estimated
+    from the chunk size and overlap of the splitter). The caller records what it
+    actually indexes (``record`` / ``forget``), per source: a document indexed in parts
+    over several questions counts once, with the union of its indexed sections.
+    """
+
+    def __init__(self, min_chars: int = None, section_chars: int = None, top_sections: int = None,
+                 neighbors: int = None, stem_chars: int = None, chunk_size: int = None, chunk_overlap: int = None):
+        self.min_chars = min_chars or settings.PREFILTER_MIN_CHARS
+        self.section_chars = section_chars or settings.PREFILTER_SECTION_CHARS
+        self.top_sections = top_sections or settings.PREFILTER_TOP_SECTIONS
+        self.neighbors = settings.PREFILTER_NEIGHBORS if neighbors is None else neighbors
+        self.stem_chars = stem_chars or settings.PREFILTER_STEM_CHARS
+        self.chunk_size = chunk_size or settings.CONSULTANT_CHUNK_SIZE
+        self.chunk_overlap = settings.CONSULTANT_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+
+        self._lock = threading.Lock()
+        # Источник -> (длина документа, фрагменты, номера проиндексированных); без фрагментов - целиком
+        self._sources: Dict[str, Tuple[int, Optional[List[Span]], Set[int]]] = {}
+
+    def sections(self, text: str) -> List[Span]:
+        """(start, end) offsets of the sections of a text, in order and covering all of it"""
+        headings = {match.start() for match in _HEADING.finditer(text)}
+        cuts = sorted(headings | {match.end() for match in _BREAK.finditer(text)} | {len(text)})
+        spans = []
+        start = previous = 0
+        for cut in cuts:
+            if cut <= start:
+                continue
+            while cut - start > self.section_chars:
+                # Фрагмент перерос лимит: режем по последней границе предложения, если ее нет - по лимиту
+                end = previous if previous > start else start + self.section_chars
+                spans.append((start, end))
+                start = end
+            if (cut in headings or cut == len(text)) and cut > start:
+                spans.append((start, cut))
+                start = cut
+            previous = cut
+        return spans
+
+    def _stems(self, text: str) -> List[str]:
+        return [token[:self.stem_chars] for token in _TOKEN.findall(text.lower().replace('ё', 'е'))]
+
+    def query_terms(self, queries: Sequence[str]) -> set:
+        """Stems of the meaningful words of the queries (question words, pronouns, prepositions dropped)"""
+        return {term[:self.stem_chars] for query in queries if query for term in keyword_terms(query)}
+
+    def score(self, text: str, spans: Sequence[Span], terms: set) -> List[float]:
+        """BM25 score of every section against the query terms (statistics taken within the document)"""
+        lengths, counts = [], []
+        document_frequency = Counter()
+        for start, end in spans:
+            stems = self._stems(text[start:end])
+            lengths.append(len(stems))
+            matched = Counter(stem for stem in stems if stem in terms)
+            counts.append(matched)
+            document_frequency.update(matched.keys())
+
+        total = len(spans)
+        average = sum(lengths) / total if total else 0.0
+        idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+        scores = []
+        for length, matched in zip(lengths, counts):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average) if average else BM25_K1
+            scores.append(sum(idf[term] * tf * (BM25_K1 + 1) / (tf + norm) for term, tf in matched.items()))
+        return scores
+
+    def applies(self, document: Document) -> bool:
+        """Whether a document is long enough to be prefiltered (presentations never are)"""
+        return len(document.page_content) >= self.min_chars and document.metadata.get('type') != 'pptx'
+
+    def select(self, document: Document, question: str) -> Optional[Tuple[List[Span], List[int]]]:
+        """Sections of a document and the indices of those to keep, or None to keep it whole
+        (short documents, presentations, or no section matches the question)"""
+        text = document.page_content
+        if not self.applies(document):
+            return None
+        spans = self.sections(text)
+        terms = self.query_terms([question, document.metadata.get('search_query')])
+        scores = self.score(text, spans, terms)
+        best = [i for i in sorted(range(len(spans)), key=lambda i: -scores[i])[:self.top_sections] if scores[i] > 0]
+        if not best:
+            return None
+
+        keep = sorted({j for i in best for j in range(max(0, i - self.neighbors),
+                                                      min(len(spans), i + self.neighbors + 1))})
+        return spans, keep
+
+    @staticmethod
+    def runs(indices: Sequence[int]) -> List[Tuple[int, int]]:
+        """Consecutive indices grouped into (first, last) runs"""
+        runs = []
+        for i in sorted(indices):
+            if runs and runs[-1][1] == i - 1:
+                runs[-1] = (runs[-1][0], i)
+            else:
+                runs.append((i, i))
+        return runs
+
+    def texts(self, text: str, spans: Sequence[Span], indices: Sequence[int]) -> List[str]:
+        """Text of every run of consecutive kept sections"""
+        return [text[spans[first][0]:spans[last][1]].strip() for first, last in self.runs(indices)]
+
+    def documents(self, document: Document, spans: Sequence[Span], indices: Sequence[int]) -> List[Document]:
+        """One document per run of kept sections (so chunks never span a dropped gap), metadata shared"""
+        return [Document(page_content=part, metadata=dict(document.metadata))
+                for part in self.texts(document.page_content, spans, indices) if part]
+
+    def estimate_chunks(self, chars: int) -> int:
+        """Chunks (= embedding calls) the splitter makes of a text of ``chars`` characters"""
+        if chars <= 0:
+            return 0
+        stride = max(1, self.chunk_size - self.chunk_overlap)
+        return max(1, math.ceil(max(0, chars - self.chunk_overlap) / stride))
+
+    def _kept(self, chars: int, spans: Optional[Sequence[Span]], indices: Set[int]) -> Tuple[int, int]:
+        """Characters indexed and embedding calls saved for one source"""
+        if spans is None:
+            return chars, 0
+        runs = [spans[last][1] - spans[first][0] for first, last in self.runs(indices)]
+        return sum(runs), self.estimate_chunks(chars) - sum(self.estimate_chunks(length) for length in runs)
+
+    def record(self, source: str, chars: int, spans: Optional[Sequence[Span]] = None, indices: Sequence[int] = ()):
+        """Count sections of a long document as indexed (no spans: the whole document, nothing matched)"""
+        with self._lock:
+            _, known_spans, done = self._sources.setdefault(source, (chars, spans, set()))
+            done.update(indices)
+            kept_chars, saved = self._kept(chars, known_spans, done)
+        if spans is not None:
+            logger.info(f"Prefilter: {kept_chars} of {chars} characters of {source} indexed, "
+                        f"~{saved} embedding calls saved")
+
+    def forget(self, source: str, indices: Sequence[int] = None):
+        """Undo ``record`` for sections that were not indexed after all (None: the whole source)"""
+        with self._lock:
+            entry = self._sources.get(source)
+            if entry is None:
+                return
+            if indices is not None:
+                entry[2].difference_update(indices)
+            if indices is None or not entry[2]:
+                del self._sources[source]
+
+    def stats(self) -> dict:
+        """Long documents indexed, characters kept and dropped, estimated embedding calls saved"""
+        stats = {'documents': 0, 'filtered': 0, 'unmatched': 0, 'chars': 0, 'kept_chars': 0,
+                 'embedding_calls_saved': 0}
+        with self._lock:
+            for chars, spans, done in self._sources.values():
+                kept_chars, saved = self._kept(chars, spans, done)
+                stats['documents'] += 1
+                stats['filtered' if spans is not None else 'unmatched'] += 1
+                stats['chars'] += chars
+                stats['kept_chars'] += kept_chars
+                stats['embedding_calls_saved'] += saved
+        stats['dropped_chars'] = stats['chars'] - stats['kept_chars']
+        stats['dropped_fraction'] = stats['dropped_chars'] / stats['chars'] if stats['chars'] else 0.0
+        return stats
\ No newline at end of file
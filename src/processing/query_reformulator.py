@@ -1,14 +1,92 @@
-from langchain_community.llms import YandexGPT
+import re
+import threading
+from typing import List
+
 from config.settings import settings
+from src.utils.rate_limiter import get_llm_rate_limiter
+from src.utils.singleflight import SingleFlight, normalize_query
+
+QUESTION_WORDS = frozenset(['как', 'сколько', 'когда', 'почему', 'зачем', 'что', 'кто', 'чей', 'куда', 'откуда',
+                            'какой', 'какая', 'какое', 'какие', 'каких', 'каким', 'где', 'ли', 'можно', 'нужно', 'надо'])
+PRONOUNS = frozenset(['я', 'мне', 'мой', 'моя', 'мое', 'мои', 'меня', 'мною', 'мы', 'нам', 'наш', 'нас', 'нами',
+                      'он', 'она', 'они', 'его', 'ее', 'их', 'ему', 'ей', 'им', 'вы', 'вам', 'вас', 'ваш', 'ты', 'тебе'])
+# Предлоги, союзы и частицы: в поисковом запросе Консультант+ не нужны
+STOP_WORDS = frozenset(['в', 'во', 'на', 'с', 'со', 'к', 'ко', 'по', 'о', 'об', 'от', 'до', 'за', 'из', 'у', 'при',
+                        'для', 'без', 'про', 'под', 'над', 'и', 'а', 'но', 'или', 'же', 'бы', 'не', 'то', 'это', 'рф'])
+# Юридические сокращения -> (кодекс, термин): Консультант+ лучше ищет по названию кодекса
+LEGAL_ABBREVIATIONS = {
+    'тк': ('трудовой кодекс', ''),
+    'нк': ('налоговый кодекс', ''),
+    'гк': ('гражданский кодекс', ''),
+    'жк': ('жилищный кодекс', ''),
+    'ск': ('семейный кодекс', ''),
+    'ук': ('уголовный кодекс', ''),
+    'коап': ('кодекс об административных правонарушениях', ''),
+    'апк': ('арбитражный процессуальный кодекс', ''),
+    'гпк': ('гражданский процессуальный кодекс', ''),
+    'ндфл': ('налоговый кодекс', 'ндфл'),
+    'ндс': ('налоговый кодекс', 'ндс'),
+}
+_TOKEN = re.compile(r'\w+(?:-\w+)*', re.UNICODE)
+
+
+def keyword_terms(question: str) -> List[str]:
+    """Words of a question without question words, pronouns and prepositions; abbreviations
+    expanded, with the codes they name first ("ставка НДФЛ" -> налоговый кодекс ставка ндфл)"""
+    codes, terms = [], []
+    for token in _TOKEN.findall(question.lower().replace('ё', 'е')):
+        if token in QUESTION_WORDS or token in PRONOUNS or token in STOP_WORDS:
+            continue
+        code, term = LEGAL_ABBREVIATIONS.get(token, ('', token))
+        codes.extend(code.split())
+        terms.extend(term.split())
+    # Повторы (например, "налоговый кодекс" из НК и НДФЛ) не нужны
+    return list(dict.fromkeys(codes + terms))
+
+
+def is_keyword_query(question: str, max_words: int = None, short_words: int = None) -> bool:
+    """A query the LLM would not improve: keyword-style (no question mark, question words or
+    pronouns, at most ``max_words`` words) or short (at most ``short_words`` meaningful words)"""
+    max_words = max_words or settings.REFORMULATION_FAST_PATH_MAX_WORDS
+    short_words = short_words or settings.REFORMULATION_FAST_PATH_SHORT_WORDS
+    tokens = _TOKEN.findall(question.lower())
+    if not tokens:
+        return True
+    if len(keyword_terms(question)) <= short_words and len(tokens) <= max_words:
+        return True
+    natural = '?' in question or any(token in QUESTION_WORDS or token in PRONOUNS for token in tokens)
+    return not natural and len(tokens) <= max_words
+
 
 class QueryReformulator:
-    """Reformulates natural language questions into keyword queries for Consultant Plus"""
+    """Reformulates natural language questions into keyword queries for Consultant Plus.
+
+    Keyword-style and short queries (see is_keyword_query) are normalized locally:
+    stop words dropped and legal abbreviations (ТК, НК, НДФЛ...) expanded. Only
+    natural-language questions cost a YandexGPT call; ``stats`` reports the share
+    of queries that bypassed it.
+    """
+    
+    def __init__(self, llm=None, fast_path: bool = None):
+        self._llm = llm
+        self._llm_lock = threading.Lock()
+        self.fast_path = settings.REFORMULATION_FAST_PATH if fast_path is None else fast_path
+        self._flight = SingleFlight("reformulation")
+        self._stats_lock = threading.Lock()
+        self._stats = {'fast_path': 0, 'llm': 0}
     
-    def __init__(self, llm=None):
-        self.llm = llm or self._create_llm()
+    @property
+    def llm(self):
+        """YandexGPT client, created on the first question that needs it"""
+        with self._llm_lock:
+            if self._llm is None:
+                self._llm = self._create_llm()
+            return self._llm
     
     def _create_llm(self):
         """Create YandexGPT LLM instance for query reformulation"""
+        from langchain_community.llms import YandexGPT
+        
         return YandexGPT(
             folder_id=settings.FOLDER_ID,
             api_key=settings.API_KEY,
@@ -18,6 +96,26 @@ class QueryReformulator:
 
 
     def reformulate_for_consultant_plus(self, natural_question: str) -> str:
+        """Reformulate natural language question into keyword query (one LLM call per in-flight question)"""
+        if self.fast_path and is_keyword_query(natural_question):
+            keyword_query = ' '.join(keyword_terms(natural_question)) or natural_question.strip()
+            self._count('fast_path')
+            print(f"  Переформулировка без LLM: '{natural_question}' -> '{keyword_query}'")
+            return keyword_query
+        self._count('llm')
+        return self._flight.do(normalize_query(natural_question), self._reformulate, natural_question)
+    
+    def _count(self, route: str):
+        with self._stats_lock:
+            self._stats[route] += 1
+    
+    def stats(self) -> dict:
+        """Queries normalized locally vs sent to the LLM, and the bypassed fraction"""
+        with self._stats_lock:
+            total = self._stats['fast_path'] + self._stats['llm']
+            return {**self._stats, 'bypass_fraction': self._stats['fast_path'] / total if total else 0.0}
+    
+    def _reformulate(self, natural_question: str) -> str:
         """Reformulate natural language question into keyword query"""
         prompt = f"""
         Ты - помощник для поиска юридической информации в системе Консультант Плюс.
@@ -42,6 +140,7 @@ class QueryReformulator:
         Краткий поисковый запрос:"""
         
         try:
+            get_llm_rate_limiter().acquire()
             reformulated_query = self.llm.invoke(prompt).strip()
             print(f"  Переформулировка: '{natural_question}' -> '{reformulated_query}'")
             return reformulated_query
@@ -52,9 +151,5 @@ class QueryReformulator:
     
     def _fallback_reformulation(self, question: str) -> str:
         """Simple fallback reformulation without LLM"""
-        # Remove common question words and pronouns
-        question_words = ['как', 'сколько', 'когда', 'почему', 'зачем', 'что', 'кто', 'чей', 'куда', 'откуда']
-        pronouns = ['я', 'мне', 'мой', 'меня', 'мною', 'мы', 'нам', 'наш', 'нас', 'нами']
-        words = question.lower().split()
-        filtered_words = [word for word in words if word not in question_words + pronouns]
-        return ' '.join(filtered_words)
\ No newline at end of file
+        # Remove question words, pronouns and prepositions, expand abbreviations
+        return ' '.join(keyword_terms(question)) or question.strip()
\ No newline at end of file
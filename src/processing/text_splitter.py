@@ -4,11 +4,22 @@ from typing import List, Optional
 from config.settings import settings, DocumentType
 import re
 
+from .chunk import Chunk, MetadataInterner, OffsetChunk
+from .content_chunker import ContentDefinedSplitter
+
+CHUNKING_METHODS = ("recursive", "content_defined")
+
 class TextSplitter:
-    """Handles document splitting with various strategies optimized for different document types"""
+    """Handles document splitting with various strategies optimized for different document types.
+
+    With ``add_start_index`` chunks of non-PPTX documents carry their offset in the
+    document as ``metadata['start_index']`` (CorpusStore keeps such chunks as offsets).
+    """
     
-    def __init__(self, chunk_size: int = None, chunk_overlap: int = None, document_type: DocumentType = DocumentType.MIXED):
+    def __init__(self, chunk_size: int = None, chunk_overlap: int = None, document_type: DocumentType = DocumentType.MIXED,
+                 add_start_index: bool = False):
         self.document_type = document_type
+        self.add_start_index = add_start_index
         
         # Устанавливаем размеры чанков в зависимости от типа документа
         if document_type == DocumentType.PPTX:
@@ -24,41 +35,99 @@ class TextSplitter:
             self.chunk_overlap = chunk_overlap or settings.CHUNK_OVERLAP
             self.separators = ["\n\n", "\n", ". ", "! ", "? ", " ", ""]
     
-    def split_documents(self, documents: List[Document], method: str = "recursive") -> List[Document]:
+    def split_documents(self, documents: List[Document], method: str = None) -> List[Document]:
         """Split documents into chunks with type-specific optimization"""
+        return [chunk.to_document() for chunk in self.split_to_chunks(documents, method)]
+    
+    def split_to_chunks(self, documents: List[Document], method: str = None) -> List[Chunk]:
+        """Split documents into compact offset-based chunks (text and metadata are copied only when read).
+
+        ``method`` (settings.CHUNKING_METHOD by default): "recursive" cuts by running
+        length, "content_defined" anchors cuts to the text (see ContentDefinedSplitter),
+        so an amendment only changes the chunks around it.
+        """
+        method = method or settings.CHUNKING_METHOD
+        if method not in CHUNKING_METHODS:
+            raise ValueError(f"Unknown chunking method: {method}. Available: {', '.join(CHUNKING_METHODS)}")
         
         # Если есть PPTX документы и включена оптимизация по слайдам
         pptx_docs = [doc for doc in documents if doc.metadata.get('type') == 'pptx']
         other_docs = [doc for doc in documents if doc.metadata.get('type') != 'pptx']
         
         all_chunks = []
+        interner = MetadataInterner()
         
         # Обрабатываем PPTX документы с особой стратегией
         if pptx_docs and settings.PPTX_CHUNK_BY_SLIDE:
-            all_chunks.extend(self._split_pptx_by_slides(pptx_docs))
+            all_chunks.extend(self._split_pptx_by_slides(pptx_docs, interner))
         
         # Обрабатываем остальные документы стандартным способом
-        if other_docs:
+        chunk_class = OffsetChunk if self.add_start_index else Chunk
+        if other_docs and method == "content_defined":
+            splitter = ContentDefinedSplitter(self.chunk_size, self.chunk_overlap)
+            for doc in other_docs:
+                metadata = interner.intern_dict(doc.metadata)
+                all_chunks.extend(chunk_class(doc.page_content, start, end, metadata)
+                                  for start, end in splitter.split_spans(doc.page_content))
+        elif other_docs:
             splitter = RecursiveCharacterTextSplitter(
                 chunk_size=self.chunk_size,
                 chunk_overlap=self.chunk_overlap,
                 separators=self.separators
             )
-            all_chunks.extend(splitter.split_documents(other_docs))
+            for doc in other_docs:
+                all_chunks.extend(self._split_with_offsets(splitter, self.chunk_overlap, doc.page_content, 0,
+                                                           len(doc.page_content), interner.intern_dict(doc.metadata),
+                                                           chunk_class=chunk_class))
         
         return all_chunks
     
-    def _split_pptx_by_slides(self, pptx_documents: List[Document]) -> List[Document]:
+    def _split_with_offsets(self, splitter, chunk_overlap: int, parent: str, start: int, end: int, metadata: dict,
+                            extra_fn=None, chunk_class=Chunk) -> List[Chunk]:
+        """Split parent[start:end] with ``splitter`` (built with ``chunk_overlap``) and locate every piece
+        in the parent instead of keeping a copy"""
+        chunks = []
+        region = parent[start:end] if (start, end) != (0, len(parent)) else parent
+        pieces = splitter.split_text(region)
+        index = 0
+        previous_length = 0
+        
+        for i, piece in enumerate(pieces):
+            # Тот же поиск смещений, что и add_start_index в LangChain
+            offset = index + previous_length - chunk_overlap
+            index = region.find(piece, max(0, offset))
+            previous_length = len(piece)
+            extra = extra_fn(i, len(pieces)) if extra_fn else None
+            if index < 0:
+                # Кусок не найден дословно - храним его как отдельный текст
+                chunks.append(Chunk(piece, 0, len(piece), metadata, extra))
+                index = 0
+                continue
+            chunks.append(chunk_class(parent, start + index, start + index + len(piece), metadata, extra))
+        
+        return chunks
+    
+    @staticmethod
+    def _stripped_span(content: str, start: int, end: int):
+        """Offsets of content[start:end].strip() within content"""
+        while start < end and content[start].isspace():
+            start += 1
+        while end > start and content[end - 1].isspace():
+            end -= 1
+        return start, end
+    
+    def _split_pptx_by_slides(self, pptx_documents: List[Document], interner: MetadataInterner) -> List[Chunk]:
         """Специальная обработка PPTX документов по слайдам"""
         chunks = []
         
         for doc in pptx_documents:
             content = doc.page_content
-            metadata = doc.metadata.copy()
+            metadata = interner.intern_dict(doc.metadata)
             
             # Разделяем по слайдам (предполагается, что слайды разделены маркерами)
             slide_pattern = r'(?:Слайд \d+:|^|\n\n)(.*?)(?=(?:Слайд \d+:|$))'
-            slides = re.findall(slide_pattern, content, re.DOTALL)
+            slides = [self._stripped_span(content, m.start(1), m.end(1))
+                      for m in re.finditer(slide_pattern, content, re.DOTALL)]
             
             if not slides:
                 # Если не нашли разделение по слайдам, используем стандартное разделение
@@ -67,56 +136,49 @@ class TextSplitter:
                     chunk_overlap=settings.PPTX_CHUNK_OVERLAP,
                     separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""]
                 )
-                doc_chunks = splitter.split_documents([doc])
-                chunks.extend(doc_chunks)
+                chunks.extend(self._split_with_offsets(splitter, settings.PPTX_CHUNK_OVERLAP, content, 0,
+                                                       len(content), metadata))
                 continue
             
             # Обрабатываем каждый слайд
-            for i, slide_content in enumerate(slides):
-                slide_content = slide_content.strip()
-                if not slide_content:
+            for i, (slide_start, slide_end) in enumerate(slides):
+                slide_length = slide_end - slide_start
+                if not slide_length:
                     continue
                 
                 # Если слайд слишком длинный, разбиваем его дальше
-                if len(slide_content) > settings.MAX_SLIDE_CHUNK_SIZE:
-                    slide_chunks = self._split_long_slide(slide_content, i+1, metadata)
-                    chunks.extend(slide_chunks)
-                elif len(slide_content) >= settings.MIN_SLIDE_CHUNK_SIZE:
+                if slide_length > settings.MAX_SLIDE_CHUNK_SIZE:
+                    chunks.extend(self._split_long_slide(content, slide_start, slide_end, i+1, metadata, interner))
+                elif slide_length >= settings.MIN_SLIDE_CHUNK_SIZE:
                     # Создаем чанк из одного слайда
-                    slide_metadata = metadata.copy()
-                    slide_metadata['slide_number'] = i + 1
-                    slide_metadata['chunk_type'] = 'full_slide'
-                    slide_metadata['original_slide_length'] = len(slide_content)
-                    
-                    chunk = Document(
-                        page_content=slide_content,
-                        metadata=slide_metadata
+                    extra = interner.intern_items(
+                        slide_number=i + 1,
+                        chunk_type='full_slide',
+                        original_slide_length=slide_length
                     )
-                    chunks.append(chunk)
+                    chunks.append(Chunk(content, slide_start, slide_end, metadata, extra))
                 else:
                     # Если слайд слишком короткий, объединяем со следующим
                     if i < len(slides) - 1:
-                        next_slide = slides[i + 1].strip()
-                        combined_content = slide_content + "\n\n" + next_slide
+                        next_start, next_end = slides[i + 1]
+                        # Два коротких слайда через пустую строку, без маркера следующего слайда:
+                        # такого участка в исходном тексте нет, поэтому у чанка своя строка
+                        combined_content = content[slide_start:slide_end] + "\n\n" + content[next_start:next_end]
                         
                         if len(combined_content) <= settings.MAX_SLIDE_CHUNK_SIZE:
-                            slide_metadata = metadata.copy()
-                            slide_metadata['slide_numbers'] = f"{i+1}-{i+2}"
-                            slide_metadata['chunk_type'] = 'combined_slides'
-                            
-                            chunk = Document(
-                                page_content=combined_content,
-                                metadata=slide_metadata
+                            extra = interner.intern_items(
+                                slide_numbers=f"{i+1}-{i+2}",
+                                chunk_type='combined_slides'
                             )
-                            chunks.append(chunk)
+                            chunks.append(Chunk(combined_content, 0, len(combined_content), metadata, extra))
                             # Пропускаем следующий слайд, так как мы его уже объединили
-                            slides[i + 1] = ""
+                            slides[i + 1] = (next_end, next_end)
         
         return chunks
     
-    def _split_long_slide(self, slide_content: str, slide_num: int, metadata: dict) -> List[Document]:
+    def _split_long_slide(self, content: str, slide_start: int, slide_end: int, slide_num: int,
+                          metadata: dict, interner: MetadataInterner) -> List[Chunk]:
         """Разбивает длинный слайд на несколько чанков"""
-        chunks = []
         
         # Используем рекурсивное разделение для длинных слайдов
         splitter = RecursiveCharacterTextSplitter(
@@ -125,24 +187,17 @@ class TextSplitter:
             separators=["\n\n", "\n", ". ", " ", ""]
         )
         
-        # Создаем временный документ для разделения
-        temp_doc = Document(page_content=slide_content, metadata=metadata)
-        slide_chunks = splitter.split_documents([temp_doc])
-        
         # Обновляем метаданные для каждого чанка
-        for i, chunk in enumerate(slide_chunks):
-            chunk_metadata = chunk.metadata.copy()
-            chunk_metadata['slide_number'] = slide_num
-            chunk_metadata['chunk_type'] = 'slide_part'
-            chunk_metadata['part_number'] = i + 1
-            chunk_metadata['total_parts'] = len(slide_chunks)
-            
-            chunks.append(Document(
-                page_content=chunk.page_content,
-                metadata=chunk_metadata
-            ))
+        def slide_part(i, total_parts):
+            return interner.intern_items(
+                slide_number=slide_num,
+                chunk_type='slide_part',
+                part_number=i + 1,
+                total_parts=total_parts
+            )
         
-        return chunks
+        return self._split_with_offsets(splitter, settings.PPTX_CHUNK_OVERLAP, content, slide_start, slide_end,
+                                        metadata, slide_part)
     
     def get_optimal_settings(self, document_type: str, avg_content_length: int = None) -> dict:
         """Возвращает оптимальные настройки для конкретного типа документов"""
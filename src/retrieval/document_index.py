@@ -0,0 +1,190 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import threading
+
+from config.settings import settings
+
+# Поля метаданных, из которых собирается описание документа (результаты поиска Консультант+)
+DESCRIPTION_FIELDS = ('title', 'description', 'text_info')
+
+
+def describe(metadata: dict) -> str:
+    """Title, description and text_info of a document joined into one text"""
+    return ". ".join(str(metadata[field]).strip() for field in DESCRIPTION_FIELDS if metadata.get(field))
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class DocumentIndex:
+    """First level of hierarchical retrieval: one vector per source document.
+
+    A document vector mixes the embedding of its description (title, description and
+    text_info metadata) with the mean of its chunk vectors, both normalized, weighted by
+    ``metadata_weight``. Chunk sums are kept per document, so adding chunks, replacing a
+    document or dropping it only updates that document's row; description embeddings
+    are computed once per distinct description text.
+
+    Documents are keyed by ``source`` and remember their partition and source type, so
+    a search can be limited to the source types of a SearchMode.
+    """
+
+    def __init__(self, embeddings, metadata_weight: float = None):
+        self.embeddings = embeddings
+        self.metadata_weight = settings.HIERARCHICAL_METADATA_WEIGHT if metadata_weight is None else metadata_weight
+        self.sources: List[str] = []  # Строка матрицы -> источник
+        self.rows: Dict[str, int] = {}
+        self.partitions: Dict[str, str] = {}  # Источник -> раздел индекса, где лежат его чанки
+        self.types: Dict[str, str] = {}
+        self.descriptions: Dict[str, str] = {}
+        self.chunk_sums: Dict[str, np.ndarray] = {}
+        self.chunk_counts: Dict[str, int] = {}
+        self._description_vectors: Dict[str, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    # ---- maintenance ----
+
+    def _embed_descriptions(self, texts: Iterable[str]):
+        """Embed description texts not seen yet (outside the lock: a network call for YandexGPT)"""
+        with self.lock:
+            missing = [text for text in dict.fromkeys(texts) if text and text not in self._description_vectors]
+        if missing:
+            vectors = np.asarray(self.embeddings.embed_documents(missing), dtype=np.float32)
+            with self.lock:
+                self._description_vectors.update((text, _unit(vector)) for text, vector in zip(missing, vectors))
+
+    def _document_vector(self, source: str) -> np.ndarray:
+        pooled = _unit(self.chunk_sums[source] / max(1, self.chunk_counts[source]))
+        described = self._description_vectors.get(self.descriptions.get(source, ''))
+        if described is None:
+            return pooled
+        return _unit(self.metadata_weight * described + (1.0 - self.metadata_weight) * pooled)
+
+    def _write_rows(self, sources: Iterable[str]):
+        for source in sources:
+            vector = self._document_vector(source)
+            row = self.rows.get(source)
+            if row is None:
+                row = self.rows[source] = len(self.sources)
+                self.sources.append(source)
+                if self._matrix is None:
+                    self._matrix = np.zeros((16, len(vector)), dtype=np.float32)
+                elif row >= len(self._matrix):
+                    # Емкость растет вдвое, как у списка: добавление документа не копирует матрицу
+                    self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+            self._matrix[row] = vector
+
+    def add_chunks(self, items: Iterable[Tuple[dict, object]], partition: str) -> int:
+        """Pool (metadata, vector) pairs of new chunks of one partition into their documents' vectors.
+
+        Returns the number of documents whose vector changed.
+        """
+        items = list(items)
+        if not items:
+            return 0
+        self._embed_descriptions(describe(metadata) for metadata, _ in items)
+        changed = set()
+        with self.lock:
+            for metadata, vector in items:
+                source = metadata.get('source', '')
+                vector = np.asarray(vector, dtype=np.float32)
+                if source not in self.chunk_sums:
+                    self.chunk_sums[source] = np.zeros_like(vector)
+                    self.chunk_counts[source] = 0
+                    self.partitions[source] = partition
+                    self.types[source] = metadata.get('type') or ''
+                    self.descriptions[source] = describe(metadata)
+                self.chunk_sums[source] += vector
+                self.chunk_counts[source] += 1
+                changed.add(source)
+            self._write_rows(changed)
+        return len(changed)
+
+    def remove_sources(self, sources: Iterable[str]):
+        """Drop documents; the last row moves into the freed one"""
+        with self.lock:
+            for source in sources:
+                row = self.rows.pop(source, None)
+                if row is None:
+                    continue
+                last = self.sources.pop()
+                if last != source:
+                    self.sources[row] = last
+                    self.rows[last] = row
+                    self._matrix[row] = self._matrix[len(self.sources)]
+                for table in (self.partitions, self.types, self.descriptions, self.chunk_sums, self.chunk_counts):
+                    table.pop(source, None)
+
+    def remove_partition(self, partition: str):
+        with self.lock:
+            sources = [source for source, key in self.partitions.items() if key == partition]
+        self.remove_sources(sources)
+
+    def replace_partition(self, partition: str, items: Iterable[Tuple[dict, object]]) -> int:
+        """Rebuild the vectors of a revised partition's documents from their new chunks"""
+        items = list(items)
+        self._embed_descriptions(describe(metadata) for metadata, _ in items)
+        with self.lock:
+            self.remove_partition(partition)
+            return self.add_chunks(items, partition)
+
+    # ---- search ----
+
+    def search(self, query_vector, m: int, type_filter=None) -> List[str]:
+        """Sources of the ``m`` documents closest to the query, best first.
+
+        ``type_filter(source_type)`` limits the candidates, e.g. to the types of a SearchMode.
+        """
+        with self.lock:
+            count = len(self.sources)
+            if count == 0:
+                return []
+            scores = self._matrix[:count] @ _unit(np.asarray(query_vector, dtype=np.float32))
+            sources = list(self.sources)
+            if type_filter is not None:
+                allowed = np.array([type_filter(self.types[source]) for source in sources])
+                scores = np.where(allowed, scores, -np.inf)
+                count = int(allowed.sum())
+        m = min(m, count)
+        if m <= 0:
+            return []
+        top = np.argpartition(-scores, m - 1)[:m]
+        top = top[np.argsort(-scores[top])]
+        return [sources[row] for row in top]
+
+    # ---- persistence ----
+
+    def state(self) -> dict:
+        with self.lock:
+            return {
+                'metadata_weight': self.metadata_weight,
+                'partitions': dict(self.partitions),
+                'types': dict(self.types),
+                'descriptions': dict(self.descriptions),
+                'chunk_sums': {source: vector.copy() for source, vector in self.chunk_sums.items()},
+                'chunk_counts': dict(self.chunk_counts),
+                'description_vectors': dict(self._description_vectors),
+            }
+
+    def restore(self, state: dict):
+        with self.lock:
+            self.metadata_weight = state['metadata_weight']
+            self.partitions = state['partitions']
+            self.types = state['types']
+            self.descriptions = state['descriptions']
+            self.chunk_sums = state['chunk_sums']
+            self.chunk_counts = state['chunk_counts']
+            self._description_vectors = state['description_vectors']
+            self.sources, self.rows, self._matrix = [], {}, None
+            self._write_rows(list(self.chunk_sums))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'documents': len(self.sources), 'chunks': sum(self.chunk_counts.values()),
+                    'descriptions': len(self._description_vectors)}
\ No newline at end of file
@@ -0,0 +1,345 @@
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from langchain.schema import Document
+from config.settings import settings, SearchMode
+
+from .vector_store import VectorStoreManager, get_backend_id, l2_relevance
+from .document_index import DocumentIndex
+from .query_cache import QueryEmbeddingCache, get_default_cache
+from .retriever import SharedIndexRetriever
+
+logger = logging.getLogger(__name__)
+
+PARTITION_MANIFEST = "partitions.json"
+DOCUMENT_INDEX_FILE = "document_index.pkl"
+
+# Раздел для индексов, собранных до разбиения: ищется всегда, результаты фильтруются по типу
+UNPARTITIONED = "mixed"
+
+SEARCH_MODE_PARTITIONS = {
+    SearchMode.CONSULTANT_ONLY: ["consultant"],
+    SearchMode.PPTX_ONLY: ["pptx"],
+    SearchMode.BOTH: None,  # все разделы
+}
+
+
+def partitions_for_mode(search_mode: Optional[SearchMode]) -> Optional[List[str]]:
+    """Partitions to search for a SearchMode (None means all of them)"""
+    if search_mode is None:
+        return None
+    return SEARCH_MODE_PARTITIONS[search_mode]
+
+
+class PartitionedVectorStoreManager:
+    """Vector store split into independent per-partition indexes.
+
+    Chunks are partitioned by source type (``consultant``, ``pptx``) and, with
+    ``by_document``, by source document too (``consultant/<url>``, ``pptx/<path>``).
+    Types listed in settings.PARTITION_BY_DOCUMENT_TYPES are always split by document,
+    so one changed presentation can be swapped in without touching the others.
+    A search embeds the query once, searches only the selected partitions and merges
+    the hits by distance, so SearchMode becomes a query-time choice and a filtered
+    query only touches the vectors of its partitions.
+
+    With ``hierarchical`` a DocumentIndex keeps one vector per source document, and a
+    search first picks the ``top_documents`` closest documents, then ranks only their
+    chunks. Both levels are updated by add_documents / replace_partition.
+
+    Exposes the same interface as VectorStoreManager, with an extra ``partitions``
+    argument on the search methods.
+    """
+
+    def __init__(self, embeddings, storage_mode: str = None, pca_dim: Optional[int] = None, docstore=None,
+                 by_document: bool = None, query_cache: QueryEmbeddingCache = None, hierarchical: bool = None,
+                 top_documents: int = None):
+        self.embeddings = embeddings
+        self.backend_id = get_backend_id(embeddings)
+        self.storage_mode = storage_mode or settings.VECTOR_STORAGE_MODE
+        self.pca_dim = pca_dim
+        self.docstore = docstore
+        self.by_document = settings.PARTITION_BY_DOCUMENT if by_document is None else by_document
+        self.by_document_types = set(settings.PARTITION_BY_DOCUMENT_TYPES)
+        self.query_cache = query_cache or get_default_cache()
+        self.partitions: Dict[str, VectorStoreManager] = {}
+        hierarchical = settings.HIERARCHICAL_RETRIEVAL if hierarchical is None else hierarchical
+        # Первый уровень иерархического поиска: вектор на документ
+        self.document_index = DocumentIndex(embeddings) if hierarchical else None
+        self.top_documents = top_documents or settings.HIERARCHICAL_TOP_DOCUMENTS
+        # Сколько чанков пришло в replace_partition и сколько из них пришлось эмбеддить заново
+        self.reembed_stats = {'chunks': 0, 'embedded': 0}
+        # Защищает словарь разделов; каждый раздел имеет собственную блокировку
+        self.lock = threading.RLock()
+
+    check_backend = VectorStoreManager.check_backend
+
+    # ---- partitions ----
+
+    def partition_key(self, metadata: dict) -> str:
+        source_type = metadata.get('type') or UNPARTITIONED
+        if self.by_document or source_type in self.by_document_types:
+            return f"{source_type}/{metadata.get('source', '')}"
+        return source_type
+
+    @staticmethod
+    def _matches(key: str, partitions: Iterable[str]) -> bool:
+        """A partition name selects itself and, for a source type, all its per-document partitions"""
+        return any(key == name or key.startswith(name + '/') for name in partitions)
+
+    def _new_partition(self) -> VectorStoreManager:
+        return VectorStoreManager(self.embeddings, storage_mode=self.storage_mode, pca_dim=self.pca_dim,
+                                  docstore=self.docstore, query_cache=self.query_cache)
+
+    def select(self, partitions: Optional[Iterable[str]] = None) -> Dict[str, VectorStoreManager]:
+        """Snapshot of the partitions matching the given names (all partitions for None)"""
+        with self.lock:
+            if partitions is None:
+                return dict(self.partitions)
+            partitions = list(partitions)
+            return {
+                key: manager for key, manager in self.partitions.items()
+                if key == UNPARTITIONED or self._matches(key, partitions)
+            }
+
+    def partition_sizes(self) -> Dict[str, int]:
+        return {key: manager.size for key, manager in self.select().items()}
+
+    def drop_partition(self, key: str):
+        with self.lock:
+            self.partitions.pop(key, None)
+        if self.document_index is not None:
+            self.document_index.remove_partition(key)
+
+    def replace_partition(self, key: str, documents: List[Document]) -> int:
+        """Rebuild one partition from documents and swap it in atomically.
+
+        The new index is built aside; queries keep using the old one until the swap,
+        and never see a half-built partition. Chunks whose text is already in the old
+        partition keep their vectors, so a revised document only re-embeds the chunks
+        that actually changed.
+        """
+        if not documents:
+            self.drop_partition(key)
+            return 0
+        with self.lock:
+            old = self.partitions.get(key)
+        known = old.vectors_by_text() if old is not None else {}
+
+        texts = [doc.page_content for doc in documents]
+        missing = list(dict.fromkeys(text for text in texts if text not in known))
+        if missing:
+            known.update(zip(missing, self.embeddings.embed_documents(missing)))
+        with self.lock:
+            self.reembed_stats['chunks'] += len(texts)
+            self.reembed_stats['embedded'] += len(missing)
+
+        manager = self._new_partition()
+        vectors = [known[text] for text in texts]
+        manager.add_embeddings(texts, vectors, [doc.metadata for doc in documents])
+        if self.document_index is not None:
+            self.document_index.replace_partition(key, [(doc.metadata, vector) for doc, vector in zip(documents, vectors)])
+        with self.lock:
+            self.partitions[key] = manager
+        logger.info(f"Partition {key}: {len(missing)} of {len(texts)} chunks re-embedded")
+        return manager.size
+
+    # ---- indexing ----
+
+    def add_documents(self, documents: List[Document]) -> List[str]:
+        """Embed all documents in one pass outside the locks, then route the vectors to their partitions"""
+        if not documents:
+            return []
+        texts = [doc.page_content for doc in documents]
+        vectors = self.embeddings.embed_documents(texts)
+
+        groups: Dict[str, list] = {}
+        for doc, vector in zip(documents, vectors):
+            groups.setdefault(self.partition_key(doc.metadata), []).append((doc, vector))
+
+        ids = []
+        for key, items in groups.items():
+            with self.lock:
+                manager = self.partitions.get(key)
+                if manager is None:
+                    manager = self.partitions[key] = self._new_partition()
+            ids.extend(manager.add_embeddings(
+                [doc.page_content for doc, _ in items],
+                [vector for _, vector in items],
+                [doc.metadata for doc, _ in items]
+            ))
+            if self.document_index is not None:
+                self.document_index.add_chunks([(doc.metadata, vector) for doc, vector in items], key)
+        return ids
+
+    # ---- search ----
+
+    def similarity_search_with_score(self, query: str, k: int = None, partitions: Optional[Iterable[str]] = None,
+                                     **kwargs) -> List[tuple]:
+        """(document, L2 distance) pairs merged across the selected partitions"""
+        k = k or settings.SEARCH_KWARGS.get("k", 4)
+        selected = self.select(partitions)
+        if not selected:
+            return []
+        embedding = self.query_cache.get_or_compute(query, self.backend_id, self.embeddings.embed_query).tolist()
+        if self.document_index is not None and len(self.document_index):
+            return self._hierarchical_search(embedding, selected, k, partitions, **kwargs)
+
+        results = []
+        for key, manager in selected.items():
+            if key == UNPARTITIONED and partitions is not None:
+                # Старый неразбитый индекс: берем с запасом и оставляем только выбранные типы
+                hits = manager.similarity_search_with_score_by_vector(embedding, k=k * 4, **kwargs)
+                hits = [(doc, score) for doc, score in hits
+                        if self._matches(self.partition_key(doc.metadata), partitions)]
+            else:
+                hits = manager.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+            results.extend(hits)
+        # Все разделы построены одним бэкендом, поэтому расстояния сравнимы
+        results.sort(key=lambda pair: pair[1])
+        return results[:k]
+
+    def _hierarchical_search(self, embedding, selected: Dict[str, VectorStoreManager], k: int,
+                             partitions: Optional[Iterable[str]], **kwargs) -> List[tuple]:
+        """Rank documents first, then only the chunks of the top documents"""
+        type_filter = None if partitions is None else (lambda source_type: self._matches(source_type, partitions))
+        top = self.document_index.search(embedding, self.top_documents, type_filter=type_filter)
+        by_partition: Dict[str, list] = {}
+        for source in top:
+            by_partition.setdefault(self.document_index.partitions.get(source), []).append(source)
+
+        results = []
+        for key, sources in by_partition.items():
+            manager = selected.get(key)
+            if manager is None:
+                continue
+            if '/' not in key:
+                # Раздел с многими документами: считаются расстояния только до чанков выбранных
+                results.extend(manager.similarity_search_within_sources(embedding, sources, k=k, **kwargs))
+            else:
+                results.extend(manager.similarity_search_with_score_by_vector(embedding, k=k, **kwargs))
+        results.sort(key=lambda pair: pair[1])
+        return results[:k]
+
+    def similarity_search(self, query: str, k: int = None, partitions: Optional[Iterable[str]] = None,
+                          **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, partitions=partitions, **kwargs)]
+
+    def similarity_search_with_relevance_scores(self, query: str, k: int = None,
+                                                partitions: Optional[Iterable[str]] = None, **kwargs) -> List[tuple]:
+        """Search returning (document, relevance in [0, 1]) pairs"""
+        return [
+            (doc, l2_relevance(score))
+            for doc, score in self.similarity_search_with_score(query, k=k, partitions=partitions, **kwargs)
+        ]
+
+    def get_retriever(self, partitions: Optional[Iterable[str]] = None, **kwargs) -> SharedIndexRetriever:
+        """Retriever limited to the given partitions"""
+        search_kwargs = {**settings.SEARCH_KWARGS, **kwargs}
+        if partitions is not None:
+            search_kwargs['partitions'] = list(partitions)
+        return SharedIndexRetriever(manager=self, search_kwargs=search_kwargs)
+
+    # ---- bookkeeping ----
+
+    def indexed_sources(self) -> set:
+        sources = set()
+        for manager in self.select().values():
+            sources |= manager.indexed_sources()
+        return sources
+
+    @property
+    def size(self) -> int:
+        return sum(self.partition_sizes().values())
+
+    # ---- persistence ----
+
+    def save_vector_store(self, path: str):
+        """Save every partition to its own subfolder plus a manifest of partition keys"""
+        selected = self.select()
+        os.makedirs(path, exist_ok=True)
+        folders = {}
+        for number, (key, manager) in enumerate(sorted(selected.items())):
+            if manager.vector_store is None:
+                continue
+            folder = f"part_{number:05d}"
+            self._save_partition(manager, os.path.join(path, folder))
+            folders[key] = folder
+        if self.document_index is not None:
+            with open(os.path.join(path, DOCUMENT_INDEX_FILE), 'wb') as f:
+                pickle.dump(self.document_index.state(), f)
+
+        with open(os.path.join(path, PARTITION_MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump({
+                'backend_id': self.backend_id,
+                'storage_mode': self.storage_mode,
+                'by_document': self.by_document,
+                'partitions': folders,
+            }, f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def _save_partition(manager: VectorStoreManager, partition_path: str):
+        """Save a partition aside and swap the folder in, so a store loaded from it never reads a half-deleted folder"""
+        staging = tempfile.mkdtemp(prefix=os.path.basename(partition_path) + ".", dir=os.path.dirname(partition_path))
+        try:
+            manager.save_vector_store(staging)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        retired = None
+        if os.path.isdir(partition_path):
+            retired = staging + ".old"
+            os.rename(partition_path, retired)
+        os.rename(staging, partition_path)
+        if retired is not None:
+            # Отображенные в память файлы старой папки остаются доступны читателям и после удаления
+            shutil.rmtree(retired, ignore_errors=True)
+
+    def load_vector_store(self, path: str, partition: str = None):
+        """Load a partitioned index, or a plain VectorStoreManager index as a single partition.
+
+        A plain index goes to ``partition`` (e.g. ``consultant`` for the local corpus),
+        or to the ``mixed`` partition, which is always searched and filtered by type.
+        """
+        manifest_path = os.path.join(path, PARTITION_MANIFEST)
+        if not os.path.exists(manifest_path):
+            manager = self._new_partition()
+            manager.load_vector_store(path)
+            with self.lock:
+                self.partitions[partition or UNPARTITIONED] = manager
+            self._index_documents({partition or UNPARTITIONED: manager})
+            return
+
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.check_backend(manifest['backend_id'])
+        self.storage_mode = manifest.get('storage_mode', self.storage_mode)
+        self.by_document = manifest.get('by_document', self.by_document)
+
+        loaded = {}
+        for key, folder in manifest['partitions'].items():
+            manager = self._new_partition()
+            manager.load_vector_store(os.path.join(path, folder))
+            loaded[key] = manager
+        with self.lock:
+            self.partitions.update(loaded)
+        document_index_path = os.path.join(path, DOCUMENT_INDEX_FILE)
+        if self.document_index is not None and os.path.exists(document_index_path):
+            with open(document_index_path, 'rb') as f:
+                self.document_index.restore(pickle.load(f))
+        else:
+            self._index_documents(loaded)
+
+    def _index_documents(self, loaded: Dict[str, VectorStoreManager]):
+        """Build document vectors for loaded partitions (indexes saved without a document level)"""
+        if self.document_index is None:
+            return
+        for key, manager in loaded.items():
+            chunks = manager.chunk_vectors()
+            self.document_index.replace_partition(key, [(doc.metadata, vector) for doc, vector in chunks])
+            logger.info(f"Partition {key}: document vectors for {len({doc.metadata.get('source') for doc, _ in chunks})} sources")
\ No newline at end of file
@@ -0,0 +1,380 @@
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain.schema import Document
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STORAGE_MODES = ("float32", "float16", "int8")
+FULL_PRECISION_FILE = "vectors.f32"
+INDEX_FILE = "quantized_index.npz"
+DOCSTORE_FILE = "quantized_docstore.pkl"
+FIT_SAMPLE_SIZE = 50000  # Векторов, по которым подбираются PCA и диапазоны int8
+
+
+class QuantizedVectorStore(VectorStore):
+    """Flat vector store keeping compressed vectors in memory (float16 or int8, optional PCA).
+
+    Full-precision float32 vectors live in a memory-mapped side file. Search scans the
+    compressed vectors, then rescores the top ``k * rescore_factor`` candidates with the
+    exact vectors, so only a few rows of the side file are ever paged in.
+    Distances are squared L2, like the default FAISS index.
+
+    PCA and the int8 ranges are fitted on the first batch and refitted from the side
+    file (all codes re-encoded) each time the store doubles, until FIT_SAMPLE_SIZE
+    vectors have been seen; a PCA that the first batch was too small for is enabled then.
+    Without ``side_file_dir`` the side file lives in a temporary directory removed by close().
+    A store loaded with ``load_local`` only reads the snapshot folder: the side file is
+    copied to its own directory before the first write.
+    """
+
+    def __init__(self, embedding: Embeddings, storage_mode: str = "int8", pca_dim: Optional[int] = None,
+                 rescore_factor: int = 4, side_file_dir: Optional[str] = None, scan_block_size: int = 65536,
+                 docstore=None):
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {storage_mode}. Available: {', '.join(STORAGE_MODES)}")
+
+        self.embedding = embedding
+        self.storage_mode = storage_mode
+        self.pca_dim = pca_dim
+        self.rescore_factor = max(1, rescore_factor)
+        self.scan_block_size = scan_block_size
+        self._temp_dir = None if side_file_dir else tempfile.TemporaryDirectory(prefix="quantized_store_")
+        self.side_file_dir = side_file_dir or self._temp_dir.name
+        os.makedirs(self.side_file_dir, exist_ok=True)
+        # Каталог снапшота из load_local: только читается, side file копируется в side_file_dir при первой записи
+        self.base_dir: Optional[str] = None
+
+        self.dimension = None
+        self.ids: List[str] = []
+        self.documents: Dict[str, Document] = {}
+        # Внешний docstore (например, CorpusDocstore) вместо словаря в памяти
+        self.docstore = docstore
+        self._codes = None
+        self._full = None
+        # PCA и параметры int8 подбираются по первому батчу и уточняются по мере роста индекса
+        self._target_pca_dim = pca_dim
+        self._fitted_rows = 0
+        self._pca_mean = None
+        self._pca_components = None
+        self._scale = None
+        self._offset = None
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    # ---- encoding ----
+
+    @property
+    def _side_file_path(self) -> str:
+        """Side file to read from (the snapshot folder until the store is written to)"""
+        return os.path.join(self.base_dir or self.side_file_dir, FULL_PRECISION_FILE)
+
+    def _own_side_file(self):
+        """Copy the side file of the loaded snapshot into side_file_dir before it is written to"""
+        if self.base_dir is None:
+            return
+        source = self._side_file_path
+        self.base_dir = None
+        if os.path.exists(source):
+            shutil.copyfile(source, self._side_file_path)
+
+    def _fit(self, vectors: np.ndarray):
+        reduced = vectors
+        self.pca_dim = self._target_pca_dim
+        self._pca_mean = self._pca_components = None
+
+        if self.pca_dim and self.pca_dim < self.dimension:
+            if len(vectors) < self.pca_dim:
+                logger.warning(f"Not enough vectors ({len(vectors)}) to fit PCA to {self.pca_dim} dims, "
+                               f"PCA disabled until the index grows")
+                self.pca_dim = None
+            else:
+                self._pca_mean = vectors.mean(axis=0)
+                _, _, vt = np.linalg.svd(vectors - self._pca_mean, full_matrices=False)
+                self._pca_components = vt[:self.pca_dim].T.astype(np.float32)
+                reduced = self._project(vectors)
+        else:
+            self.pca_dim = None
+
+        if self.storage_mode == "int8":
+            low = reduced.min(axis=0)
+            high = reduced.max(axis=0)
+            # Небольшой запас, чтобы векторы из следующих батчей реже обрезались
+            margin = (high - low) * 0.05 + 1e-6
+            low, high = low - margin, high + margin
+            self._scale = ((high - low) / 255.0).astype(np.float32)
+            self._offset = low.astype(np.float32)
+        self._fitted_rows = len(vectors)
+
+    def _refit(self):
+        """Refit PCA and int8 ranges on (a sample of) all stored vectors and re-encode the codes"""
+        full = self._full
+        rows = np.arange(len(self.ids))
+        if len(rows) > FIT_SAMPLE_SIZE:
+            rows = np.sort(np.random.default_rng(0).choice(rows, FIT_SAMPLE_SIZE, replace=False))
+        self._fit(np.asarray(full[rows]))
+        self._fitted_rows = len(self.ids)
+        self._codes = np.vstack([self._encode(np.asarray(full[start:start + self.scan_block_size]))
+                                 for start in range(0, len(self.ids), self.scan_block_size)])
+        logger.info(f"Refitted {self.storage_mode} encoding on {len(rows)} of {len(self.ids)} vectors "
+                    f"(PCA: {self.pca_dim or 'off'})")
+
+    def _project(self, vectors: np.ndarray) -> np.ndarray:
+        if self._pca_components is None:
+            return vectors
+        return (vectors - self._pca_mean) @ self._pca_components
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        reduced = self._project(vectors)
+        if self.storage_mode == "float16":
+            return reduced.astype(np.float16)
+        if self.storage_mode == "int8":
+            q = np.rint((reduced - self._offset) / self._scale) - 128
+            return np.clip(q, -128, 127).astype(np.int8)
+        return reduced.astype(np.float32)
+
+    def _decode(self, codes: np.ndarray) -> np.ndarray:
+        if self.storage_mode == "int8":
+            return (codes.astype(np.float32) + 128) * self._scale + self._offset
+        return codes.astype(np.float32)
+
+    def _append_full_precision(self, vectors: np.ndarray):
+        self._own_side_file()
+        with open(self._side_file_path, 'ab') as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self._full = np.memmap(self._side_file_path, dtype=np.float32, mode='r',
+                               shape=(len(self.ids), self.dimension))
+
+    # ---- VectorStore API ----
+
+    def add_embeddings(self, text_embeddings: Iterable[Tuple[str, List[float]]],
+                       metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        """Add precomputed (text, vector) pairs"""
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        texts = [text for text, _ in text_embeddings]
+        vectors = np.asarray([vector for _, vector in text_embeddings], dtype=np.float32)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+            self._own_side_file()
+            if os.path.exists(self._side_file_path):
+                os.remove(self._side_file_path)
+            self._fit(vectors)
+        elif vectors.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dimension}")
+
+        codes = self._encode(vectors)
+        self._codes = codes if self._codes is None else np.vstack([self._codes, codes])
+        new_documents = {
+            doc_id: Document(page_content=text, metadata=metadata, id=doc_id)
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        }
+        if self.docstore is not None:
+            self.docstore.add(new_documents)
+        else:
+            self.documents.update(new_documents)
+        self.ids.extend(ids)
+        self._append_full_precision(vectors)
+        if self._fitted_rows < FIT_SAMPLE_SIZE and len(self.ids) >= 2 * self._fitted_rows:
+            self._refit()
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+
+    def close(self):
+        """Release the side file; a temporary side file directory is removed"""
+        self._full = None
+        if self._temp_dir is not None:
+            self._temp_dir.cleanup()
+            self._temp_dir = None
+
+    def get_document(self, doc_id: str) -> Document:
+        if self.docstore is not None:
+            return self.docstore.search(doc_id)
+        return self.documents[doc_id]
+
+    def merge_from(self, other: "QuantizedVectorStore"):
+        """Append all vectors and documents of another store (re-encoded with this store's parameters)"""
+        if not other.ids:
+            return
+        full = np.asarray(other._full)
+        documents = [other.get_document(doc_id) for doc_id in other.ids]
+        text_embeddings = [(doc.page_content, full[row]) for row, doc in enumerate(documents)]
+        metadatas = [doc.metadata for doc in documents]
+        self.add_embeddings(text_embeddings, metadatas=metadatas, ids=list(other.ids))
+
+    def _approximate_distances(self, query: np.ndarray) -> np.ndarray:
+        target = self._project(query[None, :])[0].astype(np.float32)
+        distances = np.empty(len(self.ids), dtype=np.float32)
+        # Декодируем блоками, чтобы не держать в памяти полную float32 копию
+        for start in range(0, len(self.ids), self.scan_block_size):
+            block = self._decode(self._codes[start:start + self.scan_block_size])
+            diff = block - target
+            distances[start:start + len(block)] = np.einsum('ij,ij->i', diff, diff)
+        return distances
+
+    def _search(self, query: np.ndarray, k: int, rescore: bool = True, filter: Optional[dict] = None,
+                fetch_k: int = 20) -> List[Tuple[int, float]]:
+        if not self.ids:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        approx = self._approximate_distances(query)
+
+        n_candidates = max(k * self.rescore_factor, fetch_k if filter else 0, k)
+        n_candidates = min(n_candidates, len(self.ids))
+        candidates = np.argpartition(approx, n_candidates - 1)[:n_candidates]
+
+        if rescore:
+            rows = np.sort(candidates)
+            diff = np.asarray(self._full[rows]) - query
+            exact = np.einsum('ij,ij->i', diff, diff)
+            scored = list(zip(rows.tolist(), exact.tolist()))
+        else:
+            scored = list(zip(candidates.tolist(), approx[candidates].tolist()))
+        scored.sort(key=lambda item: item[1])
+
+        if filter:
+            scored = [
+                (row, score) for row, score in scored
+                if all(self.get_document(self.ids[row]).metadata.get(key) == value for key, value in filter.items())
+            ]
+        return scored[:k]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[dict] = None, fetch_k: int = 20,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        results = self._search(np.asarray(embedding, dtype=np.float32), k, filter=filter, fetch_k=fetch_k)
+        return [(self.get_document(self.ids[row]), score) for row, score in results]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     fetch_k: int = 20, **kwargs: Any) -> List[Tuple[Document, float]]:
+        embedding = self.embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k, filter=filter, fetch_k=fetch_k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def get_by_ids(self, ids) -> List[Document]:
+        known = set(self.ids)
+        return [self.get_document(doc_id) for doc_id in ids if doc_id in known]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, **kwargs: Any) -> "QuantizedVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # ---- persistence ----
+
+    def save_local(self, folder_path: str):
+        """Save compressed vectors, docstore and the full-precision side file"""
+        os.makedirs(folder_path, exist_ok=True)
+        arrays = {'codes': self._codes if self._codes is not None else np.zeros((0, 0), dtype=np.float32)}
+        for name in ('_pca_mean', '_pca_components', '_scale', '_offset'):
+            value = getattr(self, name)
+            if value is not None:
+                arrays[name] = value
+        np.savez(os.path.join(folder_path, INDEX_FILE), **arrays)
+
+        with open(os.path.join(folder_path, DOCSTORE_FILE), 'wb') as f:
+            pickle.dump({
+                'storage_mode': self.storage_mode,
+                'pca_dim': self.pca_dim,
+                'target_pca_dim': self._target_pca_dim,
+                'fitted_rows': self._fitted_rows,
+                'rescore_factor': self.rescore_factor,
+                'dimension': self.dimension,
+                'ids': self.ids,
+                'documents': self.documents,
+                'docstore': self.docstore,
+            }, f)
+
+        target = os.path.join(folder_path, FULL_PRECISION_FILE)
+        if os.path.exists(self._side_file_path) and os.path.abspath(target) != os.path.abspath(self._side_file_path):
+            shutil.copyfile(self._side_file_path, target)
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings: Embeddings, **kwargs: Any) -> "QuantizedVectorStore":
+        with open(os.path.join(folder_path, DOCSTORE_FILE), 'rb') as f:
+            state = pickle.load(f)
+
+        store = cls(embeddings, storage_mode=state['storage_mode'], pca_dim=state['pca_dim'],
+                    rescore_factor=state['rescore_factor'], side_file_dir=kwargs.get('side_file_dir'))
+        # Снапшот только читается: новые векторы пишутся в свой каталог (см. _own_side_file)
+        store.base_dir = folder_path
+        store.dimension = state['dimension']
+        store._target_pca_dim = state.get('target_pca_dim', state['pca_dim'])
+        store._fitted_rows = state.get('fitted_rows', len(state['ids']))
+        store.ids = state['ids']
+        store.documents = state['documents']
+        store.docstore = state.get('docstore')
+
+        with np.load(os.path.join(folder_path, INDEX_FILE)) as arrays:
+            store._codes = arrays['codes'] if store.ids else None
+            for name in ('_pca_mean', '_pca_components', '_scale', '_offset'):
+                if name in arrays:
+                    setattr(store, name, arrays[name])
+
+        if store.ids:
+            store._full = np.memmap(store._side_file_path, dtype=np.float32, mode='r',
+                                    shape=(len(store.ids), store.dimension))
+        return store
+
+    # ---- reporting ----
+
+    def memory_report(self, query_vectors: np.ndarray, k: int = 10) -> dict:
+        """Compare resident memory and recall@k against exact float32 search"""
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        full = np.asarray(self._full)
+
+        recall_approx = []
+        recall_rescored = []
+        for query in query_vectors:
+            diff = full - query
+            exact = set(np.argsort(np.einsum('ij,ij->i', diff, diff))[:k].tolist())
+            approx = {row for row, _ in self._search(query, k, rescore=False)}
+            rescored = {row for row, _ in self._search(query, k, rescore=True)}
+            recall_approx.append(len(exact & approx) / len(exact))
+            recall_rescored.append(len(exact & rescored) / len(exact))
+
+        float32_bytes = len(self.ids) * self.dimension * 4
+        resident_bytes = self._codes.nbytes + sum(
+            value.nbytes for value in (self._pca_mean, self._pca_components, self._scale, self._offset)
+            if value is not None
+        )
+        return {
+            'storage_mode': self.storage_mode,
+            'pca_dim': self.pca_dim,
+            'vectors': len(self.ids),
+            'dimension': self.dimension,
+            'float32_bytes': float32_bytes,
+            'resident_bytes': resident_bytes,
+            'memory_saved': 1 - resident_bytes / float32_bytes if float32_bytes else 0.0,
+            'recall_at_k_compressed': float(np.mean(recall_approx)) if recall_approx else 1.0,
+            'recall_at_k_rescored': float(np.mean(recall_rescored)) if recall_rescored else 1.0,
+            'k': k,
+        }
\ No newline at end of file
@@ -0,0 +1,125 @@
+import atexit
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+from config.settings import settings
+
+from src.utils.singleflight import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache of query embeddings.
+
+    Keys are (embedding backend id, normalized query), so repeated questions and
+    evaluation loops skip the embedding API, and vectors of different backends never
+    mix. With ``path`` the cache is loaded on start and saved at exit.
+    """
+
+    def __init__(self, max_size: int = None, path: str = None):
+        self.max_size = settings.QUERY_CACHE_SIZE if max_size is None else max_size
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.path:
+            self.load()
+            atexit.register(self.save)
+
+    @staticmethod
+    def make_key(query: str, backend_id: str) -> tuple:
+        return backend_id, normalize_query(query)
+
+    def get(self, query: str, backend_id: str) -> Optional[np.ndarray]:
+        key = self.make_key(query, backend_id)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, query: str, backend_id: str, vector):
+        if self.max_size <= 0:
+            return
+        key = self.make_key(query, backend_id)
+        with self._lock:
+            self._entries[key] = np.asarray(vector, dtype=np.float32)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, query: str, backend_id: str, compute: Callable[[str], list]) -> np.ndarray:
+        """Cached embedding of the query; compute(query) runs outside the lock on a miss"""
+        vector = self.get(query, backend_id)
+        if vector is None:
+            vector = np.asarray(compute(query), dtype=np.float32)
+            self.put(query, backend_id, vector)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    # ---- persistence ----
+
+    def save(self, path: str = None):
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str = None):
+        path = path or self.path
+        if not path or not os.path.exists(path) or self.max_size <= 0:
+            return
+        try:
+            with open(path, 'rb') as f:
+                entries = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load query embedding cache from {path}: {e}")
+            return
+        with self._lock:
+            for key, vector in entries[-self.max_size:]:
+                self._entries[key] = vector
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> QueryEmbeddingCache:
+    """Process-wide cache shared by all vector store managers (keys include the backend id)"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = QueryEmbeddingCache(path=settings.QUERY_CACHE_PATH)
+        return _default_cache
\ No newline at end of file
@@ -0,0 +1,18 @@
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from langchain.schema import Document
+from typing import Any, List
+
+
+class SharedIndexRetriever(BaseRetriever):
+    """Retriever over a VectorStoreManager whose index keeps growing while queries run.
+
+    The store is resolved on every call, so the retriever can be created before
+    anything is indexed and is shared by all concurrent requests.
+    """
+
+    manager: Any
+    search_kwargs: dict = {}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.manager.similarity_search(query, **self.search_kwargs)
\ No newline at end of file
@@ -0,0 +1,60 @@
+# Поисковая часть ShardedVectorStore, выполняется в процессах-воркерах. Без импортов LangChain,
+# чтобы spawn-воркеры стартовали быстро; шарды отображаются в память, поэтому page cache
+# держит одну копию файла шарда на все процессы
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+
+# Путь файла шарда -> (число строк, векторы, квадраты норм)
+_open_shards: Dict[str, Tuple[int, np.ndarray, np.ndarray]] = {}
+
+
+def open_shard(path: str, count: int, dimension: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Memory-map the first ``count`` rows of a shard file (reopened when the shard grows)"""
+    cached = _open_shards.get(path)
+    if cached is None or cached[0] != count:
+        # Новое поколение шарда вытесняет старые: их файлы удалены, а отображение держало бы место на диске
+        prefix = _shard_prefix(path)
+        for stale in [other for other in _open_shards if other != path and _shard_prefix(other) == prefix]:
+            del _open_shards[stale]
+        vectors = np.memmap(path, dtype=np.float32, mode='r', shape=(count, dimension))
+        norms = np.einsum('ij,ij->i', vectors, vectors)
+        _open_shards[path] = cached = (count, vectors, norms)
+    return cached[1], cached[2]
+
+
+def _shard_prefix(path: str) -> str:
+    # ".../shard_00003.g7.f32" -> ".../shard_00003"
+    return path.rsplit('.g', 1)[0]
+
+
+def forget_shards(paths: Iterable[str]):
+    for path in paths:
+        _open_shards.pop(path, None)
+
+
+def search_shard(path: str, count: int, dimension: int, queries: np.ndarray, k: int,
+                 evict: Tuple[str, ...] = (), rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top-k of a batch of queries in one shard: (rows, squared L2 distances), both (len(queries), k').
+
+    ``rows`` restricts the search to those rows of the shard (e.g. the chunks of some
+    documents). ``evict`` lists shard files deleted since, whose mappings this process must drop.
+    """
+    forget_shards(evict)
+    if count == 0 or (rows is not None and len(rows) == 0):
+        empty = np.zeros((len(queries), 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    vectors, norms = open_shard(path, count, dimension)
+    if rows is not None:
+        # Только строки выбранных документов: копируются лишь они
+        vectors, norms = vectors[rows], norms[rows]
+    queries = np.asarray(queries, dtype=np.float32)
+    # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2: одно умножение матриц на весь батч запросов
+    distances = norms[None, :] - 2.0 * (queries @ vectors.T) + np.einsum('ij,ij->i', queries, queries)[:, None]
+    k = min(k, len(vectors))
+    top_rows = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(distances, top_rows, axis=1)
+    order = np.argsort(top, axis=1)
+    top_rows = np.take_along_axis(top_rows, order, axis=1)
+    if rows is not None:
+        top_rows = np.asarray(rows)[top_rows]
+    return top_rows, np.maximum(np.take_along_axis(top, order, axis=1), 0.0)
\ No newline at end of file
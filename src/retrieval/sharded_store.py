@@ -0,0 +1,455 @@
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain.schema import Document
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import multiprocessing
+import numpy as np
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import uuid
+import zlib
+
+from config.settings import settings
+
+from .shard_worker import forget_shards, search_shard
+
+logger = logging.getLogger(__name__)
+
+SHARD_MANIFEST = "shards.json"
+SHARD_DOCSTORE_FILE = "shard_docstore.pkl"
+SHARD_BY = ("source", "hash")
+
+# Пулы процессов общие для всех шардированных индексов (разделы индекса не плодят свои воркеры)
+_worker_pools: Dict[int, ProcessPoolExecutor] = {}
+_worker_pools_lock = threading.Lock()
+
+
+def get_worker_pool(workers: int) -> ProcessPoolExecutor:
+    with _worker_pools_lock:
+        pool = _worker_pools.get(workers)
+        if pool is None:
+            # spawn, а не fork: родительский процесс многопоточный (сервер, загрузчики)
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _worker_pools[workers] = pool
+        return pool
+
+
+def shutdown_worker_pools():
+    with _worker_pools_lock:
+        for pool in _worker_pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _worker_pools.clear()
+
+
+class ShardedVectorStore(VectorStore):
+    """Exact flat vector store split into N shards searched in parallel worker processes.
+
+    Each shard is an append-only float32 file on disk. Workers memory-map the files,
+    so all of them share the page cache instead of each holding its own copy. A query
+    batch fans out to all shards at once, every shard returns its own top-k, and the
+    results are merged by distance. Distances are squared L2, like the default FAISS index.
+
+    Vectors are routed by ``shard_by``: ``source`` keeps all chunks of a document in one
+    shard, so rebuilding a document touches a single shard; ``hash`` spreads chunks
+    evenly by id. ``rebuild_shard`` rewrites one shard into a new file and swaps it in;
+    searches that started before the swap pin the old generation, and its file and
+    documents are deleted only when the last of them finishes.
+
+    With ``workers=0`` shards are searched by threads in this process. Documents stay in
+    this process: in memory, or in an external docstore (e.g. CorpusDocstore). Without
+    ``shard_dir`` the files live in a temporary directory removed by ``close``. A store
+    loaded with ``load_local`` only reads the snapshot folder: a shard is copied to its
+    own directory before the first write.
+    """
+
+    def __init__(self, embedding: Optional[Embeddings], num_shards: int = None, shard_by: str = None,
+                 workers: int = None, shard_dir: Optional[str] = None, docstore=None):
+        self.embedding = embedding
+        self.num_shards = num_shards or settings.VECTOR_SHARDS
+        self.shard_by = shard_by or settings.VECTOR_SHARD_BY
+        if self.shard_by not in SHARD_BY:
+            raise ValueError(f"Unknown shard_by: {self.shard_by}. Available: {', '.join(SHARD_BY)}")
+        self.workers = settings.VECTOR_SHARD_WORKERS if workers is None else workers
+        # Свой временный каталог удаляется в close() (или сборщиком мусора)
+        self._temp_dir = None if shard_dir else tempfile.TemporaryDirectory(prefix="sharded_store_")
+        self.shard_dir = shard_dir or self._temp_dir.name
+        os.makedirs(self.shard_dir, exist_ok=True)
+        # Каталог снапшота из load_local: только читается, шард копируется в shard_dir при первой записи
+        self.base_dir: Optional[str] = None
+        self._owned = set()
+
+        self.dimension = None
+        self.shard_ids: List[List[str]] = [[] for _ in range(self.num_shards)]
+        # Поколение шарда: при пересборке пишется новый файл, старый читают текущие запросы
+        self.generations = [0] * self.num_shards
+        self.documents: Dict[str, Document] = {}
+        self.docstore = docstore
+        self._lock = threading.RLock()
+        self._executor: Optional[Executor] = None
+        # Замененные поколения: путь -> (шард, id); удаляются, когда их дочитают все начатые запросы
+        self._readers: Dict[str, int] = {}
+        self._retired: Dict[str, Tuple[int, List[str]]] = {}
+        # Недавно удаленные файлы: воркеры сбрасывают их отображения при следующем запросе
+        self._deleted = deque(maxlen=64)
+        # Шард -> (список id, сколько строк разобрано, источник -> строки) для поиска внутри документов
+        self._source_rows: Dict[int, Tuple[List[str], int, Dict[str, List[int]]]] = {}
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    @property
+    def ids(self) -> List[str]:
+        return [doc_id for ids in self.shard_ids for doc_id in ids]
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self.shard_ids)
+
+    # ---- layout ----
+
+    def shard_of(self, doc_id: str, metadata: dict) -> int:
+        key = metadata.get('source') if self.shard_by == "source" else None
+        return zlib.crc32(str(key or doc_id).encode('utf-8')) % self.num_shards
+
+    def _shard_path(self, shard: int, generation: int = None) -> str:
+        """File to read a shard generation from (the snapshot folder until the shard is written to)"""
+        generation = self.generations[shard] if generation is None else generation
+        folder = self.base_dir if self.base_dir is not None and shard not in self._owned else self.shard_dir
+        return os.path.join(folder, f"shard_{shard:05d}.g{generation}.f32")
+
+    def _own_shard(self, shard: int):
+        """Copy a shard of the loaded snapshot into shard_dir before it is written to"""
+        if self.base_dir is None or shard in self._owned:
+            return
+        source = self._shard_path(shard)
+        self._owned.add(shard)
+        if os.path.exists(source):
+            shutil.copyfile(source, self._shard_path(shard))
+
+    def _get_executor(self) -> Executor:
+        if self.workers > 0:
+            return get_worker_pool(self.workers)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.num_shards, thread_name_prefix="shard")
+            return self._executor
+
+    def close(self):
+        """Stop this store's search threads and remove its temporary shard files
+        (the shared worker processes stay up, see shutdown_worker_pools)"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            if self._temp_dir is not None:
+                forget_shards(os.path.join(self.shard_dir, name) for name in os.listdir(self.shard_dir))
+                self._temp_dir.cleanup()
+                self._temp_dir = None
+
+    # ---- writing ----
+
+    def _store_documents(self, documents: Dict[str, Document]):
+        if self.docstore is not None:
+            self.docstore.add(documents)
+        else:
+            self.documents.update(documents)
+
+    def get_document(self, doc_id: str) -> Document:
+        if self.docstore is not None:
+            return self.docstore.search(doc_id)
+        return self.documents[doc_id]
+
+    def add_embeddings(self, text_embeddings: Iterable[Tuple[str, List[float]]],
+                       metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        """Append precomputed (text, vector) pairs to their shards"""
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        texts = [text for text, _ in text_embeddings]
+        vectors = np.asarray([vector for _, vector in text_embeddings], dtype=np.float32)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dimension}")
+
+            self._store_documents({
+                doc_id: Document(page_content=text, metadata=metadata, id=doc_id)
+                for doc_id, text, metadata in zip(ids, texts, metadatas)
+            })
+            shards = np.array([self.shard_of(doc_id, metadata) for doc_id, metadata in zip(ids, metadatas)])
+            for shard in np.unique(shards):
+                rows = np.flatnonzero(shards == shard)
+                self._own_shard(shard)
+                with open(self._shard_path(shard), 'ab') as f:
+                    f.write(np.ascontiguousarray(vectors[rows]).tobytes())
+                # Число строк публикуется после записи: поиск не увидит недописанный хвост
+                self.shard_ids[shard].extend(ids[row] for row in rows)
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+
+    def rebuild_shard(self, shard: int, text_embeddings: Iterable[Tuple[str, List[float]]],
+                      metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None):
+        """Replace the whole content of one shard; the other shards are not touched.
+
+        The new vectors go to a new file, and the shard switches to it in one step.
+        Searches running meanwhile finish on the old file, which is deleted with the
+        replaced documents once the last of them is done.
+        """
+        text_embeddings = list(text_embeddings)
+        metadatas = metadatas or [{} for _ in text_embeddings]
+        ids = ids or [str(uuid.uuid4()) for _ in text_embeddings]
+        vectors = np.asarray([vector for _, vector in text_embeddings], dtype=np.float32)
+
+        with self._lock:
+            old_path, old_ids = self._shard_path(shard), self.shard_ids[shard]
+            generation = self.generations[shard] + 1
+            self._owned.add(shard)
+            with open(self._shard_path(shard, generation), 'wb') as f:
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            self._store_documents({
+                doc_id: Document(page_content=text, metadata=metadata, id=doc_id)
+                for doc_id, (text, _), metadata in zip(ids, text_embeddings, metadatas)
+            })
+            self.generations[shard] = generation
+            self.shard_ids[shard] = list(ids)
+            self._retired[old_path] = (shard, old_ids)
+            deleted = self._collect_retired()
+        self._delete_files(deleted)
+
+    def _collect_retired(self) -> List[str]:
+        """Drop documents of replaced generations nobody reads anymore, return their files to delete"""
+        deleted = []
+        for path, (shard, old_ids) in list(self._retired.items()):
+            if self._readers.get(path):
+                continue
+            del self._retired[path]
+            live = set(self.shard_ids[shard])
+            stale = [doc_id for doc_id in old_ids if doc_id not in live]
+            if self.docstore is not None:
+                self.docstore.delete(stale)
+            else:
+                for doc_id in stale:
+                    self.documents.pop(doc_id, None)
+            # Файлы снапшота не трогаем: их может читать другой процесс
+            if os.path.abspath(os.path.dirname(path)) == os.path.abspath(self.shard_dir):
+                deleted.append(path)
+        return deleted
+
+    def _delete_files(self, paths: List[str]):
+        if not paths:
+            return
+        forget_shards(paths)
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        with self._lock:
+            self._deleted.extend(paths)
+
+    def vectors(self, shard: int) -> np.ndarray:
+        """Memory-mapped vectors of one shard"""
+        with self._lock:
+            count = len(self.shard_ids[shard])
+            if count == 0:
+                return np.zeros((0, self.dimension or 0), dtype=np.float32)
+            return np.memmap(self._shard_path(shard), dtype=np.float32, mode='r', shape=(count, self.dimension))
+
+    def merge_from(self, other: "ShardedVectorStore"):
+        """Append all vectors and documents of another store (re-routed to this store's shards)"""
+        for shard, ids in enumerate(other.shard_ids):
+            if not ids:
+                continue
+            documents = [other.get_document(doc_id) for doc_id in ids]
+            vectors = np.asarray(other.vectors(shard))
+            self.add_embeddings([(doc.page_content, vector) for doc, vector in zip(documents, vectors)],
+                                metadatas=[doc.metadata for doc in documents], ids=list(ids))
+
+    # ---- search ----
+
+    @contextmanager
+    def _pinned(self):
+        """Snapshot of the current shard generations, kept on disk (with their documents) until the block exits"""
+        with self._lock:
+            snapshot = [(shard, self._shard_path(shard), list(ids))
+                        for shard, ids in enumerate(self.shard_ids) if ids]
+            for _, path, _ in snapshot:
+                self._readers[path] = self._readers.get(path, 0) + 1
+            pinned = (snapshot, self.dimension, tuple(self._deleted))
+        try:
+            yield pinned
+        finally:
+            with self._lock:
+                for _, path, _ in snapshot:
+                    self._readers[path] -= 1
+                    if not self._readers[path]:
+                        del self._readers[path]
+                deleted = self._collect_retired()
+            self._delete_files(deleted)
+
+    def search_batch(self, queries: np.ndarray, k: int = 4) -> List[List[Tuple[str, float]]]:
+        """Scatter a batch of queries to all shards in parallel and gather the merged top-k ids"""
+        with self._pinned() as pinned:
+            return self._scatter(pinned, queries, k)
+
+    def _scatter(self, pinned, queries: np.ndarray, k: int,
+                 rows: Dict[int, np.ndarray] = None) -> List[List[Tuple[str, float]]]:
+        """Merged top-k over the pinned shards; ``rows`` limits the search to those rows of each shard"""
+        snapshot, dimension, evict = pinned
+        if rows is not None:
+            snapshot = [entry for entry in snapshot if len(rows.get(entry[0], ()))]
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if not snapshot:
+            return [[] for _ in queries]
+
+        executor = self._get_executor()
+        futures = [executor.submit(search_shard, path, len(ids), dimension, queries, k, evict,
+                                   None if rows is None else rows[shard])
+                   for shard, path, ids in snapshot]
+
+        merged_ids, merged_distances = [], []
+        for (_, _, ids), future in zip(snapshot, futures):
+            rows, distances = future.result()
+            merged_ids.append(np.asarray(ids, dtype=object)[rows])
+            merged_distances.append(distances)
+        all_ids = np.concatenate(merged_ids, axis=1)
+        all_distances = np.concatenate(merged_distances, axis=1)
+
+        order = np.argsort(all_distances, axis=1, kind='stable')[:, :k]
+        return [
+            list(zip(all_ids[q, order[q]].tolist(), all_distances[q, order[q]].tolist()))
+            for q in range(len(queries))
+        ]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[dict] = None, fetch_k: int = 20,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        with self._pinned() as pinned:
+            hits = self._scatter(pinned, np.asarray(embedding, dtype=np.float32)[None, :],
+                                 max(k, fetch_k) if filter else k)[0]
+            results = [(self.get_document(doc_id), distance) for doc_id, distance in hits]
+        if filter:
+            results = [(doc, distance) for doc, distance in results
+                       if all(doc.metadata.get(key) == value for key, value in filter.items())]
+        return results[:k]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def _rows_by_source(self, shard: int) -> Dict[str, List[int]]:
+        """Rows of every source in one shard; only rows added since the last call are looked up (under the lock)"""
+        ids = self.shard_ids[shard]
+        cached_ids, mapped, by_source = self._source_rows.get(shard, (None, 0, None))
+        if cached_ids is not ids:  # Шард пересобран: новый список id
+            mapped, by_source = 0, {}
+        for row in range(mapped, len(ids)):
+            doc = self.get_document(ids[row])
+            source = doc.metadata.get('source', '') if isinstance(doc, Document) else ''
+            by_source.setdefault(source, []).append(row)
+        self._source_rows[shard] = (ids, len(ids), by_source)
+        return by_source
+
+    def similarity_search_within_sources(self, embedding: List[float], sources: Iterable[str], k: int = 4,
+                                         filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        """(document, distance) pairs among the chunks of the given sources only.
+
+        Every shard searches just the rows of those sources. With a metadata filter the
+        shards are asked for twice as many candidates until k pass it or the rows run out.
+        """
+        sources = set(sources)
+        with self._pinned() as pinned:
+            with self._lock:
+                # Строки, дописанные после снимка, в нем не видны
+                rows = {}
+                for shard, _, ids in pinned[0]:
+                    by_source = self._rows_by_source(shard)
+                    selected = [row for source in sources for row in by_source.get(source, ()) if row < len(ids)]
+                    if selected:
+                        rows[shard] = np.asarray(selected, dtype=np.int64)
+            total = sum(len(selected) for selected in rows.values())
+            fetch = k
+            while True:
+                hits = self._scatter(pinned, np.asarray(embedding, dtype=np.float32)[None, :],
+                                     min(fetch, total), rows)[0] if total else []
+                results = [(self.get_document(doc_id), distance) for doc_id, distance in hits]
+                if filter:
+                    results = [(doc, distance) for doc, distance in results
+                               if all(doc.metadata.get(key) == value for key, value in filter.items())]
+                if len(results) >= k or fetch >= total:
+                    return results[:k]
+                fetch *= 2
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def get_by_ids(self, ids) -> List[Document]:
+        known = set(self.ids)
+        return [self.get_document(doc_id) for doc_id in ids if doc_id in known]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, **kwargs: Any) -> "ShardedVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # ---- persistence ----
+
+    def save_local(self, folder_path: str):
+        """Save shard files, the shard manifest and the docstore"""
+        os.makedirs(folder_path, exist_ok=True)
+        with self._lock:
+            for shard in range(self.num_shards):
+                source = self._shard_path(shard)
+                target = os.path.join(folder_path, os.path.basename(source))
+                if os.path.abspath(source) != os.path.abspath(target) and os.path.exists(source):
+                    shutil.copyfile(source, target)
+            with open(os.path.join(folder_path, SHARD_MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'num_shards': self.num_shards,
+                    'shard_by': self.shard_by,
+                    'dimension': self.dimension,
+                    'generations': self.generations,
+                    'counts': [len(ids) for ids in self.shard_ids],
+                }, f)
+            with open(os.path.join(folder_path, SHARD_DOCSTORE_FILE), 'wb') as f:
+                pickle.dump({'shard_ids': self.shard_ids, 'documents': self.documents, 'docstore': self.docstore}, f)
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings: Embeddings, workers: int = None,
+                   **kwargs: Any) -> "ShardedVectorStore":
+        with open(os.path.join(folder_path, SHARD_MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        with open(os.path.join(folder_path, SHARD_DOCSTORE_FILE), 'rb') as f:
+            state = pickle.load(f)
+
+        store = cls(embeddings, num_shards=manifest['num_shards'], shard_by=manifest['shard_by'], workers=workers)
+        # Снапшот только читается: новые векторы пишутся в свой каталог (см. _own_shard)
+        store.base_dir = folder_path
+        store.dimension = manifest['dimension']
+        store.generations = manifest['generations']
+        store.shard_ids = state['shard_ids']
+        store.documents = state['documents']
+        store.docstore = state.get('docstore')
+        return store
\ No newline at end of file
@@ -1,75 +1,310 @@
 from langchain.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
 from langchain.schema import Document
-from typing import List, Optional
+from contextlib import nullcontext
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import json
 import logging
+import os
+import threading
 from config.settings import settings
-from tqdm import tqdm
+
+from .quantized_store import QuantizedVectorStore, STORAGE_MODES
+from .sharded_store import ShardedVectorStore
+from .query_cache import QueryEmbeddingCache, get_default_cache
+from .retriever import SharedIndexRetriever
 
 # logger = logging.getLogger(__name__)
 
+BACKEND_MANIFEST = "embedding_backend.json"
+# Режимы хранения индекса: варианты QuantizedVectorStore и шардированный float32
+MANAGER_STORAGE_MODES = STORAGE_MODES + ("sharded",)
+
+def get_backend_id(embeddings) -> str:
+    """Identifier of the embedding backend that produced an index's vectors"""
+    return getattr(embeddings, 'backend_id', None) or type(embeddings).__name__
+
+def l2_relevance(distance: float) -> float:
+    """Squared L2 distance -> relevance in [0, 1] (cosine similarity for unit-norm embeddings)"""
+    return float(min(1.0, max(0.0, 1.0 - distance / 2.0)))
+
 class VectorStoreManager:
     """Manages FAISS vector store operations with optimized batch processing"""
     
-    def __init__(self, embeddings):
+    def __init__(self, embeddings, storage_mode: str = None, pca_dim: Optional[int] = None, docstore=None,
+                 query_cache: QueryEmbeddingCache = None):
         self.embeddings = embeddings
+        self.backend_id = get_backend_id(embeddings)
+        self.storage_mode = storage_mode or settings.VECTOR_STORAGE_MODE
+        if self.storage_mode not in MANAGER_STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {self.storage_mode}. "
+                             f"Available: {', '.join(MANAGER_STORAGE_MODES)}")
+        self.pca_dim = pca_dim if pca_dim is not None else settings.VECTOR_PCA_DIM
+        # Docstore для новых индексов; None - документы хранятся в памяти (InMemoryDocstore)
+        self.docstore = docstore
+        self.query_cache = query_cache or get_default_cache()
         self.vector_store = None
+        # Защищает индекс, когда он пополняется во время обработки запросов
+        self.lock = threading.RLock()
+        # Источник -> строки индекса; дополняется по мере роста индекса (для поиска внутри документов)
+        self._source_rows: Dict[str, List[int]] = {}
+        self._rows_mapped = 0
+        self._rows_store = None
     
-    def create_vector_store(self, documents: List[Document], batch_size: int = 5):  # Reduced batch size
-        """Create FAISS vector store from documents with batching"""
-        try:
-            if len(documents) > batch_size:
-                # Process in smaller batches to avoid rate limits
-                # logger.info(f"Creating vector store with {len(documents)} documents in batches of {batch_size}")
-                
-                # Initialize with first batch
-                first_batch = documents[:batch_size]
-                self.vector_store = FAISS.from_documents(first_batch, self.embeddings)
-                # logger.info(f"Initialized vector store with first {len(first_batch)} documents")
-                
-                # Add remaining documents in batches
-                for i in tqdm(range(batch_size, len(documents), batch_size)):
-                    batch = documents[i:i + batch_size]
-                    batch_num = (i // batch_size) + 1
-                    total_batches = (len(documents) - 1) // batch_size + 1
-                    # logger.info(f"Adding batch {batch_num}/{total_batches} ({len(batch)} documents)")
-                    
-                    self.vector_store.add_documents(batch)
-                    
-                    # More aggressive rate limiting between batches
-                    if i + batch_size < len(documents):
-                        import time
-                        time.sleep(2)  # Increased to 2 seconds between batches
+    def check_backend(self, backend_id: str):
+        """Refuse to mix vectors produced by different embedding backends"""
+        if backend_id != self.backend_id:
+            raise ValueError(
+                f"Embedding backend mismatch: index was built with '{backend_id}', "
+                f"current backend is '{self.backend_id}'"
+            )
+    
+    def create_vector_store(self, documents: List[Document], batch_size: int = None):
+        """Create the vector store from documents.
+        
+        All chunks are embedded in one call: the embedding backend sizes the request
+        batches and paces them against the quota, and the vectors are added in bulk.
+        ``batch_size`` is kept for backward compatibility and ignored.
+        """
+        with self.lock:
+            self.vector_store = None
+        self.add_documents(documents)
+        return self.vector_store
+    
+    def add_documents(self, documents: List[Document]) -> List[str]:
+        """Embed documents outside the lock and add the vectors to the shared index in bulk"""
+        if not documents:
+            return []
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        vectors = self.embeddings.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas)
+    
+    def add_embeddings(self, texts: List[str], vectors, metadatas: List[dict]) -> List[str]:
+        """Add precomputed vectors to the index, creating it on first use"""
+        with self.lock:
+            if self.vector_store is None:
+                if self.storage_mode == "float32":
+                    if self.docstore is None:
+                        self.vector_store = FAISS.from_embeddings(list(zip(texts, vectors)), self.embeddings, metadatas=metadatas)
+                        return list(self.vector_store.index_to_docstore_id.values())
+                    faiss = dependable_faiss_import()
+                    index = faiss.IndexFlatL2(len(vectors[0]))
+                    self.vector_store = FAISS(self.embeddings, index, self.docstore, {})
+                elif self.storage_mode == "sharded":
+                    self.vector_store = ShardedVectorStore(self.embeddings, docstore=self.docstore)
+                else:
+                    self.vector_store = QuantizedVectorStore(
+                        self.embeddings,
+                        storage_mode=self.storage_mode,
+                        pca_dim=self.pca_dim,
+                        rescore_factor=settings.VECTOR_RESCORE_FACTOR,
+                        docstore=self.docstore
+                    )
+            return self.vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+    
+    def _search_lock(self):
+        """Lock for a search: the sharded store snapshots its shards itself, so concurrent searches fan out in parallel"""
+        if isinstance(self.vector_store, ShardedVectorStore):
+            return nullcontext()
+        return self.lock
+
+    def embed_query(self, query: str):
+        """Query embedding through the LRU cache (a network call on a miss, so never under the lock)"""
+        return self.query_cache.get_or_compute(query, self.backend_id, self.embeddings.embed_query).tolist()
+    
+    def similarity_search_with_score_by_vector(self, embedding, k: int = None, **kwargs) -> List[tuple]:
+        """Thread-safe search by a precomputed query vector, returning (document, L2 distance) pairs"""
+        k = k or settings.SEARCH_KWARGS.get("k", 4)
+        if self.vector_store is None:
+            return []
+        with self._search_lock():
+            return self.vector_store.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+    
+    def similarity_search(self, query: str, k: int = None, **kwargs) -> List[Document]:
+        """Thread-safe search over the shared index (empty result if nothing is indexed yet)"""
+        k = k or settings.SEARCH_KWARGS.get("k", 4)
+        if self.vector_store is None:
+            return []
+        # Эмбеддинг запроса - сетевой вызов, поэтому он выполняется вне блокировки
+        embedding = self.embed_query(query)
+        with self._search_lock():
+            return self.vector_store.similarity_search_by_vector(embedding, k=k, **kwargs)
+    
+    def similarity_search_with_relevance_scores(self, query: str, k: int = None, **kwargs) -> List[tuple]:
+        """Thread-safe search returning (document, relevance in [0, 1]) pairs"""
+        k = k or settings.SEARCH_KWARGS.get("k", 4)
+        if self.vector_store is None:
+            return []
+        embedding = self.embed_query(query)
+        with self._search_lock():
+            docs_and_scores = self.vector_store.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+        return [(doc, l2_relevance(score)) for doc, score in docs_and_scores]
+    
+    def _row_ids(self, start: int, end: int) -> List[str]:
+        if isinstance(self.vector_store, QuantizedVectorStore):
+            return self.vector_store.ids[start:end]
+        return [self.vector_store.index_to_docstore_id[row] for row in range(start, end)]
+
+    def _get_document(self, doc_id: str) -> Document:
+        if isinstance(self.vector_store, QuantizedVectorStore):
+            return self.vector_store.get_document(doc_id)
+        return self.vector_store.docstore.search(doc_id)
+
+    def _row_vectors(self, rows: np.ndarray) -> np.ndarray:
+        if isinstance(self.vector_store, QuantizedVectorStore):
+            return np.asarray(self.vector_store._full[rows])
+        return self.vector_store.index.reconstruct_batch(rows)
+
+    def rows_by_source(self) -> Dict[str, List[int]]:
+        """Index rows of every source; only rows added since the last call are looked up"""
+        with self.lock:
+            if self._rows_store is not self.vector_store:
+                self._source_rows, self._rows_mapped, self._rows_store = {}, 0, self.vector_store
+            total = self.size
+            if total > self._rows_mapped:
+                for row, doc_id in enumerate(self._row_ids(self._rows_mapped, total), start=self._rows_mapped):
+                    doc = self._get_document(doc_id)
+                    source = doc.metadata.get('source', '') if isinstance(doc, Document) else ''
+                    self._source_rows.setdefault(source, []).append(row)
+                self._rows_mapped = total
+            return self._source_rows
+
+    def similarity_search_within_sources(self, embedding, sources: Iterable[str], k: int = None,
+                                         filter: Optional[dict] = None, **kwargs) -> List[tuple]:
+        """(document, L2 distance) pairs among the chunks of the given sources only.
+
+        Computes distances to just those rows, so the cost follows the size of the
+        selected documents, not of the index (the sharded store restricts every shard
+        to the rows of those sources itself).
+        """
+        k = k or settings.SEARCH_KWARGS.get("k", 4)
+        sources = set(sources)
+        if self.vector_store is None or not sources:
+            return []
+        if isinstance(self.vector_store, ShardedVectorStore):
+            return self.vector_store.similarity_search_within_sources(embedding, sources, k=k, filter=filter)
+
+        with self.lock:
+            by_source = self.rows_by_source()
+            rows = [row for source in sources for row in by_source.get(source, ())]
+            if not rows:
+                return []
+            rows = np.asarray(rows, dtype=np.int64)
+            vectors = self._row_vectors(rows)
+            query = np.asarray(embedding, dtype=np.float32)
+            distances = np.einsum('ij,ij->i', vectors - query, vectors - query)
+            # Кандидаты по возрастанию расстояния; с фильтром документы проверяются по очереди
+            order = np.argsort(distances, kind='stable')
+            results = []
+            for position in order:
+                row = int(rows[position])
+                doc = self._get_document(self._row_ids(row, row + 1)[0])
+                if filter and not all(doc.metadata.get(key) == value for key, value in filter.items()):
+                    continue
+                results.append((doc, float(distances[position])))
+                if len(results) == k:
+                    break
+        return results
+
+    def indexed_sources(self) -> set:
+        """Sources (URLs / file paths) of all indexed chunks"""
+        if self.vector_store is None:
+            return set()
+        docstore = getattr(self.vector_store, 'docstore', None)
+        if hasattr(docstore, 'sources'):
+            return docstore.sources()
+        if isinstance(self.vector_store, (QuantizedVectorStore, ShardedVectorStore)):
+            documents = self.vector_store.documents.values()
+        else:
+            documents = self.vector_store.docstore._dict.values()
+        return {doc.metadata.get('source') for doc in documents}
+    
+    def chunk_vectors(self) -> List[tuple]:
+        """(document, full-precision vector) of every indexed chunk, in index order"""
+        with self.lock:
+            if self.vector_store is None:
+                return []
+            if isinstance(self.vector_store, QuantizedVectorStore):
+                vectors = np.asarray(self.vector_store._full)
+                documents = [self.vector_store.get_document(doc_id) for doc_id in self.vector_store.ids]
+            elif isinstance(self.vector_store, ShardedVectorStore):
+                store = self.vector_store
+                vectors = [vector for shard in range(store.num_shards) for vector in np.asarray(store.vectors(shard))]
+                documents = [store.get_document(doc_id) for doc_id in store.ids]
             else:
-                self.vector_store = FAISS.from_documents(documents, self.embeddings)
-            
-            # logger.info(f"Created vector store with {len(documents)} documents")
-            return self.vector_store
-        except Exception as e:
-            # logger.error(f"Error creating vector store: {e}")
-            raise
+                index_to_id = self.vector_store.index_to_docstore_id
+                vectors = self.vector_store.index.reconstruct_n(0, self.vector_store.index.ntotal)
+                documents = [self.vector_store.docstore.search(index_to_id[i]) for i in range(len(vectors))]
+        return [(doc, vector) for doc, vector in zip(documents, vectors) if isinstance(doc, Document)]
+
+    def vectors_by_text(self) -> dict:
+        """Full-precision vector of every indexed chunk, keyed by the chunk text.
+
+        Used to re-embed only the chunks of a revised document whose text changed.
+        """
+        return {doc.page_content: vector for doc, vector in self.chunk_vectors()}
+    
+    @property
+    def size(self) -> int:
+        """Number of vectors in the index"""
+        if self.vector_store is None:
+            return 0
+        if isinstance(self.vector_store, QuantizedVectorStore):
+            return len(self.vector_store.ids)
+        if isinstance(self.vector_store, ShardedVectorStore):
+            return len(self.vector_store)
+        return self.vector_store.index.ntotal
     
     def save_vector_store(self, path: str):
         """Save vector store to disk"""
         if self.vector_store:
             self.vector_store.save_local(path)
+            with open(os.path.join(path, BACKEND_MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump({'backend_id': self.backend_id, 'storage_mode': self.storage_mode}, f)
             # logger.info(f"Vector store saved to {path}")
     
     def load_vector_store(self, path: str):
         """Load vector store from disk"""
         try:
-            self.vector_store = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+            manifest_path = os.path.join(path, BACKEND_MANIFEST)
+            if os.path.exists(manifest_path):
+                with open(manifest_path, encoding='utf-8') as f:
+                    manifest = json.load(f)
+                self.check_backend(manifest['backend_id'])
+                self.storage_mode = manifest.get('storage_mode', 'float32')
+            if self.storage_mode == "float32":
+                self.vector_store = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+            elif self.storage_mode == "sharded":
+                self.vector_store = ShardedVectorStore.load_local(path, self.embeddings)
+            else:
+                self.vector_store = QuantizedVectorStore.load_local(path, self.embeddings)
             # logger.info(f"Vector store loaded from {path}")
             return self.vector_store
         except Exception as e:
             # logger.error(f"Error loading vector store: {e}")
             raise
     
+    def merge_from(self, other: "VectorStoreManager"):
+        """Merge another index built with the same embedding backend"""
+        self.check_backend(other.backend_id)
+        if other.storage_mode != self.storage_mode:
+            raise ValueError(f"Cannot merge '{other.storage_mode}' index into '{self.storage_mode}' index")
+        if self.vector_store is None:
+            self.vector_store = other.vector_store
+        elif other.vector_store is not None:
+            self.vector_store.merge_from(other.vector_store)
+        return self.vector_store
+    
     def get_retriever(self, search_type: str = "similarity", **kwargs):
-        """Get retriever from vector store"""
+        """Get retriever from vector store (similarity search goes through the query embedding cache)"""
         if not self.vector_store:
             raise ValueError("Vector store not initialized")
         
         search_kwargs = {**settings.SEARCH_KWARGS, **kwargs}
+        if search_type == "similarity":
+            return SharedIndexRetriever(manager=self, search_kwargs=search_kwargs)
         return self.vector_store.as_retriever(
             search_type=search_type,
             search_kwargs=search_kwargs
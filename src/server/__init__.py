@@ -0,0 +1,3 @@
+from .app import QueryServer
+
+__all__ = ["QueryServer"]
\ No newline at end of file
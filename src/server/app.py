@@ -0,0 +1,328 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from config.settings import settings, SearchMode
+from src.utils.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 64 * 1024
+HEADER_TIMEOUT = 10.0
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ServerMetrics:
+    """Request counters and latency percentiles over a sliding window"""
+
+    def __init__(self, window: int = 1000):
+        self.started_at = time.time()
+        self.requests = {}
+        self.latencies = deque(maxlen=window)
+        self.stage_latencies = {}
+        self.window = window
+
+    def count(self, status: int):
+        self.requests[status] = self.requests.get(status, 0) + 1
+
+    def observe(self, latency: float, timings: dict = None):
+        self.latencies.append(latency)
+        for stage, value in (timings or {}).items():
+            self.stage_latencies.setdefault(stage, deque(maxlen=self.window)).append(value)
+
+    def snapshot(self) -> dict:
+        def summary(values):
+            return {
+                'count': len(values),
+                'p50': _percentile(values, 0.50),
+                'p95': _percentile(values, 0.95),
+                'p99': _percentile(values, 0.99),
+            }
+
+        return {
+            'uptime_seconds': time.time() - self.started_at,
+            'requests': {str(status): count for status, count in sorted(self.requests.items())},
+            'latency_seconds': summary(self.latencies),
+            'stage_latency_seconds': {stage: summary(values) for stage, values in self.stage_latencies.items()},
+        }
+
+
+class QueryServer:
+    """Asyncio HTTP server answering questions concurrently over a shared RAGPipeline.
+
+    Endpoints:
+        POST /query   {"question": "...", "system_prompt": optional, "deadline": optional seconds,
+                       "search_mode": optional "consultant_only" | "pptx_only" | "both"}
+        GET  /health  liveness and index size
+        GET  /metrics request counters, latency percentiles, queue state
+
+    Blocking stages run in bounded thread pools (load / embed / generate). At most
+    ``max_concurrency`` questions are processed at once and ``max_queue`` more may wait;
+    beyond that the server answers 503. Every question has a deadline (504 when exceeded).
+    """
+
+    def __init__(self, pipeline, max_concurrency: int = None, max_queue: int = None,
+                 request_deadline: float = None, load_workers: int = None, embed_workers: int = None,
+                 generate_workers: int = None):
+        self.pipeline = pipeline
+        self.max_concurrency = max_concurrency or settings.SERVER_MAX_CONCURRENCY
+        self.max_queue = max_queue if max_queue is not None else settings.SERVER_MAX_QUEUE
+        self.request_deadline = request_deadline or settings.SERVER_REQUEST_DEADLINE
+
+        self._load_pool = ThreadPoolExecutor(load_workers or settings.SERVER_LOAD_WORKERS, thread_name_prefix="load")
+        self._embed_pool = ThreadPoolExecutor(embed_workers or settings.SERVER_EMBED_WORKERS, thread_name_prefix="embed")
+        self._generate_pool = ThreadPoolExecutor(generate_workers or self.max_concurrency, thread_name_prefix="generate")
+
+        self.metrics = ServerMetrics()
+        self._slots = None
+        self._active = 0
+        self._waiting = 0
+        self._server = None
+
+    # ---- lifecycle ----
+
+    async def start(self, host: str = None, port: int = None):
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            host or settings.SERVER_HOST,
+            port if port is not None else settings.SERVER_PORT
+        )
+        sockets = ", ".join(str(sock.getsockname()) for sock in self._server.sockets)
+        logger.info(f"Query server listening on {sockets}")
+        return self._server
+
+    @property
+    def port(self) -> Optional[int]:
+        if not self._server or not self._server.sockets:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host: str = None, port: int = None):
+        await self.start(host, port)
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            self.shutdown()
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        self.shutdown()
+
+    def shutdown(self):
+        for pool in (self._load_pool, self._embed_pool, self._generate_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---- question handling ----
+
+    def _release(self):
+        self._active -= 1
+        self._slots.release()
+
+    async def _process(self, question: str, system_prompt: Optional[str], search_mode: Optional[SearchMode],
+                       retrieval_deadline: Deadline) -> dict:
+        """The stages of RAGPipeline.answer, each in its own pool.
+
+        A stage already running in a pool cannot be interrupted: when the deadline cancels
+        the request, its slot is released only once that stage finishes, so the server
+        never admits more work than it has threads for.
+        """
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        running = None
+
+        def run(pool, func, *args):
+            nonlocal running
+            running = pool.submit(func, *args)
+            # Отмена прерывает ожидание этапа, но не сам этап
+            return asyncio.shield(asyncio.wrap_future(running))
+
+        try:
+            state = await run(self._load_pool, self.pipeline.load_stage, question, search_mode, retrieval_deadline)
+            await run(self._embed_pool, self.pipeline.index_stage, state)
+            return await run(self._generate_pool, self.pipeline.generate_stage, state, system_prompt)
+        finally:
+            if running is not None and not running.done() and not running.cancel():
+                # Этап уже выполняется: слот освободится, когда он закончит
+                loop = asyncio.get_running_loop()
+                running.add_done_callback(lambda _: loop.is_closed() or loop.call_soon_threadsafe(self._release))
+            else:
+                self._release()
+
+    async def handle_query(self, payload: dict) -> Tuple[int, dict]:
+        question = payload.get('question') if isinstance(payload, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            return 400, {'error': "Field 'question' is required"}
+
+        try:
+            search_mode = SearchMode(payload['search_mode']) if payload.get('search_mode') else None
+        except ValueError:
+            return 400, {'error': f"Unknown search_mode: {payload['search_mode']}"}
+
+        deadline = payload.get('deadline')
+        if deadline is not None:
+            # bool - подкласс int, но "deadline": true - ошибка клиента
+            if isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or not 0 < deadline < float('inf'):
+                return 400, {'error': "Field 'deadline' must be a positive number of seconds"}
+            deadline = min(float(deadline), self.request_deadline)
+        else:
+            deadline = self.request_deadline
+
+        if self._active + self._waiting >= self.max_concurrency + self.max_queue:
+            return 503, {'error': "Server is overloaded, retry later"}
+
+        started = time.perf_counter()
+        try:
+            # Дедлайн покрывает и ожидание в очереди, и обработку
+            # Половина дедлайна (не больше RETRIEVAL_DEADLINE) - на загрузку и индексацию, остальное - на генерацию
+            retrieval_deadline = Deadline(min(settings.RETRIEVAL_DEADLINE, deadline / 2))
+            result = await asyncio.wait_for(
+                self._process(question, payload.get('system_prompt'), search_mode, retrieval_deadline),
+                timeout=deadline
+            )
+        except asyncio.TimeoutError:
+            return 504, {'error': f"Deadline of {deadline:.1f}s exceeded"}
+        except Exception as e:
+            logger.exception("Error answering question")
+            return 500, {'error': str(e)}
+
+        latency = time.perf_counter() - started
+        self.metrics.observe(latency, result.get('timings'))
+        return 200, {
+            'question': question,
+            'answer': result['answer'],
+            'sources': [
+                {'source': doc.metadata.get('source'), 'title': doc.metadata.get('title'), 'type': doc.metadata.get('type'),
+                 'duplicate_sources': doc.metadata.get('duplicate_sources', [])}
+                for doc in result.get('source_documents', [])
+            ],
+            'source_types': result.get('source_types', {}),
+            'generation_mode': result.get('generation_mode'),
+            'documents_loaded': result['documents_loaded'],
+            'chunks_indexed': result['chunks_indexed'],
+            'sources_report': result['sources_report'],
+            'skipped_sources': result['skipped_sources'],
+            'timings': result['timings'],
+            'latency': latency,
+        }
+
+    def health(self) -> dict:
+        return {'status': 'ok', 'index_size': self.pipeline.index_size}
+
+    def metrics_snapshot(self) -> dict:
+        snapshot = self.metrics.snapshot()
+        snapshot.update({
+            'active': self._active,
+            'waiting': self._waiting,
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'index_size': self.pipeline.index_size,
+            'partitions': self.pipeline.vector_manager.partition_sizes(),
+            'coalescing': self.pipeline.coalescing_stats(),
+            'dedup': self.pipeline.dedup_stats(),
+            'prefilter': self.pipeline.prefilter_stats(),
+            'compression': self.pipeline.compression_stats(),
+            'document_index': self.pipeline.document_index_stats(),
+            'routing': self.pipeline.routing_stats(),
+            'reformulation': self.pipeline.reformulation_stats(),
+            'pptx_watch': self.pipeline.watch_stats(),
+            'query_cache': self.pipeline.vector_manager.query_cache.stats(),
+        })
+        return snapshot
+
+    # ---- HTTP ----
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = await asyncio.wait_for(reader.readline(), HEADER_TIMEOUT)
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), HEADER_TIMEOUT)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0) or 0)
+        if length > MAX_BODY_SIZE:
+            return method, path, headers, None
+        body = await asyncio.wait_for(reader.readexactly(length), HEADER_TIMEOUT) if length else b''
+        return method, path.split('?', 1)[0], headers, body
+
+    async def _route(self, method: str, path: str, body: Optional[bytes]) -> Tuple[int, dict]:
+        if path == '/health':
+            return (200, self.health()) if method == 'GET' else (405, {'error': "Use GET"})
+        if path == '/metrics':
+            return (200, self.metrics_snapshot()) if method == 'GET' else (405, {'error': "Use GET"})
+        if path == '/query':
+            if method != 'POST':
+                return 405, {'error': "Use POST"}
+            if body is None:
+                return 413, {'error': "Request body too large"}
+            try:
+                payload = json.loads(body.decode('utf-8') or '{}')
+            except (ValueError, UnicodeDecodeError):
+                return 400, {'error': "Body must be JSON"}
+            return await self.handle_query(payload)
+        return 404, {'error': f"Unknown path: {path}"}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                request = await self._read_request(reader)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                status, payload = 400, {'error': "Malformed request"}
+            else:
+                if request is None:
+                    return
+                status, payload = await self._route(request[0], request[1], request[3])
+
+            self.metrics.count(status)
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+            headers = [
+                f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                "Content-Type: application/json; charset=utf-8",
+                f"Content-Length: {len(body)}",
+                "Connection: close",
+            ]
+            if status == 503:
+                headers.append("Retry-After: 1")
+            writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""Offline stand-ins for YandexGPT, its embeddings and Консультант Плюс, for local runs of the server and pipeline"""
+
+import random
+import re
+import threading
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.language_models.llms import LLM
+
+from src.data.consultant_plus_loader import ConsultantPlusLoader
+from src.processing.embedding_dispatcher import EmbeddingDispatcher
+from src.processing.embeddings import EmbeddingBackend, HashingEmbeddingBackend
+from src.processing.query_reformulator import QueryReformulator
+
+STUB_BASE_URL = "https://stub.consultant.local"
+# Так Yandex Cloud отвечает на превышение квоты (см. is_quota_error)
+QUOTA_ERROR_MESSAGE = "429 Too Many Requests: rate quota limit exceed"
+
+# Небольшой корпус с пересказом типовых норм - достаточно, чтобы поиск и ответы были осмысленными
+STUB_CORPUS = [
+    {
+        'url': f"{STUB_BASE_URL}/document/cons_doc_LAW_34683/",
+        'title': "Трудовой кодекс Российской Федерации. Глава 19. Отпуска",
+        'text': (
+            "Статья 114. Ежегодные оплачиваемые отпуска. Работникам предоставляются ежегодные отпуска "
+            "с сохранением места работы и среднего заработка. Статья 115. Продолжительность ежегодного "
+            "основного оплачиваемого отпуска. Ежегодный основной оплачиваемый отпуск предоставляется "
+            "работникам продолжительностью 28 календарных дней. Статья 122. Порядок предоставления "
+            "ежегодных оплачиваемых отпусков. Оплачиваемый отпуск должен предоставляться работнику ежегодно. "
+            "Право на использование отпуска за первый год работы возникает у работника по истечении шести "
+            "месяцев его непрерывной работы у данного работодателя. Статья 125. Разделение ежегодного "
+            "оплачиваемого отпуска на части. Хотя бы одна из частей этого отпуска должна быть не менее 14 "
+            "календарных дней."
+        ),
+    },
+    {
+        'url': f"{STUB_BASE_URL}/document/cons_doc_LAW_28165/",
+        'title': "Налоговый кодекс Российской Федерации. Глава 23. Налог на доходы физических лиц",
+        'text': (
+            "Статья 224. Налоговые ставки. Налоговая ставка НДФЛ устанавливается в размере 13 процентов, "
+            "если сумма налоговых баз за налоговый период составляет менее 2,4 миллиона рублей. "
+            "Статья 220. Имущественные налоговые вычеты. При приобретении квартиры налогоплательщик вправе "
+            "получить имущественный налоговый вычет в размере фактически произведенных расходов, но не более "
+            "2 000 000 рублей. Статья 219. Социальные налоговые вычеты предоставляются на обучение и лечение."
+        ),
+    },
+    {
+        'url': f"{STUB_BASE_URL}/document/cons_doc_LAW_5142/",
+        'title': "Гражданский кодекс Российской Федерации. Часть первая. Договор",
+        'text': (
+            "Статья 420. Понятие договора. Договором признается соглашение двух или нескольких лиц об "
+            "установлении, изменении или прекращении гражданских прав и обязанностей. Статья 432. Основные "
+            "положения о заключении договора. Договор считается заключенным, если между сторонами достигнуто "
+            "соглашение по всем существенным условиям договора. Статья 450. Основания изменения и расторжения "
+            "договора. Изменение и расторжение договора возможны по соглашению сторон."
+        ),
+    },
+    {
+        'url': f"{STUB_BASE_URL}/document/cons_doc_LAW_34683_81/",
+        'title': "Трудовой кодекс Российской Федерации. Статья 81. Расторжение трудового договора",
+        'text': (
+            "Статья 81. Расторжение трудового договора по инициативе работодателя. Трудовой договор может "
+            "быть расторгнут работодателем в случаях ликвидации организации, сокращения численности или "
+            "штата работников, однократного грубого нарушения работником трудовых обязанностей. Не допускается "
+            "увольнение работника по инициативе работодателя в период его временной нетрудоспособности и в "
+            "период пребывания в отпуске. Статья 178. Выходные пособия. При расторжении трудового договора в "
+            "связи с сокращением штата работнику выплачивается выходное пособие в размере среднего месячного "
+            "заработка."
+        ),
+    },
+]
+
+_word_pattern = re.compile(r'\w+', re.UNICODE)
+
+
+def _terms(text: str) -> set:
+    # Грубый стемминг: первые 5 букв слова
+    return {word[:5] for word in _word_pattern.findall(text.lower()) if len(word) > 2}
+
+
+class StubQuota:
+    """Requests-per-second quota of a stubbed Yandex Cloud API.
+
+    Calls beyond ``rate`` within one second (rejected ones count too), plus a random
+    ``error_rate`` share of all calls, fail with the quota error of the real API.
+    """
+
+    def __init__(self, rate: float = 0.0, error_rate: float = 0.0):
+        self.rate = rate
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._window_calls = 0
+        self._stats = {'calls': 0, 'rejected': 0}
+
+    def check(self):
+        """Count a call, raise the quota error if it is over the quota"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_calls = now, 0
+            self._window_calls += 1
+            self._stats['calls'] += 1
+            rejected = ((self.rate and self._window_calls > self.rate)
+                        or (self.error_rate and random.random() < self.error_rate))
+            if rejected:
+                self._stats['rejected'] += 1
+        if rejected:
+            raise RuntimeError(QUOTA_ERROR_MESSAGE)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['rejected_fraction'] = stats['rejected'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
+
+
+class StubLLM(LLM):
+    """Deterministic offline LLM with configurable latency (fixed plus per 1000 prompt characters)
+    and an optional StubQuota"""
+
+    latency: float = 0.0
+    latency_per_1k_chars: float = 0.0
+    quota: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        if self.quota is not None:
+            self.quota.check()
+        delay = self.latency + self.latency_per_1k_chars * len(prompt) / 1000
+        if delay:
+            time.sleep(delay)
+
+        if "Краткий поисковый запрос" in prompt:
+            question = re.findall(r'Вопрос: "(.*)"', prompt)
+            words = _word_pattern.findall((question[-1] if question else prompt).lower())
+            return " ".join(word for word in words if len(word) > 3)
+
+        context = prompt.split("Вопрос:")[0]
+        sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+|\n', context) if s.strip().startswith("Статья")]
+        summary = " ".join(sentences[:3]) or "В контексте нет подходящих норм."
+        return f"Ответ (stub): {summary}"
+
+
+class StubEmbeddingBackend(EmbeddingBackend):
+    """Embeddings with the latency and quota of a cloud API: texts go through an
+    EmbeddingDispatcher one request each (so quota errors are retried as with YandexGPT),
+    vectors come from the local hashing embedder"""
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0, quota: StubQuota = None, dispatcher: EmbeddingDispatcher = None):
+        super().__init__()
+        self.latency = latency
+        self.quota = quota
+        self._hashing = HashingEmbeddingBackend()
+        self.dispatcher = dispatcher or EmbeddingDispatcher(self._request)
+
+    @property
+    def dimension(self) -> int:
+        return self._hashing.dimension
+
+    @property
+    def model_name(self) -> str:
+        return self._hashing.model_name
+
+    def _request(self, text: str) -> np.ndarray:
+        if self.quota is not None:
+            self.quota.check()
+        if self.latency:
+            time.sleep(self.latency)
+        return self._hashing.embed_batch([text])[0]
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        return self.dispatcher.embed(texts)
+
+    def embed_query_array(self, text: str) -> np.ndarray:
+        # Как у YandexGPT: запрос - через тот же диспетчер (одна квота)
+        return self.dispatcher.embed([text])[0]
+
+
+class StubConsultantPlusLoader(ConsultantPlusLoader):
+    """ConsultantPlusLoader serving search results and pages from STUB_CORPUS instead of consultant.ru"""
+
+    def __init__(self, max_results: int = 5, llm: LLM = None, search_latency: float = 0.0,
+                 page_latency: float = 0.0, corpus: List[dict] = None, straggler_rate: float = 0.0,
+                 straggler_latency: float = 10.0):
+        super().__init__(
+            max_results=max_results,
+            query_reformulator=QueryReformulator(llm=llm or StubLLM()),
+            request_delay=0.0
+        )
+        self.base_url = STUB_BASE_URL
+        self.search_url = f"{STUB_BASE_URL}/search/"
+        self.search_latency = search_latency
+        self.page_latency = page_latency
+        # Доля запросов страниц, которые "зависают" на straggler_latency секунд
+        self.straggler_rate = straggler_rate
+        self.straggler_latency = straggler_latency
+        self.corpus = {doc['url']: doc for doc in (corpus or STUB_CORPUS)}
+
+    def _search_documents(self, query: str, reformulate: bool = True) -> List[dict]:
+        search_query = self._reformulate_query(query) if reformulate else query
+        if self.search_latency:
+            time.sleep(self.search_latency)
+
+        query_terms = _terms(search_query) | _terms(query)
+        scored = []
+        for doc in self.corpus.values():
+            overlap = len(query_terms & _terms(doc['title'] + " " + doc['text']))
+            if overlap:
+                scored.append((overlap, doc))
+        scored.sort(key=lambda item: -item[0])
+
+        results = []
+        for position, (_, doc) in enumerate(scored[:self.max_results], 1):
+            results.append({
+                'url': doc['url'],
+                'title': doc['title'],
+                'description': "",
+                'text_info': doc['text'][:120],
+                'relevance_score': position,
+                'position': position,
+                'original_query': query,
+                'search_query': search_query
+            })
+        return results
+
+    def _load_document_content(self, url: str, timeout: float = None) -> Optional[str]:
+        latency = self.page_latency
+        if self.straggler_rate and random.random() < self.straggler_rate:
+            latency = self.straggler_latency
+        if latency:
+            time.sleep(min(latency, timeout) if timeout else latency)
+            if timeout and latency > timeout:
+                return None  # Как requests по таймауту
+        doc = self.corpus.get(url)
+        return doc['text'] if doc else None
\ No newline at end of file
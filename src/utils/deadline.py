@@ -0,0 +1,39 @@
+import time
+from typing import Optional
+
+
+class Deadline:
+    """Latency budget shared by the stages of one question.
+
+    ``Deadline(None)`` never expires, so code can take a deadline unconditionally.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.budget = seconds
+        self.started = time.monotonic()
+        self.expires_at = None if seconds is None else self.started + seconds
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), None when there is no budget"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        """Timeout for one blocking call: the remaining budget, at most ``cap``"""
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return remaining if cap is None else min(cap, remaining)
+
+    def share(self, fraction: float) -> "Deadline":
+        """Deadline for a stage that may use ``fraction`` of the remaining budget"""
+        remaining = self.remaining()
+        return Deadline(None if remaining is None else remaining * fraction)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
\ No newline at end of file
@@ -1,11 +1,10 @@
 import logging
 from typing import List
-import faiss
 
 def setup_logging(level=logging.INFO):
     """Setup logging configuration"""
     
-    # Настройка логгера Faiss
+    # Настройка логгера Faiss (по имени, без импорта самого faiss)
     faiss_logger = logging.getLogger('faiss')
     faiss_logger.setLevel(logging.WARNING)  # Только WARNING и выше
     faiss_logger.propagate = False  # Не передавать выше
@@ -92,6 +91,10 @@ def format_sources(source_documents: List) -> str:
             # Показываем размер чанка
             if hasattr(doc, 'page_content'):
                 source_info += f" ({len(doc.page_content)} символов)"
+            
+            # Тот же текст есть и в других источниках (дубликаты удалены перед эмбеддингом)
+            if doc.metadata.get('duplicate_sources'):
+                source_info += f"\n   Также в: {', '.join(doc.metadata['duplicate_sources'])}"
         
         sources.append(source_info)
     
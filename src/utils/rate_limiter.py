@@ -0,0 +1,51 @@
+import threading
+import time
+
+from config.settings import settings
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls at least ``1 / rate`` seconds apart.
+
+    Each caller reserves the next free slot under the lock and sleeps outside it,
+    so waiting threads do not block each other's bookkeeping.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.min_interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> float:
+        """Block until the caller may proceed, return the time waited"""
+        if not self.min_interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_llm_rate_limiter = None
+_llm_rate_limiter_lock = threading.Lock()
+
+
+def get_llm_rate_limiter() -> RateLimiter:
+    """Process-wide limiter shared by all YandexGPT completion calls (settings.LLM_RATE_LIMIT)"""
+    global _llm_rate_limiter
+    with _llm_rate_limiter_lock:
+        if _llm_rate_limiter is None:
+            _llm_rate_limiter = RateLimiter(settings.LLM_RATE_LIMIT)
+        return _llm_rate_limiter
\ No newline at end of file
@@ -0,0 +1,110 @@
+import hashlib
+import re
+import threading
+from typing import Callable, Hashable, List, Sequence
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a question for use as a coalescing / cache key"""
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    return text.strip(' ?!.,;:"\'«»')
+
+
+def text_hash(text: str) -> str:
+    """Stable hash of a chunk text"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight execution.
+
+    The first caller for a key runs the function; callers arriving while it runs
+    wait and receive the same result (or exception). Nothing is cached after the
+    call completes.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def do_many(self, keys: Sequence[Hashable], fn: Callable[[List[int]], Sequence]) -> list:
+        """Batched variant: ``fn`` receives the positions of keys this caller must compute
+        and returns their results in the same order. Keys already in flight (including
+        duplicates within ``keys``) are awaited instead of recomputed."""
+        owned, waiting = [], []
+        with self._lock:
+            for position, key in enumerate(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = _Call()
+                    owned.append((position, key, call))
+                    self.executed += 1
+                else:
+                    waiting.append((position, call))
+                    self.coalesced += 1
+
+        results = [None] * len(keys)
+        if owned:
+            try:
+                values = fn([position for position, _, _ in owned])
+                for (position, _, call), value in zip(owned, values):
+                    call.result = results[position] = value
+            except BaseException as e:
+                for _, _, call in owned:
+                    call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for _, key, _ in owned:
+                        del self._calls[key]
+                for _, _, call in owned:
+                    call.event.set()
+
+        for position, call in waiting:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            results[position] = call.result
+        return results
+
+    def stats(self) -> dict:
+        return {'executed': self.executed, 'coalesced': self.coalesced}
\ No newline at end of file
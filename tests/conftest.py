@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Тесты запускаются из корня репозитория: python -m pytest tests
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
\ No newline at end of file
@@ -0,0 +1,62 @@
+from src.data.consultant_ingest import ConsultantPlusIngestor, IngestCheckpoint
+from src.processing.embeddings import HashingEmbeddingBackend
+from src.testing.stubs import StubConsultantPlusLoader
+
+QUERIES = ["трудовой договор отпуск налог"]
+
+
+class CountingLoader(StubConsultantPlusLoader):
+    def __init__(self, failing=(), **kwargs):
+        super().__init__(**kwargs)
+        self.failing = set(failing)
+        self.fetched = []
+
+    def _load_document_content(self, url, *args, **kwargs):
+        self.fetched.append(url)
+        if url in self.failing:
+            raise ConnectionError("stub page is down")
+        return super()._load_document_content(url, *args, **kwargs)
+
+
+def make_ingestor(tmp_path, loader):
+    return ConsultantPlusIngestor(
+        HashingEmbeddingBackend(), loader=loader,
+        corpus_path=str(tmp_path / "corpus"),
+        checkpoint_path=str(tmp_path / "checkpoint.json"),
+        store_path=str(tmp_path / "corpus.db"),
+        rate_limit=1000, save_every=1
+    )
+
+
+def test_interrupted_ingest_resumes_without_refetching(tmp_path):
+    first = CountingLoader()
+    stats = make_ingestor(tmp_path, first).run(codes=[], queries=QUERIES, limit=1)
+    assert stats['ingested'] == 1
+    targets = IngestCheckpoint(str(tmp_path / "checkpoint.json")).state['targets']
+    assert len(targets) > 1
+
+    second = CountingLoader()
+    stats = make_ingestor(tmp_path, second).run(codes=[], queries=QUERIES)
+    assert stats['ingested'] == len(targets) - 1
+    assert first.fetched[0] not in second.fetched
+    assert stats['corpus_size'] > 0
+
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.json"))
+    assert checkpoint.pending() == []
+    assert set(checkpoint.state['done']) == {target['url'] for target in targets}
+
+
+def test_failed_page_is_retried_on_the_next_run(tmp_path):
+    loader = CountingLoader()
+    loader.failing = {next(iter(loader.corpus))}
+    make_ingestor(tmp_path, loader).run(codes=[], queries=QUERIES)
+    failed_url = next(iter(loader.failing))
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.json"))
+    assert failed_url in checkpoint.state['failed']
+    assert [target['url'] for target in checkpoint.pending()] == [failed_url]
+
+    retry = CountingLoader()
+    stats = make_ingestor(tmp_path, retry).run(codes=[], queries=QUERIES)
+    assert retry.fetched == [failed_url]
+    assert stats['ingested'] == 1
+    assert IngestCheckpoint(str(tmp_path / "checkpoint.json")).state['failed'] == {}
\ No newline at end of file
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+from langchain.schema import Document
+
+from src.processing.content_chunker import ContentDefinedSplitter
+from src.processing.text_splitter import TextSplitter
+
+WORDS = ("работник отпуск договор работодатель заработная плата календарных дней порядок "
+         "предоставления трудовой кодекс статья часть пункт срок оплата").split()
+
+
+def law(articles=12, seed=0):
+    rng = random.Random(seed)
+    return "\n".join(
+        f"Статья {n}. " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))) + "."
+        for n in range(1, articles + 1)
+    )
+
+
+def test_chunks_respect_the_size_limit_and_cover_the_text():
+    splitter = ContentDefinedSplitter(chunk_size=400, chunk_overlap=80)
+    text = law()
+    spans = splitter.split_spans(text)
+    assert all(end - start <= 400 for start, end in spans)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    assert all(next_start <= end for (_, end), (next_start, _) in zip(spans, spans[1:]))
+
+
+def test_cuts_at_article_headings():
+    splitter = ContentDefinedSplitter(chunk_size=2000, chunk_overlap=0)
+    chunks = splitter.split_text(law(articles=6))
+    assert all(chunk.startswith("Статья ") for chunk in chunks)
+
+
+def test_an_edit_only_changes_the_chunks_around_it():
+    splitter = ContentDefinedSplitter(chunk_size=400, chunk_overlap=80)
+    text = law(articles=20)
+    position = text.index("Статья 10.")
+    edited = text[:position] + "Статья 10. Новая редакция нормы о переносе отпуска. " + text[position + len("Статья 10. "):]
+
+    before, after = splitter.split_text(text), splitter.split_text(edited)
+    unchanged = set(before) & set(after)
+    assert len(before) - len(unchanged) <= 3
+    assert len(after) - len(unchanged) <= 3
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        ContentDefinedSplitter(chunk_size=100, chunk_overlap=100)
+
+
+def test_text_splitter_uses_the_requested_method():
+    splitter = TextSplitter(chunk_size=400, chunk_overlap=80)
+    document = Document(page_content=law(), metadata={'source': "tk"})
+    chunks = splitter.split_documents([document], method="content_defined")
+    spans = ContentDefinedSplitter(chunk_size=400, chunk_overlap=80).split_text(law())
+    assert [chunk.page_content for chunk in chunks] == spans
+    assert all(chunk.metadata['source'] == "tk" for chunk in chunks)
+    with pytest.raises(ValueError):
+        splitter.split_documents([document], method="semantic")
\ No newline at end of file
@@ -0,0 +1,58 @@
+from langchain.schema import Document
+
+from src.generation.context_compressor import ContextCompressor
+from src.processing.embeddings import HashingEmbeddingBackend
+
+ARTICLE = (
+    "Статья 115. Продолжительность ежегодного основного оплачиваемого отпуска\n"
+    "Ежегодный основной оплачиваемый отпуск предоставляется работникам продолжительностью 28 календарных дней. "
+    "Работодатель ведет учет рабочего времени. "
+    "Трудовой договор заключается в письменной форме. "
+    "Заработная плата выплачивается не реже чем каждые полмесяца."
+)
+OTHER = "Статья 224. Налоговые ставки. Налоговая ставка устанавливается в размере 13 процентов."
+
+
+def test_headings_are_not_sentences():
+    spans = ContextCompressor.split_sentences(ARTICLE)
+    headings = [text for start, end, text in spans if end is None]
+    assert headings == ["Статья 115. Продолжительность ежегодного основного оплачиваемого отпуска"]
+    sentences = [ARTICLE[start:end] for start, end, _ in spans if end is not None]
+    assert len(sentences) == 4
+    assert all(heading == headings[0] for start, end, heading in spans)
+
+
+def test_heading_inside_a_one_line_page_keeps_only_the_number():
+    spans = ContextCompressor.split_sentences(OTHER)
+    assert [heading for _, end, heading in spans if end is None] == ["Статья 224."]
+
+
+def test_keeps_relevant_sentences_under_the_heading():
+    compressor = ContextCompressor(max_chars=150, lexical_weight=1.0)
+    question = "Какова продолжительность ежегодного оплачиваемого отпуска?"
+    [compressed] = compressor.compress(question, [Document(page_content=ARTICLE, metadata={'source': "tk"})])
+
+    assert compressed.page_content.startswith("Статья 115.")
+    assert "28 календарных дней" in compressed.page_content
+    assert "Заработная плата" not in compressed.page_content
+    assert compressed.metadata == {'source': "tk", 'compressed_from': len(ARTICLE)}
+    stats = compressor.stats()
+    assert stats['chars_in'] == len(ARTICLE)
+    assert stats['ratio'] > 1
+
+
+def test_every_chunk_keeps_its_best_sentence():
+    compressor = ContextCompressor(max_chars=1, lexical_weight=1.0)
+    documents = [Document(page_content=ARTICLE, metadata={'source': "tk"}),
+                 Document(page_content=OTHER, metadata={'source': "nk"})]
+    compressed = compressor.compress("отпуск", documents)
+    assert [doc.metadata['source'] for doc in compressed] == ["tk", "nk"]
+
+
+def test_sentence_embeddings_are_cached():
+    compressor = ContextCompressor(embeddings=HashingEmbeddingBackend(), max_chars=200)
+    documents = [Document(page_content=ARTICLE, metadata={'source': "tk"})]
+    compressor.compress("отпуск", documents)
+    compressor.compress("заработная плата", documents)
+    cache = compressor.stats()['sentence_cache']
+    assert cache['hits'] == cache['misses'] == 4
\ No newline at end of file
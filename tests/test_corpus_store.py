@@ -0,0 +1,89 @@
+import pickle
+
+from langchain.schema import Document
+
+from src.data.corpus_store import CorpusDocstore, CorpusStore
+
+TEXT = "Статья 114. Ежегодные оплачиваемые отпуска. " * 20
+
+
+def make_chunks(parent_id, size=100):
+    return {
+        f"chunk-{start}": Document(
+            page_content=TEXT[start:start + size],
+            metadata={'source': "doc", 'parent_id': parent_id, 'start_index': start, 'chunk_id': start}
+        )
+        for start in range(0, len(TEXT), size)
+    }
+
+
+def test_chunks_are_stored_as_offsets_and_read_back(tmp_path):
+    store = CorpusStore(str(tmp_path / "corpus.db"))
+    parent_id = store.add_parent(Document(page_content=TEXT, metadata={'source': "doc", 'title': "ТК РФ"}))
+    assert store.add_parent(Document(page_content=TEXT, metadata={'source': "doc"})) == parent_id
+    chunks = make_chunks(parent_id)
+    store.add_chunks(chunks)
+
+    for chunk_id, chunk in chunks.items():
+        stored = store.get_chunk(chunk_id)
+        assert stored.page_content == chunk.page_content
+        assert stored.metadata['title'] == "ТК РФ"
+        assert stored.metadata['chunk_id'] == chunk.metadata['chunk_id']
+        assert stored.metadata['start_index'] == chunk.metadata['start_index']
+
+    stats = store.stats()
+    assert stats['parents'] == 1
+    assert stats['chunks'] == len(chunks)
+    assert stats['stored_bytes'] < len(TEXT.encode('utf-8'))
+
+
+def test_chunk_not_matching_its_parent_becomes_its_own_parent(tmp_path):
+    store = CorpusStore(str(tmp_path / "corpus.db"))
+    parent_id = store.add_parent(Document(page_content=TEXT, metadata={'source': "doc"}))
+    store.add_chunks({"edited": Document(page_content="Измененный текст",
+                                         metadata={'source': "doc", 'parent_id': parent_id, 'start_index': 0})})
+    assert store.get_chunk("edited").page_content == "Измененный текст"
+    assert store.stats()['parents'] == 2
+
+
+def test_deleting_chunks_drops_orphaned_parents(tmp_path):
+    store = CorpusStore(str(tmp_path / "corpus.db"))
+    parent_id = store.add_parent(Document(page_content=TEXT, metadata={'source': "doc"}))
+    chunks = make_chunks(parent_id)
+    store.add_chunks(chunks)
+    store.delete_chunks(list(chunks))
+    assert store.get_chunk("chunk-0") is None
+    assert store.stats()['parents'] == 0
+
+
+def test_discard_parent_keeps_referenced_parents(tmp_path):
+    store = CorpusStore(str(tmp_path / "corpus.db"))
+    used = store.add_parent(Document(page_content=TEXT, metadata={'source': "used"}))
+    store.add_chunks(make_chunks(used))
+    unused = store.add_parent(Document(page_content="Страница без чанков", metadata={'source': "unused"}))
+    store.discard_parent(used)
+    store.discard_parent(unused)
+    assert store.get_parent(used) is not None
+    assert store.get_parent(unused) is None
+
+
+def test_unpickled_docstore_keeps_live_chunks_out_of_the_store(tmp_path):
+    store = CorpusStore(str(tmp_path / "corpus.db"))
+    parent_id = store.add_parent(Document(page_content=TEXT, metadata={'source': "doc"}))
+    docstore = CorpusDocstore(store)
+    docstore.add(make_chunks(parent_id))
+
+    served = pickle.loads(pickle.dumps(docstore))
+    assert served.read_only
+    assert served.search("chunk-0").page_content == TEXT[:100]
+
+    live = Document(page_content="Живая страница", metadata={'source': "live"})
+    served.add({"live-0": live})
+    assert served.search("live-0") is live
+    assert served.store.get_chunk("live-0") is None
+    assert served.sources() == {"doc", "live"}
+
+    restored = pickle.loads(pickle.dumps(served))
+    assert restored.search("live-0").page_content == "Живая страница"
+    served.delete(["chunk-0"])
+    assert store.get_chunk("chunk-0") is not None
\ No newline at end of file
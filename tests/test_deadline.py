@@ -0,0 +1,76 @@
+import threading
+import time
+
+from src.testing.stubs import StubConsultantPlusLoader
+from src.utils.deadline import Deadline
+
+URL = "https://stub.consultant.local/document/cons_doc_LAW_34683/"
+
+
+def test_deadline_without_budget_never_expires():
+    deadline = Deadline()
+    assert not deadline.expired
+    assert deadline.remaining() is None
+    assert deadline.timeout(3.0) == 3.0
+    assert deadline.share(0.5).remaining() is None
+
+
+def test_deadline_expires_and_caps_timeouts():
+    deadline = Deadline(0.05)
+    assert deadline.timeout(10.0) <= 0.05
+    assert deadline.timeout(0.01) == 0.01
+    time.sleep(0.06)
+    assert deadline.expired
+    assert deadline.remaining() == 0.0
+
+
+def test_share_takes_a_fraction_of_the_remaining_budget():
+    share = Deadline(1.0).share(0.25)
+    assert 0.2 < share.remaining() <= 0.25
+
+
+class StragglerLoader(StubConsultantPlusLoader):
+    """The first request of every page hangs, the duplicate answers at once"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _load_document_content(self, url, timeout=None):
+        with self._lock:
+            self.requests += 1
+            first = self.requests == 1
+        if first:
+            time.sleep(min(2.0, timeout or 2.0))
+            return None
+        return self.corpus[url]['text']
+
+
+def test_straggler_is_hedged_within_the_deadline():
+    loader = StragglerLoader()
+    loader.hedge_after = 0.05
+
+    started = time.monotonic()
+    content = loader.load_document_content(URL, Deadline(1.0))
+
+    assert content
+    assert time.monotonic() - started < 0.5
+    assert loader.hedge_stats() == {'hedged': 1, 'hedge_won': 1}
+
+
+def test_no_hedge_without_a_budget():
+    loader = StubConsultantPlusLoader(page_latency=0.1)
+    loader.hedge_after = 0.01
+
+    assert loader.load_document_content(URL, Deadline())
+    assert loader.hedge_stats() == {'hedged': 0, 'hedge_won': 0}
+
+
+def test_late_page_is_skipped_at_the_deadline():
+    loader = StubConsultantPlusLoader(page_latency=2.0)
+    loader.hedge_after = 10.0
+
+    started = time.monotonic()
+    assert loader.load_document_content(URL, Deadline(0.1)) is None
+    assert time.monotonic() - started < 0.5
\ No newline at end of file
@@ -0,0 +1,44 @@
+from langchain.schema import Document
+
+from src.processing.deduplicator import ChunkDeduplicator
+
+TEXT = ("Ежегодный основной оплачиваемый отпуск предоставляется работникам продолжительностью "
+        "28 календарных дней. Ежегодный основной оплачиваемый отпуск продолжительностью более "
+        "28 календарных дней предоставляется работникам в соответствии с настоящим Кодексом")
+
+
+def chunk(text, source):
+    return Document(page_content=text, metadata={'source': source})
+
+
+def test_exact_duplicate_is_dropped_and_its_source_kept():
+    result = ChunkDeduplicator().deduplicate([chunk(TEXT, "a"), chunk(TEXT, "b")])
+
+    assert len(result) == 1
+    assert result[0].metadata['source'] == "a"
+    assert result[0].metadata['duplicate_sources'] == ["b"]
+
+
+def test_unrelated_chunks_are_kept():
+    other = "Налоговая ставка устанавливается в размере 13 процентов для налоговых резидентов"
+    result = ChunkDeduplicator().deduplicate([chunk(TEXT, "a"), chunk(other, "b")])
+    assert [doc.metadata['source'] for doc in result] == ["a", "b"]
+
+
+def test_threshold_decides_near_duplicates():
+    # Одно слово в конце изменено: сходство Жаккара по шинглам около 0.9
+    edited = TEXT.replace("Кодексом", "законом")
+    deduplicator = ChunkDeduplicator()
+    similarity = deduplicator.similarity(deduplicator.signature(TEXT), deduplicator.signature(edited))
+    assert 0.6 < similarity < 1.0
+
+    chunks = [chunk(TEXT, "a"), chunk(edited, "b")]
+    assert len(ChunkDeduplicator(threshold=similarity - 0.05).deduplicate(chunks)) == 1
+    assert len(ChunkDeduplicator(threshold=1.0).deduplicate(chunks)) == 2
+
+
+def test_stats_count_dropped_chunks():
+    deduplicator = ChunkDeduplicator()
+    deduplicator.deduplicate([chunk(TEXT, "a"), chunk(TEXT, "a"), chunk(TEXT, "c")])
+    stats = deduplicator.stats()
+    assert (stats['chunks'], stats['kept'], stats['dropped']) == (3, 1, 2)
\ No newline at end of file
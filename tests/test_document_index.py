@@ -0,0 +1,78 @@
+import numpy as np
+from langchain.schema import Document
+
+from src.processing.embeddings import HashingEmbeddingBackend
+from src.retrieval.document_index import DocumentIndex, describe
+from src.retrieval.partitioned_store import PartitionedVectorStoreManager
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def chunk(source, source_type='consultant'):
+    return {'source': source, 'type': source_type}
+
+
+def test_describe_joins_the_search_result_fields():
+    assert describe({'title': "ТК РФ ", 'text_info': "Отпуска", 'url': "u"}) == "ТК РФ. Отпуска"
+
+
+def test_documents_are_ranked_by_their_pooled_chunks():
+    index = DocumentIndex(embeddings=None, metadata_weight=0.0)
+    index.add_chunks([(chunk("a"), unit(1, 0, 0)), (chunk("a"), unit(1, 0.2, 0)),
+                      (chunk("b"), unit(0, 1, 0)), (chunk("c", 'pptx'), unit(0, 0, 1))], 'consultant')
+
+    assert index.search(unit(0, 1, 0.1), m=2) == ["b", "c"]
+    filtered = index.search(unit(0, 0, 1), m=3, type_filter=lambda source_type: source_type == 'consultant')
+    assert sorted(filtered) == ["a", "b"]
+    assert index.stats() == {'documents': 3, 'chunks': 4, 'descriptions': 0}
+
+
+def test_removing_a_document_keeps_the_other_rows_right():
+    index = DocumentIndex(embeddings=None, metadata_weight=0.0)
+    index.add_chunks([(chunk("a"), unit(1, 0, 0)), (chunk("b"), unit(0, 1, 0)), (chunk("c"), unit(0, 0, 1))], 'p')
+    index.remove_sources(["a"])
+
+    assert len(index) == 2
+    assert index.search(unit(0, 0, 1), m=1) == ["c"]
+    assert index.search(unit(0, 1, 0), m=1) == ["b"]
+
+
+def test_state_round_trip():
+    index = DocumentIndex(embeddings=None, metadata_weight=0.0)
+    index.add_chunks([(chunk("a"), unit(1, 0, 0)), (chunk("b"), unit(0, 1, 0))], 'p')
+    restored = DocumentIndex(embeddings=None)
+    restored.restore(index.state())
+    assert restored.search(unit(0, 1, 0), m=2) == ["b", "a"]
+
+
+def make_manager():
+    manager = PartitionedVectorStoreManager(HashingEmbeddingBackend(dimension=256), storage_mode="float32",
+                                            hierarchical=True, top_documents=1)
+    manager.add_documents([
+        Document(page_content=text, metadata={'source': source, 'type': 'consultant', 'title': title})
+        for source, title, text in [
+            ("tk", "Трудовой кодекс. Отпуска", "Ежегодный оплачиваемый отпуск 28 календарных дней"),
+            ("tk", "Трудовой кодекс. Отпуска", "Отпуск может быть разделен на части"),
+            ("nk", "Налоговый кодекс. НДФЛ", "Налоговая ставка 13 процентов"),
+            ("nk", "Налоговый кодекс. НДФЛ", "Имущественный налоговый вычет при покупке квартиры"),
+        ]
+    ])
+    return manager
+
+
+def test_hierarchical_search_returns_chunks_of_the_top_documents_only():
+    manager = make_manager()
+    results = manager.similarity_search("налоговая ставка НДФЛ", k=4)
+    assert results
+    assert {doc.metadata['source'] for doc in results} == {"nk"}
+
+
+def test_saved_document_level_is_restored(tmp_path):
+    make_manager().save_vector_store(str(tmp_path / "index"))
+    loaded = PartitionedVectorStoreManager(HashingEmbeddingBackend(dimension=256), hierarchical=True, top_documents=1)
+    loaded.load_vector_store(str(tmp_path / "index"))
+    assert loaded.document_index.stats()['documents'] == 2
+    assert {doc.metadata['source'] for doc in loaded.similarity_search("оплачиваемый отпуск", k=4)} == {"tk"}
\ No newline at end of file
@@ -0,0 +1,80 @@
+import threading
+
+import numpy as np
+import pytest
+
+from src.processing.embedding_dispatcher import EmbeddingDispatcher
+
+QUOTA_ERROR_MESSAGE = "429 Too Many Requests: rate quota limit exceed"
+
+
+def vector(text):
+    return [float(len(text)), 1.0]
+
+
+def make_dispatcher(request_fn, **kwargs):
+    options = dict(max_concurrency=8, initial_concurrency=2, rate_limit=0, max_retries=3, backoff=0.001)
+    options.update(kwargs)
+    return EmbeddingDispatcher(request_fn, **options)
+
+
+def test_results_keep_input_order():
+    texts = ["a" * length for length in range(1, 30)]
+    result = make_dispatcher(vector).embed(texts)
+    assert result.dtype == np.float32
+    assert result[:, 0].tolist() == list(range(1, 30))
+
+
+def test_window_grows_on_success_and_halves_on_quota_error():
+    dispatcher = make_dispatcher(vector)
+    dispatcher.embed(["text"] * 50)
+    grown = dispatcher.stats()['concurrency']
+    assert grown > 2
+
+    failed = set()
+    lock = threading.Lock()
+
+    def once_over_quota(text):
+        with lock:
+            first = text not in failed
+            failed.add(text)
+        if first:
+            raise RuntimeError(QUOTA_ERROR_MESSAGE)
+        return vector(text)
+
+    result = dispatcher.embed(["only"], request_fn=once_over_quota)
+    stats = dispatcher.stats()
+    assert result[0, 0] == 4
+    assert stats['quota_errors'] == 1
+    assert stats['retried_texts'] == 1
+    assert stats['concurrency'] < grown
+    assert stats['in_flight'] == 0
+
+
+def test_only_failed_texts_are_retried():
+    calls = []
+    lock = threading.Lock()
+
+    def flaky(text):
+        with lock:
+            calls.append(text)
+            attempt = calls.count(text)
+        if text == "bad" and attempt == 1:
+            raise ConnectionError("reset by peer")
+        return vector(text)
+
+    result = make_dispatcher(flaky).embed(["one", "bad", "three"])
+    assert result[:, 0].tolist() == [3, 3, 5]
+    assert sorted(calls) == ["bad", "bad", "one", "three"]
+
+
+def test_gives_up_after_max_retries_and_frees_the_window():
+    def always_over_quota(text):
+        raise RuntimeError(QUOTA_ERROR_MESSAGE)
+
+    dispatcher = make_dispatcher(always_over_quota, max_retries=2)
+    with pytest.raises(RuntimeError):
+        dispatcher.embed(["a", "b", "c"])
+    assert dispatcher.stats()['concurrency'] == 1.0
+    # Слоты не утекли: следующий вызов получает окно
+    assert dispatcher.embed(["ok"], request_fn=vector)[0, 0] == 2
\ No newline at end of file
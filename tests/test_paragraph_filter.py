@@ -0,0 +1,78 @@
+from langchain.schema import Document
+
+from src.processing.paragraph_filter import ParagraphPrefilter
+
+FILLER = "Работодатель ведет учет рабочего времени и хранит документы. " * 8
+TOPICS = ["заработная плата", "испытательный срок", "ежегодный отпуск", "сверхурочная работа",
+          "материальная ответственность", "дисциплинарное взыскание"]
+CODE = "\n".join(f"Статья {n}. {topic.capitalize()}. {FILLER}" for n, topic in enumerate(TOPICS, start=100))
+
+
+def make_prefilter(**kwargs):
+    options = dict(min_chars=1000, section_chars=2000, top_sections=1, neighbors=0, chunk_size=300, chunk_overlap=50)
+    options.update(kwargs)
+    return ParagraphPrefilter(**options)
+
+
+def document(text=CODE, **metadata):
+    return Document(page_content=text, metadata={'source': "tk", 'type': 'consultant', **metadata})
+
+
+def test_sections_follow_article_headings_and_cover_the_text():
+    spans = make_prefilter().sections(CODE)
+    assert len(spans) == len(TOPICS)
+    assert spans[0][0] == 0 and spans[-1][1] == len(CODE)
+    assert all(CODE[start:end].lstrip().startswith("Статья") for start, end in spans)
+
+
+def test_long_sections_are_cut_at_sentence_ends():
+    spans = make_prefilter(section_chars=200).sections(CODE)
+    assert all(end - start <= 200 for start, end in spans)
+    assert all(CODE[end - 2:end] == ". " or end == len(CODE) or CODE[end:].startswith("Статья") for _, end in spans)
+
+
+def test_keeps_the_matching_article_and_its_neighbors():
+    prefilter = make_prefilter(neighbors=1)
+    spans, keep = prefilter.select(document(), "Сколько дней длится ежегодный отпуск?")
+    assert keep == [1, 2, 3]
+    [part] = prefilter.documents(document(), spans, keep)
+    assert part.page_content.startswith("Статья 101.")
+    assert "Статья 102. Ежегодный отпуск" in part.page_content
+    assert "Статья 104." not in part.page_content
+
+
+def test_search_query_counts_as_part_of_the_question():
+    spans, keep = make_prefilter().select(document(search_query="дисциплинарное взыскание"), "Что мне грозит?")
+    assert keep == [5]
+
+
+def test_short_documents_presentations_and_unmatched_documents_stay_whole():
+    prefilter = make_prefilter()
+    assert prefilter.select(document(CODE[:500]), "отпуск") is None
+    assert prefilter.select(document(type='pptx'), "отпуск") is None
+    assert prefilter.select(document(), "ипотека") is None
+
+
+def test_a_source_indexed_over_several_questions_counts_once():
+    prefilter = make_prefilter()
+    spans = prefilter.sections(CODE)
+    prefilter.record("tk", len(CODE), spans, [2])
+    prefilter.record("tk", len(CODE), spans, [2])
+    prefilter.record("tk", len(CODE), spans, [5])
+
+    stats = prefilter.stats()
+    assert stats['documents'] == 1
+    assert stats['kept_chars'] == (spans[2][1] - spans[2][0]) + (spans[5][1] - spans[5][0])
+    assert stats['embedding_calls_saved'] > 0
+
+    prefilter.forget("tk", [5])
+    assert prefilter.stats()['kept_chars'] == spans[2][1] - spans[2][0]
+    prefilter.forget("tk", [2])
+    assert prefilter.stats()['documents'] == 0
+
+
+def test_unmatched_documents_are_counted_whole():
+    prefilter = make_prefilter()
+    prefilter.record("tk", len(CODE))
+    stats = prefilter.stats()
+    assert (stats['unmatched'], stats['kept_chars'], stats['dropped_chars']) == (1, len(CODE), 0)
\ No newline at end of file
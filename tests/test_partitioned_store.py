@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+from langchain.schema import Document
+
+from src.processing.embeddings import HashingEmbeddingBackend
+from src.retrieval.partitioned_store import PartitionedVectorStoreManager
+
+DECK = "/decks/vacation.pptx"
+
+
+def slide(text):
+    return Document(page_content=text, metadata={'source': DECK, 'type': 'pptx'})
+
+
+@pytest.fixture
+def manager():
+    manager = PartitionedVectorStoreManager(HashingEmbeddingBackend(dimension=64), storage_mode="float32",
+                                            hierarchical=False)
+    manager.add_documents([
+        slide("Ежегодный отпуск 28 календарных дней"),
+        slide("Отпуск по уходу за ребенком"),
+        Document(page_content="Налоговая ставка 13 процентов", metadata={'source': 'u1', 'type': 'consultant'}),
+    ])
+    return manager
+
+
+def test_replace_partition_swaps_only_that_deck(manager):
+    key = manager.partition_key({'source': DECK, 'type': 'pptx'})
+
+    count = manager.replace_partition(key, [slide("Ежегодный отпуск 28 календарных дней"),
+                                            slide("Учебный отпуск для студентов")])
+
+    assert count == 2
+    texts = {doc.page_content for doc in manager.similarity_search("отпуск", k=10)}
+    assert "Учебный отпуск для студентов" in texts
+    assert "Отпуск по уходу за ребенком" not in texts
+    assert "Налоговая ставка 13 процентов" in texts
+
+
+def test_replace_partition_reembeds_only_changed_chunks(manager):
+    key = manager.partition_key({'source': DECK, 'type': 'pptx'})
+    manager.replace_partition(key, [slide("Ежегодный отпуск 28 календарных дней"),
+                                    slide("Учебный отпуск для студентов")])
+    assert manager.reembed_stats == {'chunks': 2, 'embedded': 1}
+
+
+def test_replace_with_nothing_drops_the_partition(manager):
+    key = manager.partition_key({'source': DECK, 'type': 'pptx'})
+    assert manager.replace_partition(key, []) == 0
+    assert key not in manager.partition_sizes()
+    assert {doc.metadata['source'] for doc in manager.similarity_search("отпуск", k=10)} == {'u1'}
+
+
+def test_searches_never_see_a_half_built_partition(manager):
+    key = manager.partition_key({'source': DECK, 'type': 'pptx'})
+    stop = threading.Event()
+    sizes = []
+
+    def search():
+        while not stop.is_set():
+            sizes.append(sum(doc.metadata['source'] == DECK for doc in manager.similarity_search("отпуск", k=10)))
+
+    thread = threading.Thread(target=search)
+    thread.start()
+    for version in range(20):
+        manager.replace_partition(key, [slide(f"Отпуск, версия {version}, слайд {n}") for n in range(2)])
+    stop.set()
+    thread.join()
+
+    assert sizes and all(size == 2 for size in sizes)
\ No newline at end of file
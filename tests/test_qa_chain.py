@@ -0,0 +1,90 @@
+from typing import List
+
+from langchain.schema import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.generation.qa_chain import QASystem
+from src.testing.stubs import StubLLM
+
+
+class FixedRetriever(BaseRetriever):
+    documents: List[Document] = []
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return list(self.documents)
+
+
+class CountingLLM(StubLLM):
+    calls: int = 0
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        return super()._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def make_qa(documents, **kwargs):
+    llm = CountingLLM()
+    return QASystem(FixedRetriever(documents=documents), llm=llm, **kwargs), llm
+
+
+def test_nothing_is_generated_without_context_when_required():
+    qa, llm = make_qa([])
+    result = qa.query("Сколько дней отпуска?", require_context=True)
+    assert result['answer'] is None
+    assert result['source_documents'] == []
+    assert llm.calls == 0
+
+
+def test_answers_from_retrieved_context():
+    documents = [Document(page_content="Статья 115. Отпуск 28 календарных дней.", metadata={'type': 'consultant'})]
+    qa, llm = make_qa(documents)
+    result = qa.query("Сколько дней отпуска?", require_context=True)
+    assert "Статья 115" in result['answer']
+    assert result['source_types'] == {'consultant': 1}
+    assert llm.calls == 1
+
+
+class RecordingLLM(StubLLM):
+    prompts: list = []
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(prompt)
+        if "Факты по вопросу" in prompt and "нет фактов" in prompt:
+            return "Нет информации"
+        return super()._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def articles(count, size=300):
+    return [Document(page_content=f"Статья {n}. " + "норма " * (size // 6), metadata={'title': f"Документ {n}"})
+            for n in range(1, count + 1)]
+
+
+def test_group_documents_keeps_order_and_numbers():
+    groups = QASystem.group_documents(articles(5), group_tokens=250)
+    assert [[number for number, _ in group] for group in groups] == [[1, 2], [3, 4], [5]]
+
+
+def test_auto_mode_switches_on_context_size(monkeypatch):
+    monkeypatch.setattr("config.settings.settings.MAP_REDUCE_THRESHOLD_TOKENS", 1000)
+    qa, _ = make_qa([])
+    assert qa.choose_mode(999) == "stuff"
+    assert qa.choose_mode(1001) == "map_reduce"
+
+
+def test_map_reduce_answers_groups_then_merges_them(monkeypatch):
+    monkeypatch.setattr("config.settings.settings.MAP_REDUCE_GROUP_TOKENS", 250)
+    documents = articles(5)
+    documents[4].page_content = "нет фактов " + "норма " * 50
+    llm = RecordingLLM()
+    qa = QASystem(FixedRetriever(documents=documents), llm=llm, generation_mode="map_reduce")
+
+    result = qa.query("Что говорит статья 3?")
+    map_prompts = [prompt for prompt in llm.prompts if "Факты по вопросу" in prompt]
+    reduce_prompt = llm.prompts[-1]
+
+    assert result['generation_mode'] == "map_reduce"
+    assert len(map_prompts) == 3
+    assert any("[3] Документ 3\nСтатья 3." in prompt for prompt in map_prompts)
+    assert "Выписки:" in reduce_prompt
+    assert reduce_prompt.count("Ответ (stub)") == 2
+    assert "[5] Документ 5" in reduce_prompt
\ No newline at end of file
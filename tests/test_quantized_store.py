@@ -0,0 +1,91 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+from src.retrieval.quantized_store import FULL_PRECISION_FILE, QuantizedVectorStore
+
+DIMENSION = 32
+
+
+def vectors(count, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, DIMENSION)).astype(np.float32)
+
+
+def build(storage_mode="int8", count=300, **kwargs):
+    store = QuantizedVectorStore(None, storage_mode=storage_mode, **kwargs)
+    store.add_embeddings([(f"text {i}", vector) for i, vector in enumerate(vectors(count))],
+                         metadatas=[{'source': f"s{i % 3}"} for i in range(count)])
+    return store
+
+
+def digests(folder):
+    return {name: hashlib.md5(open(os.path.join(folder, name), 'rb').read()).hexdigest()
+            for name in os.listdir(folder)}
+
+
+@pytest.mark.parametrize("storage_mode", ["float16", "int8"])
+def test_rescoring_returns_exact_distances(storage_mode):
+    store = build(storage_mode)
+    query = vectors(300)[42]
+
+    document, distance = store.similarity_search_with_score_by_vector(query, k=1)[0]
+
+    assert document.page_content == "text 42"
+    assert distance == pytest.approx(0.0, abs=1e-4)
+    store.close()
+
+
+def test_int8_keeps_recall_and_saves_memory():
+    store = build("int8")
+    report = store.memory_report(vectors(20, seed=1), k=5)
+
+    assert report['memory_saved'] > 0.7
+    assert report['recall_at_k_rescored'] >= report['recall_at_k_compressed']
+    assert report['recall_at_k_rescored'] > 0.9
+    store.close()
+
+
+def test_filter_applies_to_metadata():
+    store = build("int8")
+    hits = store.similarity_search_with_score_by_vector(vectors(300)[5], k=5, filter={'source': "s1"})
+    assert hits and all(document.metadata['source'] == "s1" for document, _ in hits)
+    store.close()
+
+
+def test_pca_is_enabled_once_the_store_grows():
+    store = QuantizedVectorStore(None, storage_mode="float16", pca_dim=8)
+    data = vectors(64)
+    store.add_embeddings([(f"text {i}", vector) for i, vector in enumerate(data[:4])])
+    assert store.pca_dim is None
+
+    store.add_embeddings([(f"text {i}", vector) for i, vector in enumerate(data[4:], start=4)])
+
+    assert store.pca_dim == 8
+    assert store._codes.shape == (64, 8)
+    assert store.similarity_search_by_vector(data[30], k=1)[0].page_content == "text 30"
+    store.close()
+
+
+def test_loaded_store_never_writes_into_the_snapshot(tmp_path):
+    store = build("int8", count=50)
+    store.save_local(str(tmp_path))
+    store.close()
+    before = digests(tmp_path)
+
+    loaded = QuantizedVectorStore.load_local(str(tmp_path), None)
+    loaded.add_embeddings([("new", vectors(1, seed=2)[0])])
+
+    assert digests(tmp_path) == before
+    assert loaded.similarity_search_by_vector(vectors(1, seed=2)[0], k=1)[0].page_content == "new"
+    assert len(np.asarray(loaded._full)) == 51
+    loaded.close()
+
+
+def test_close_removes_the_temporary_side_file():
+    store = build("float16", count=10)
+    side_file = os.path.join(store.side_file_dir, FULL_PRECISION_FILE)
+    assert os.path.exists(side_file)
+    store.close()
+    assert not os.path.exists(store.side_file_dir)
\ No newline at end of file
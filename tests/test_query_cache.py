@@ -0,0 +1,50 @@
+import numpy as np
+
+from src.retrieval.query_cache import QueryEmbeddingCache
+
+
+def test_normalized_queries_share_an_entry():
+    cache = QueryEmbeddingCache(max_size=10)
+    calls = []
+
+    def compute(query):
+        calls.append(query)
+        return [1.0, 2.0]
+
+    cache.get_or_compute("Отпуск  работника", "backend", compute)
+    vector = cache.get_or_compute("отпуск работника", "backend", compute)
+
+    assert calls == ["Отпуск  работника"]
+    assert vector.dtype == np.float32
+    assert cache.stats()['hits'] == 1
+
+
+def test_backends_never_share_vectors():
+    cache = QueryEmbeddingCache(max_size=10)
+    cache.put("отпуск", "hashing", [1.0])
+    assert cache.get("отпуск", "yandex") is None
+    assert cache.get("отпуск", "hashing") is not None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.put("a", "b", [1.0])
+    cache.put("c", "b", [2.0])
+    cache.get("a", "b")
+    cache.put("d", "b", [3.0])
+
+    assert cache.get("c", "b") is None
+    assert cache.get("a", "b") is not None
+    assert cache.stats()['size'] == 2
+
+
+def test_cache_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.pkl")
+    cache = QueryEmbeddingCache(max_size=10)
+    cache.put("отпуск", "hashing", [0.5, 0.25])
+    cache.save(path)
+
+    restored = QueryEmbeddingCache(max_size=10)
+    restored.load(path)
+
+    assert np.allclose(restored.get("отпуск", "hashing"), [0.5, 0.25])
\ No newline at end of file
@@ -0,0 +1,49 @@
+import pytest
+
+from src.processing.query_reformulator import QueryReformulator, is_keyword_query, keyword_terms
+from src.testing.stubs import StubLLM
+
+
+class CountingLLM(StubLLM):
+    calls: int = 0
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        return super()._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def test_keyword_terms_expand_abbreviations_codes_first():
+    assert keyword_terms("ставка НДФЛ") == ["налоговый", "кодекс", "ставка", "ндфл"]
+    assert keyword_terms("Сколько дней отпуска по ТК?") == ["трудовой", "кодекс", "дней", "отпуска"]
+
+
+@pytest.mark.parametrize("query", ["ставка НДФЛ", "отпуск ТК РФ", "расторжение договора аренды", "вычет?"])
+def test_keyword_queries_skip_the_llm(query):
+    assert is_keyword_query(query, max_words=6, short_words=2)
+
+
+@pytest.mark.parametrize("query", [
+    "Сколько дней отпуска в год я могу взять?",
+    "Какие налоговые вычеты можно получить при покупке квартиры",
+])
+def test_natural_questions_go_to_the_llm(query):
+    assert not is_keyword_query(query, max_words=6, short_words=2)
+
+
+def test_fast_path_bypasses_the_llm_and_is_counted():
+    llm = CountingLLM()
+    reformulator = QueryReformulator(llm=llm, fast_path=True)
+
+    assert reformulator.reformulate_for_consultant_plus("ставка НДФЛ") == "налоговый кодекс ставка ндфл"
+    reformulator.reformulate_for_consultant_plus("Сколько дней отпуска в год я могу взять?")
+
+    assert llm.calls == 1
+    assert reformulator.stats() == {'fast_path': 1, 'llm': 1, 'bypass_fraction': 0.5}
+
+
+def test_disabled_fast_path_sends_everything_to_the_llm():
+    llm = CountingLLM()
+    reformulator = QueryReformulator(llm=llm, fast_path=False)
+    reformulator.reformulate_for_consultant_plus("ставка НДФЛ")
+    assert llm.calls == 1
+    assert reformulator.stats()['bypass_fraction'] == 0.0
\ No newline at end of file
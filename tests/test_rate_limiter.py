@@ -0,0 +1,41 @@
+import threading
+import time
+
+from src.utils.rate_limiter import RateLimiter
+
+
+def test_calls_are_spaced_by_the_rate():
+    limiter = RateLimiter(20)  # 50 мс между вызовами
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    # Первый вызов проходит сразу, остальные четыре ждут по 50 мс
+    assert time.monotonic() - started >= 0.19
+
+
+def test_concurrent_callers_share_the_rate():
+    limiter = RateLimiter(50)
+    times = []
+    lock = threading.Lock()
+
+    def call():
+        limiter.acquire()
+        with lock:
+            times.append(time.monotonic())
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    times.sort()
+    assert times[-1] - times[0] >= 9 * 0.02 * 0.9
+
+
+def test_zero_rate_does_not_limit():
+    limiter = RateLimiter(0)
+    started = time.monotonic()
+    for _ in range(100):
+        assert limiter.acquire() == 0.0
+    assert time.monotonic() - started < 0.05
\ No newline at end of file
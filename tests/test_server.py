@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+from src.server.app import QueryServer
+
+
+class FakePipeline:
+    index_size = 0
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+        self.generated = 0
+
+    def load_stage(self, question, search_mode=None, deadline=None):
+        return {'question': question, 'timings': {}}
+
+    def index_stage(self, state):
+        return state
+
+    def generate_stage(self, state, system_prompt=None):
+        self.release.wait(5)
+        self.generated += 1
+        return {'answer': f"ответ на {state['question']}", 'source_documents': [], 'documents_loaded': 0,
+                'chunks_indexed': 0, 'sources_report': {}, 'skipped_sources': [], 'timings': {}}
+
+
+async def serve(scenario, **kwargs):
+    pipeline = FakePipeline()
+    server = QueryServer(pipeline, max_concurrency=1, max_queue=0, request_deadline=5.0, **kwargs)
+    await server.start(host="127.0.0.1", port=0)
+    try:
+        return await scenario(server, pipeline)
+    finally:
+        pipeline.release.set()
+        await server.close()
+
+
+def test_answers_a_question():
+    async def scenario(server, pipeline):
+        return await server.handle_query({'question': "Сколько дней отпуска?"})
+
+    status, body = asyncio.run(serve(scenario))
+    assert status == 200
+    assert body['answer'] == "ответ на Сколько дней отпуска?"
+    assert body['sources_report'] == {}
+
+
+def test_rejects_invalid_payloads():
+    async def scenario(server, pipeline):
+        return [
+            (await server.handle_query(payload))[0]
+            for payload in ({}, {'question': " "}, {'question': "q", 'search_mode': "all"},
+                            {'question': "q", 'deadline': True}, {'question': "q", 'deadline': -1})
+        ]
+
+    assert asyncio.run(serve(scenario)) == [400] * 5
+
+
+def test_slot_is_held_until_a_timed_out_stage_finishes():
+    async def scenario(server, pipeline):
+        pipeline.release.clear()
+        timed_out = await server.handle_query({'question': "медленный", 'deadline': 0.1})
+        # Этап генерации еще идет: слот занят, новый вопрос получает 503
+        overloaded = await server.handle_query({'question': "следующий"})
+        active = server._active
+
+        pipeline.release.set()
+        for _ in range(100):
+            if server._active == 0:
+                break
+            await asyncio.sleep(0.01)
+        answered = await server.handle_query({'question': "следующий"})
+        return timed_out[0], overloaded[0], active, answered[0], pipeline.generated
+
+    assert asyncio.run(serve(scenario)) == (504, 503, 1, 200, 2)
\ No newline at end of file
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.retrieval.sharded_store import ShardedVectorStore
+
+DIMENSION = 16
+
+
+def vectors(count, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, DIMENSION)).astype(np.float32)
+
+
+@pytest.fixture
+def store():
+    store = ShardedVectorStore(None, num_shards=2, shard_by="source", workers=0)
+    data = vectors(40)
+    store.add_embeddings([(f"text {i}", vector) for i, vector in enumerate(data)],
+                         metadatas=[{'source': f"s{i % 4}"} for i in range(40)],
+                         ids=[f"id{i}" for i in range(40)])
+    yield store
+    store.close()
+
+
+def test_search_finds_the_exact_vector(store):
+    query = vectors(40)[7]
+    document, distance = store.similarity_search_with_score_by_vector(query, k=1)[0]
+    assert document.page_content == "text 7"
+    assert distance == pytest.approx(0.0, abs=1e-4)
+
+
+def test_rebuild_replaces_one_shard(store):
+    shard = store.shard_of("id0", {'source': "s0"})
+    other = 1 - shard
+    other_ids = list(store.shard_ids[other])
+    old_path = store._shard_path(shard)
+
+    store.rebuild_shard(shard, [("new", vectors(1, seed=1)[0])], metadatas=[{'source': "s0"}], ids=["new"])
+
+    assert store.shard_ids[shard] == ["new"]
+    assert store.shard_ids[other] == other_ids
+    hit = store.similarity_search_with_score_by_vector(vectors(1, seed=1)[0], k=1)[0][0]
+    assert hit.page_content == "new"
+    # Старое поколение никто не читает: его файл и документы удалены
+    assert not os.path.exists(old_path)
+    with pytest.raises(KeyError):
+        store.get_document("id0")
+
+
+def test_search_pinned_before_a_rebuild_reads_the_old_generation(store):
+    shard = store.shard_of("id0", {'source': "s0"})
+    with store._pinned() as pinned:
+        old_path = store._shard_path(shard)
+        store.rebuild_shard(shard, [("new", vectors(1, seed=1)[0])], metadatas=[{'source': "s0"}], ids=["new"])
+
+        assert os.path.exists(old_path)
+        hits = store._scatter(pinned, vectors(40)[:1], 1)[0]
+        assert hits[0][0] == "id0"
+        assert store.get_document("id0").page_content == "text 0"
+
+    assert not os.path.exists(old_path)
+    with pytest.raises(KeyError):
+        store.get_document("id0")
+
+
+def test_search_within_sources_only_returns_those_sources(store):
+    hits = store.similarity_search_within_sources(vectors(40)[5], ["s1", "s2"], k=5)
+    assert len(hits) == 5
+    assert {doc.metadata['source'] for doc, _ in hits} <= {"s1", "s2"}
+    assert hits[0][0].page_content == "text 5"
+
+
+def test_loaded_store_never_writes_into_the_snapshot(store, tmp_path):
+    snapshot = tmp_path / "snapshot"
+    store.save_local(str(snapshot))
+    before = {name: (snapshot / name).read_bytes() for name in os.listdir(snapshot)}
+
+    loaded = ShardedVectorStore.load_local(str(snapshot), None, workers=0)
+    try:
+        loaded.add_embeddings([("added", vectors(1, seed=2)[0])], metadatas=[{'source': "s9"}], ids=["added"])
+        other = 1 - loaded.shard_of("added", {'source': "s9"})
+        loaded.rebuild_shard(other, [("rebuilt", vectors(1, seed=3)[0])], metadatas=[{'source': "s0"}], ids=["rebuilt"])
+        assert loaded.similarity_search_with_score_by_vector(vectors(1, seed=2)[0], k=1)[0][0].page_content == "added"
+    finally:
+        loaded.close()
+
+    assert {name: (snapshot / name).read_bytes() for name in os.listdir(snapshot)} == before
+
+
+def test_close_removes_the_temporary_shard_dir():
+    store = ShardedVectorStore(None, num_shards=2, workers=0)
+    store.add_embeddings([("text", vectors(1)[0])])
+    shard_dir = store.shard_dir
+    store.close()
+    assert not os.path.exists(shard_dir)
\ No newline at end of file
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from src.utils.singleflight import SingleFlight, normalize_query
+
+
+def test_concurrent_calls_with_one_key_run_once():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        time.sleep(0.1)
+        return value * 2
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", slow, 21)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flight.do("key", slow, 21))) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert calls == [21]
+    assert results == [42] * 5
+    assert flight.executed == 1
+    assert flight.coalesced == 4
+
+
+def test_error_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join()
+    follower.join()
+
+    assert errors == ["boom", "boom"]
+    # Результат не кэшируется: следующий вызов выполняется заново
+    assert flight.do("key", lambda: "ok") == "ok"
+
+
+def test_do_many_computes_duplicate_keys_once():
+    flight = SingleFlight()
+    computed = []
+
+    def compute(positions):
+        computed.append(list(positions))
+        return [f"v{position}" for position in positions]
+
+    results = flight.do_many(["a", "b", "a"], compute)
+
+    assert computed == [[0, 1]]
+    assert results == ["v0", "v1", "v0"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("  Сколько   дней ОТПУСКА? ", "сколько дней отпуска"),
+    ("«НДФЛ»!", "ндфл"),
+])
+def test_normalize_query(text, expected):
+    assert normalize_query(text) == expected
\ No newline at end of file
@@ -0,0 +1,82 @@
+import time
+
+from langchain.schema import Document
+
+from src.data.source_router import ROUTE_LIVE, ROUTE_LOCAL, SourceRouter
+from src.utils.deadline import Deadline
+
+
+class FakeIndex:
+    def __init__(self, scores=(), delay=0.0, error=None):
+        self.scores = scores
+        self.delay = delay
+        self.error = error
+
+    def similarity_search_with_relevance_scores(self, question, k=None, partitions=None):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [(Document(page_content=f"chunk {i}"), score) for i, score in enumerate(self.scores)]
+
+
+class FakeLoader:
+    def __init__(self):
+        self.live = []
+
+    def load_with_report(self, question, search_mode=None, deadline=None, live=True):
+        self.live.append(live)
+        documents = [Document(page_content="live page")] if live else []
+        return documents, {}
+
+
+def route(index, **kwargs):
+    options = dict(k=4, min_top_score=0.7, coverage_score=0.5, min_coverage=0.5, timeout=1.0)
+    options.update(kwargs)
+    router = SourceRouter(index, **options)
+    loader = FakeLoader()
+    documents, report = router.load_with_report(loader, "вопрос", deadline=Deadline(5.0))
+    return router, loader, documents, report['router']
+
+
+def test_confident_index_skips_live_sources():
+    router, loader, documents, report = route(FakeIndex([0.9, 0.8, 0.6, 0.2]))
+    assert loader.live == [False]
+    assert documents == []
+    assert report['route'] == ROUTE_LOCAL
+    assert report['top_score'] == 0.9
+    assert report['coverage'] == 0.75
+    assert router.stats()[ROUTE_LOCAL]['questions'] == 1
+
+
+def test_weak_coverage_goes_live():
+    _, loader, documents, report = route(FakeIndex([0.9, 0.3, 0.2, 0.1]))
+    assert loader.live == [True]
+    assert report['route'] == ROUTE_LIVE
+    assert len(documents) == 1
+
+
+def test_failed_check_goes_live():
+    _, loader, _, report = route(FakeIndex(error=RuntimeError("embeddings are down")))
+    assert loader.live == [True]
+    assert (report['route'], report['check'], report['status']) == (ROUTE_LIVE, 'error', 'ok')
+
+
+def test_slow_check_is_not_waited_for():
+    started = time.perf_counter()
+    _, loader, _, report = route(FakeIndex([0.9] * 4, delay=0.5), timeout=0.05)
+    assert time.perf_counter() - started < 0.4
+    assert loader.live == [True]
+    assert report['check'] == 'timeout'
+
+
+def test_route_shares():
+    router = SourceRouter(FakeIndex([0.9] * 4), k=4, min_top_score=0.7, coverage_score=0.5, min_coverage=0.5)
+    loader = FakeLoader()
+    for _ in range(3):
+        router.load_with_report(loader, "вопрос")
+    router.vector_manager = FakeIndex([0.1])
+    router.load_with_report(loader, "вопрос")
+    stats = router.stats()
+    assert stats[ROUTE_LOCAL]['share'] == 0.75
+    assert stats[ROUTE_LIVE]['questions'] == 1
\ No newline at end of file
@@ -0,0 +1,45 @@
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from config.settings import DocumentType
+from src.processing.text_splitter import TextSplitter
+
+LAW = " ".join(f"Статья {n}. Работник имеет право на отдых и оплачиваемый отпуск." for n in range(1, 80))
+
+
+def test_chunks_reference_the_parent_instead_of_copying_it():
+    document = Document(page_content=LAW, metadata={'source': "tk", 'type': 'consultant'})
+    chunks = TextSplitter(chunk_size=300, chunk_overlap=60).split_to_chunks([document])
+
+    expected = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=60,
+                                              separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""]).split_text(LAW)
+    assert [chunk.page_content for chunk in chunks] == expected
+    assert all(chunk.parent is LAW for chunk in chunks)
+    assert all(chunk.base_metadata is chunks[0].base_metadata for chunk in chunks)
+    assert chunks[0].metadata is not chunks[0].metadata
+
+
+def test_start_index_only_when_requested():
+    document = Document(page_content=LAW, metadata={'source': "tk", 'type': 'consultant'})
+    plain = TextSplitter(chunk_size=300, chunk_overlap=60).split_documents([document])
+    assert all('start_index' not in chunk.metadata for chunk in plain)
+
+    chunks = TextSplitter(chunk_size=300, chunk_overlap=60, add_start_index=True).split_documents([document])
+    for chunk in chunks:
+        start = chunk.metadata['start_index']
+        assert LAW[start:start + len(chunk.page_content)] == chunk.page_content
+
+
+def test_short_slides_are_combined_with_a_blank_line():
+    long_slide = "Порядок предоставления отпуска. " * 10
+    content = f"Слайд 1: Отпуск\nСлайд 2: 28 дней\nСлайд 3: {long_slide}"
+    document = Document(page_content=content, metadata={'source': "deck.pptx", 'type': 'pptx'})
+    chunks = TextSplitter(document_type=DocumentType.PPTX).split_documents([document])
+
+    assert chunks[0].page_content == "Отпуск\n\n28 дней"
+    assert chunks[0].metadata['chunk_type'] == 'combined_slides'
+    assert chunks[0].metadata['slide_numbers'] == "1-2"
+    assert 'start_index' not in chunks[0].metadata
+    assert chunks[1].page_content == long_slide.strip()
+    assert chunks[1].metadata['slide_number'] == 3
+    assert chunks[1].metadata['chunk_type'] == 'full_slide'
\ No newline at end of file